@@ -0,0 +1 @@
+"""Gemeinsame Hilfsmodule für die Skripte in data-preperation/ und evaluation/."""
@@ -0,0 +1,89 @@
+import re
+
+# --------------------------------------------------------------------
+# Regeln aus den Prompt-Vorlagen (data-preperation/src/*.txt)
+# --------------------------------------------------------------------
+MAX_ALT_TEXT_LENGTH = 150
+CAPTION_COPY_THRESHOLD = 0.3  # ">30 % verbatim copy" wie im Judge-Prompt
+
+IMAGE_PREFIXES = (
+    "picture of", "image of", "this image", "this picture",
+    "this is a picture of", "this is an image of", "photo of", "a photo of",
+    "an image of", "a picture of",
+)
+
+# Wörter, die auf Emotionen, Absichten oder nicht sichtbare Deutung hindeuten
+SPECULATIVE_WORDS = {
+    "angry", "happy", "sad", "proud", "excited", "worried", "anxious",
+    "determined", "celebrates", "celebrating", "hopeful", "frustrated",
+    "seemingly", "apparently", "likely", "perhaps", "probably", "possibly",
+    "symbolizing", "symbolizes", "symbolic", "reflecting", "reflects",
+    "suggesting", "suggests", "evoking", "evokes", "amidst", "contemplating",
+    "intense", "dramatic", "iconic", "vibrant", "stunning", "beautiful",
+}
+
+LINT_RULES = ("empty", "too_long", "image_prefix", "caption_copy", "speculative")
+
+_WORD_RE = re.compile(r"[A-Za-z0-9']+")
+_PREFIX_RE = re.compile(r"^\W*(" + "|".join(re.escape(p) for p in IMAGE_PREFIXES) + r")\b", re.IGNORECASE)
+
+
+def clean_text(text):
+    """Normalisiert None/Anführungszeichen, wie sie in den Modell-Ausgaben vorkommen."""
+    if text is None:
+        return ""
+    return str(text).strip().strip('"').strip()
+
+
+def tokenize(text):
+    return _WORD_RE.findall(clean_text(text).lower())
+
+
+def ngram_overlap(text, source, n=3):
+    """Anteil der Wort-n-Gramme aus `text`, die wörtlich in `source` vorkommen."""
+    tokens = tokenize(text)
+    if len(tokens) < n:
+        return 0.0
+    grams = [tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    src_tokens = tokenize(source)
+    src_grams = {tuple(src_tokens[i:i + n]) for i in range(len(src_tokens) - n + 1)}
+    if not src_grams:
+        return 0.0
+    return sum(g in src_grams for g in grams) / len(grams)
+
+
+def token_jaccard(text, source):
+    a, b = set(tokenize(text)), set(tokenize(source))
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def has_image_prefix(text):
+    return bool(_PREFIX_RE.match(clean_text(text)))
+
+
+def count_speculative(text):
+    return sum(tok in SPECULATIVE_WORDS for tok in tokenize(text))
+
+
+def lint_alt_text(alt_text, caption="", headline="", abstract=""):
+    """
+    Prüft einen Alt-Text gegen die Regeln aus den Prompts und gibt die Liste
+    der verletzten Regeln (siehe LINT_RULES) zurück. Leere Liste = unauffällig.
+    """
+    text = clean_text(alt_text)
+    if not text:
+        return ["empty"]
+
+    hits = []
+    if len(text) > MAX_ALT_TEXT_LENGTH:
+        hits.append("too_long")
+    if has_image_prefix(text):
+        hits.append("image_prefix")
+    context = " ".join(clean_text(t) for t in (caption, headline, abstract))
+    if ngram_overlap(text, context) > CAPTION_COPY_THRESHOLD:
+        hits.append("caption_copy")
+    if count_speculative(text) > 0:
+        hits.append("speculative")
+    return hits
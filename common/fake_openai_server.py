@@ -0,0 +1,204 @@
+"""
+Lokaler Fake der Chat-Completions-API zum Testen von openai_client.py ohne
+echte Kosten. Erzwingt ein Token- und Request-Limit wie die echte API,
+injiziert zusätzlich zufällige 429/500 und liefert Retry-After- sowie
+x-ratelimit-*-Header.
+
+    python common/fake_openai_server.py --requests 400 --server-tpm 200000 --inject-429 0.05
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.openai_client import RateLimitedClient, estimate_prompt_tokens, imap_bounded  # noqa: E402
+from common.telemetry import Telemetry, format_summary  # noqa: E402
+
+JUDGE_RESPONSE = json.dumps({
+    "visibility_principle": 4, "context_relevance": 4, "entity_naming": 3,
+    "informativeness": 4, "redundancy_avoidance": 5, "style_readability": 5,
+    "total": 4, "justification": "Fake judgement.",
+})
+ALT_TEXT_RESPONSE = "A man in a suit speaks at a podium in front of flags."
+COMBINED_RESPONSE = json.dumps({
+    "initial": "A determined man in a suit speaks passionately at a podium in front of flags.",
+    "refined": ALT_TEXT_RESPONSE,
+})
+
+
+class ServerLimits:
+    """Nicht-blockierendes Token-/Request-Budget pro Minute (wie die echte API)."""
+
+    def __init__(self, tpm, rpm):
+        self.tpm, self.rpm = tpm, rpm
+        self.tokens, self.requests = float(tpm), float(rpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens):
+        """Gibt (ok, retry_after_s, verbleibende Tokens) zurück."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+            if self.tokens < tokens or self.requests < 1:
+                wait_tokens = max(tokens - self.tokens, 0) / (self.tpm / 60)
+                wait_requests = max(1 - self.requests, 0) / (self.rpm / 60)
+                return False, max(wait_tokens, wait_requests), int(self.tokens)
+            self.tokens -= tokens
+            self.requests -= 1
+            return True, 0.0, int(self.tokens)
+
+
+def malformed(content):
+    """Typische Fehlerbilder von Judge-Antworten: Markdown-Fence, abgeschnitten, unvollständig."""
+    kind = random.choice(["fenced", "truncated", "broken"])
+    if kind == "fenced":
+        return f"```json\n{content}\n```"
+    if kind == "truncated":
+        return content[:-12]
+    return content[:len(content) // 3]
+
+
+def make_handler(limits, inject_429, inject_500, latency_s, counters, inject_malformed=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            messages = body.get("messages", [])
+            prompt_tokens = estimate_prompt_tokens(messages)
+            max_tokens = body.get("max_tokens") or 0
+
+            ok, retry_after, remaining = limits.take(prompt_tokens + max_tokens)
+            if ok and random.random() < inject_429:
+                ok, retry_after = False, random.uniform(0.2, 1.0)
+            if not ok:
+                counters["429"] += 1
+                self._send(429, {"error": {"message": "Rate limit reached (fake)", "type": "requests",
+                                           "code": "rate_limit_exceeded"}},
+                           {"retry-after-ms": str(int(retry_after * 1000)), "retry-after": str(max(1, round(retry_after)))})
+                return
+            if random.random() < inject_500:
+                counters["500"] += 1
+                self._send(500, {"error": {"message": "Internal server error (fake)", "type": "server_error"}})
+                return
+
+            time.sleep(latency_s * random.uniform(0.5, 1.5))
+            system = messages[0].get("content", "") if messages else ""
+            schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+            if schema_name == "alt_text_draft_and_refined":
+                content = COMBINED_RESPONSE
+            else:
+                content = JUDGE_RESPONSE if "JSON" in str(system) else ALT_TEXT_RESPONSE
+            if content is JUDGE_RESPONSE and random.random() < inject_malformed:
+                counters["malformed"] += 1
+                content = malformed(content)
+            counters["200"] += 1
+            self._send(200, {
+                "id": f"chatcmpl-fake-{counters['200']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                          "total_tokens": prompt_tokens + len(content) // 4},
+            }, {
+                "x-ratelimit-limit-tokens": str(limits.tpm),
+                "x-ratelimit-remaining-tokens": str(remaining),
+                "x-ratelimit-reset-tokens": f"{(limits.tpm - remaining) / (limits.tpm / 60):.3f}s",
+            })
+
+    return Handler
+
+
+def start_server(tpm=200_000, rpm=600, inject_429=0.0, inject_500=0.0, latency_s=0.2, port=0,
+                 inject_malformed=0.0):
+    """Startet den Fake-Server in einem Hintergrund-Thread; gibt (Server, Basis-URL, Zähler) zurück."""
+    counters = {"200": 0, "429": 0, "500": 0, "malformed": 0}
+    handler = make_handler(ServerLimits(tpm, rpm), inject_429, inject_500, latency_s, counters, inject_malformed)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1", counters
+
+
+def loadtest_messages(i):
+    """Judge-ähnlicher Request: ~400 Token System-Prompt, Bild mit detail=low, Kontext."""
+    return [
+        {"role": "system", "content": "Return ONLY valid JSON. " + "x" * 1600},
+        {"role": "user", "content": [
+            {"type": "text", "text": "Headline: ...\nCaption: ...\n" + "y" * 800},
+            {"type": "image_url", "image_url": {"url": f"https://example.org/{i}.jpg", "detail": "low"}},
+        ]},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest von RateLimitedClient gegen einen lokalen Fake-Server.")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--server-tpm", type=int, default=200_000, help="Token-Limit des Fake-Servers")
+    parser.add_argument("--server-rpm", type=int, default=600)
+    parser.add_argument("--client-tpm", type=int, default=None, help="Token-Limit des Clients (Standard: wie Server)")
+    parser.add_argument("--inject-429", type=float, default=0.05, help="Anteil zufälliger 429 trotz Budget")
+    parser.add_argument("--inject-500", type=float, default=0.01)
+    parser.add_argument("--inject-malformed", type=float, default=0.0, help="Anteil kaputter Judge-Antworten (Fence/abgeschnitten)")
+    parser.add_argument("--latency", type=float, default=0.2, help="mittlere Antwortzeit in s")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url, counters = start_server(
+        args.server_tpm, args.server_rpm, args.inject_429, args.inject_500, args.latency,
+        inject_malformed=args.inject_malformed)
+    tmp_dir = tempfile.mkdtemp()
+    dead_letter_path = os.path.join(tmp_dir, "dead_letter.jsonl")
+    telemetry = Telemetry(os.path.join(tmp_dir, "telemetry.db"), script="fake_openai_server")
+    client = RateLimitedClient.with_api_key(
+        "fake-key", dead_letter_path, base_url=base_url,
+        tokens_per_minute=args.client_tpm or args.server_tpm,
+        requests_per_minute=args.server_rpm, max_concurrency=args.concurrency, telemetry=telemetry,
+    )
+
+    def call(i):
+        return client.chat(item_id=i, stage="loadtest", model="gpt-4o-mini",
+                           messages=loadtest_messages(i), max_tokens=200)
+
+    t0 = time.perf_counter()
+    results = list(imap_bounded(call, range(args.requests), max_workers=args.concurrency))
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    ok = sum(r is not None for r in results)
+    summary = client.summary()
+    tokens_per_request = estimate_prompt_tokens(loadtest_messages(0)) + 200
+    print(f"✅ Erfolgreich: {ok}/{args.requests}, Dead-Letter: {summary['dead_letters']} ({dead_letter_path})")
+    print(f"📨 Server: {counters['200']}× 200, {counters['429']}× 429, {counters['500']}× 500")
+    print(f"🔁 Client: {summary['calls']} Calls, {summary['retries']} Retries, Parallelitätslimit am Ende {summary['concurrency_limit']}")
+    print(f"⏱️  {elapsed:.1f}s → {ok / elapsed:.2f} req/s, {ok * tokens_per_request / elapsed * 60:,.0f} Tokens/min "
+          f"(Server-Limit {args.server_tpm:,})")
+    print(format_summary(telemetry.close()))
+    if ok + summary["dead_letters"] != args.requests:
+        raise SystemExit("❌ Datenverlust: nicht jedes Item ist erfolgreich oder im Dead-Letter gelandet")
+
+
+if __name__ == "__main__":
+    main()
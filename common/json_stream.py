@@ -0,0 +1,36 @@
+"""
+Einträge aus JSON-Arrays oder JSONL einzeln lesen, ohne die Datei komplett zu
+laden: Arrays werden mit ijson inkrementell geparst, JSONL zeilenweise, "-"
+liest JSONL von stdin (z.B. merge_data.py --tee | vlm_judge.py --input -).
+"""
+import json
+import sys
+
+try:
+    import ijson  # inkrementelles Parsen großer JSON-Arrays
+except ImportError:
+    ijson = None
+
+
+def iter_json(path):
+    """Liefert die Einträge einer JSON-Array-, JSONL-Datei oder von stdin ("-") nacheinander."""
+    if path == "-":
+        yield from _iter_lines(sys.stdin)
+        return
+    with open(path, "rb") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first != b"[":
+            yield from _iter_lines(f)
+        elif ijson is not None:
+            yield from ijson.items(f, "item", use_float=True)
+        else:
+            yield from json.load(f)     # ohne ijson: korrekt, aber komplett im Speicher
+
+
+def _iter_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
@@ -0,0 +1,349 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import openai
+
+# --------------------------------------------------------------------
+# Limits (gpt-4o-mini, Tier 1 – per Umgebungsvariable anpassbar)
+# --------------------------------------------------------------------
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM", 200_000))
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM", 500))
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 6))
+# Optional: alle Requests als JSONL mitschreiben (Prefix-Messung mit common/prompt_prefix.py)
+RECORD_REQUESTS_PATH = os.getenv("OPENAI_RECORD_REQUESTS")
+
+# Bildkosten laut OpenAI: detail=low pauschal 85 Tokens, sonst 85 + 170 pro 512px-Kachel
+IMAGE_TOKENS_LOW_DETAIL = 85
+IMAGE_TOKENS_HIGH_DETAIL = 85 + 170 * 4      # Schätzung für 1024x1024
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,      # inkl. APITimeoutError
+    openai.InternalServerError,
+)
+
+
+def _content_parts(message):
+    content = message.get("content")
+    return [{"type": "text", "text": content}] if isinstance(content, str) else (content or [])
+
+
+def estimate_image_tokens(messages):
+    tokens = 0
+    for message in messages:
+        for part in _content_parts(message):
+            if part.get("type") == "image_url":
+                detail = part.get("image_url", {}).get("detail", "auto")
+                tokens += IMAGE_TOKENS_LOW_DETAIL if detail == "low" else IMAGE_TOKENS_HIGH_DETAIL
+    return tokens
+
+
+def estimate_prompt_tokens(messages):
+    """Grobe Schätzung der Prompt-Tokens inkl. Bildkosten (für das Token-Bucket)."""
+    tokens = estimate_image_tokens(messages)
+    for message in messages:
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        for part in _content_parts(message):
+            if part.get("type") == "text":
+                tokens += math.ceil(len(part.get("text") or "") / CHARS_PER_TOKEN)
+    return tokens
+
+
+def parse_reset(value):
+    """Wandelt Header-Werte wie '1s', '6m0s', '20ms' oder '0.5' in Sekunden um."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    return sum(float(n) * units[u] for n, u in parts) if parts else None
+
+
+def retry_after_seconds(headers):
+    """Retry-After (bzw. retry-after-ms) aus einer 429/5xx-Antwort."""
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    return parse_reset(headers.get("retry-after"))
+
+# --------------------------------------------------------------------
+# Token-Bucket & adaptive Parallelität
+# --------------------------------------------------------------------
+class TokenBucket:
+    """
+    Thread-sicheres Token-Bucket mit Nachfüllrate `per_minute`. Kann über
+    `pause()` (Retry-After) und `sync()` (x-ratelimit-*-Header) an den
+    tatsächlichen Serverzustand angepasst werden. Startet leer: ein voller
+    Start plus Nachfüllung ließe in der ersten Minute fast das Doppelte des
+    Limits durch (der Server zählt ab dem ersten Request).
+    """
+
+    def __init__(self, per_minute, capacity=None, initial=0.0):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(min(initial, self.capacity))
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait_s = max(self.paused_until - now, 0.0)
+                if not wait_s and self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_s = wait_s or (amount - self.tokens) / self.rate
+                self.cond.wait(timeout=wait_s)
+
+    def pause(self, seconds):
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def sync(self, remaining, reset_s):
+        """Übernimmt den Serverstand, falls dieser strenger ist als die lokale Schätzung."""
+        with self.cond:
+            self._refill(time.monotonic())
+            if remaining is not None and remaining < self.tokens:
+                self.tokens = float(remaining)
+            if remaining == 0 and reset_s:
+                self.paused_until = max(self.paused_until, time.monotonic() + reset_s)
+
+
+class AIMDLimiter:
+    """
+    Adaptive Parallelität: additive increase (+1 nach `limit` Erfolgen in Folge),
+    multiplicative decrease (halbieren) bei 429 – höchstens einmal pro
+    `cooldown_s`, damit ein Burst paralleler 429 nicht auf 1 zusammenbricht.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=MAX_CONCURRENCY, cooldown_s=2.0):
+        self.limit = float(min(initial, maximum))
+        self.minimum, self.maximum = minimum, maximum
+        self.cooldown_s = cooldown_s
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.history = deque(maxlen=1000)    # (Zeit, Limit) für Auswertungen
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def on_success(self):
+        with self.cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.history.append((time.monotonic(), self.limit))
+            self.cond.notify_all()
+
+    def on_throttle(self):
+        with self.cond:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.cooldown_s:
+                self.limit = max(self.minimum, self.limit / 2)
+                self.last_decrease = now
+                self.history.append((now, self.limit))
+
+# --------------------------------------------------------------------
+# Client
+# --------------------------------------------------------------------
+class RateLimitedClient:
+    """
+    Gemeinsame Schicht für alle Chat-Completion-Calls (Generierung, Refinement,
+    Judging): Token- und Request-Bucket, AIMD-Parallelität, Retries mit Jitter
+    bzw. Retry-After und eine Dead-Letter-Datei (JSONL) für Items, die endgültig
+    scheitern. `chat()` gibt die geparste Antwort oder None zurück; None heißt
+    immer, dass das Item in der Dead-Letter-Datei steht. Mit `telemetry`
+    (common/telemetry.py) wird jeder Call mit Tokens, Latenz und Retries erfasst.
+    """
+
+    def __init__(self, client, dead_letter_path, tokens_per_minute=TOKENS_PER_MINUTE,
+                 requests_per_minute=REQUESTS_PER_MINUTE, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, telemetry=None):
+        self.client = client
+        self.dead_letter_path = dead_letter_path
+        self.telemetry = telemetry
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.limiter = AIMDLimiter(maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "dead_letters": 0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def with_api_key(cls, api_key, dead_letter_path, base_url=None, **kwargs):
+        # Retries übernimmt diese Schicht, nicht das SDK; base_url z.B. für fake_openai_server.py
+        return cls(openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0), dead_letter_path, **kwargs)
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 0.25 * retry_after + 0.1)
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))   # full jitter
+
+    def _sync_headers(self, headers):
+        remaining = headers.get("x-ratelimit-remaining-tokens")
+        self.token_bucket.sync(
+            int(remaining) if remaining and remaining.isdigit() else None,
+            parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        )
+
+    def chat(self, item_id=None, stage=None, **kwargs):
+        if RECORD_REQUESTS_PATH:
+            self._append_jsonl(RECORD_REQUESTS_PATH, {"stage": stage, "item_id": item_id, "request": kwargs})
+        messages = kwargs.get("messages", [])
+        estimated = estimate_prompt_tokens(messages)
+        cost = estimated + kwargs.get("max_tokens", 0)
+        error, latency, t_start = None, None, time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self.token_bucket.acquire(cost)
+            self.request_bucket.acquire(1)
+            self.limiter.acquire()
+            retry_after = None
+            try:
+                self._count("calls")
+                t0 = time.perf_counter()
+                raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+                latency = time.perf_counter() - t0
+                self._sync_headers(raw.headers)
+                self.limiter.on_success()
+                response = raw.parse()
+                self._record(stage, item_id, kwargs, "ok", attempt + 1, latency, t_start, estimated, response)
+                return response
+            except RETRYABLE_ERRORS as e:
+                error = e
+                latency = time.perf_counter() - t0
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                retry_after = retry_after_seconds(headers)
+                if isinstance(e, openai.RateLimitError):
+                    self._count("throttled")
+                    self.limiter.on_throttle()
+                    self.token_bucket.pause(retry_after or self._backoff(attempt, None))
+            except openai.APIStatusError as e:
+                # 400/401/403/404/422: erneutes Senden ändert nichts
+                error = e
+                latency = time.perf_counter() - t0
+                break
+            except Exception as e:
+                # z.B. unlesbare Antwort: ein Item soll nie den ganzen Lauf abbrechen
+                error = e
+                latency = time.perf_counter() - t0
+                break
+            finally:
+                self.limiter.release()
+
+            if attempt < self.max_retries:
+                self._count("retries")
+                delay = self._backoff(attempt, retry_after)
+                logging.warning(f"{stage} {item_id}: {type(error).__name__}, Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+        self._record(stage, item_id, kwargs, "dead_letter", attempt + 1, latency, t_start, estimated)
+        self.dead_letter(item_id, stage, error, kwargs)
+        return None
+
+    def _record(self, stage, item_id, request, status, attempts, latency, t_start, estimated, response=None):
+        if self.telemetry is None:
+            return
+        usage = response.usage.model_dump() if response is not None and response.usage else None
+        self.telemetry.record(
+            stage, item_id, request.get("model"), status, attempts, latency, time.perf_counter() - t_start,
+            usage=usage, image_tokens=estimate_image_tokens(request.get("messages", [])),
+            estimated_prompt_tokens=estimated,
+        )
+
+    def dead_letter(self, item_id, stage, error, request):
+        self._count("dead_letters")
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "stage": stage,
+            "item_id": item_id,
+            "error_type": type(error).__name__,
+            "status_code": getattr(error, "status_code", None),
+            "error": str(error),
+            "request": request,
+        }
+        logging.error(f"{stage} {item_id}: endgültig fehlgeschlagen ({record['error_type']}) → {self.dead_letter_path}")
+        self._append_jsonl(self.dead_letter_path, record)
+
+    def _append_jsonl(self, path, record):
+        with self.lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def summary(self):
+        return {**self.stats, "concurrency_limit": round(self.limiter.limit, 2)}
+
+
+def load_dead_letters(path, stage=None):
+    """Item-IDs aus der Dead-Letter-Datei, z.B. für einen gezielten Nachlauf."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return {r["item_id"] for r in records if stage is None or r["stage"] == stage}
+
+
+def imap_bounded(fn, iterable, max_workers=MAX_CONCURRENCY, window=None, on_error=None):
+    """
+    Wie map(), aber parallel in Threads mit begrenzter Anzahl offener Items und
+    Ergebnissen in Eingabereihenfolge. Liest `iterable` nur so weit wie nötig,
+    sodass gestreamte Eingaben (stdin, JSONL) nicht vollständig geladen werden.
+    Wirft `fn` eine Exception, liefert `on_error(item, exc)` den Ersatzwert
+    (z.B. nach `RateLimitedClient.dead_letter`); ohne `on_error` bricht der Lauf ab.
+    """
+    window = window or 2 * max_workers
+
+    def result(item, future):
+        try:
+            return future.result()
+        except Exception as e:
+            if on_error is None:
+                raise
+            return on_error(item, e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for item in iterable:
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= window:
+                yield result(*pending.popleft())
+        while pending:
+            yield result(*pending.popleft())
@@ -0,0 +1,116 @@
+"""
+Aufbau der Chat-Requests mit statischem Prefix zuerst (System-Regeln, Schema,
+Arbeitsanweisung) und item-spezifischem Inhalt zuletzt, damit der
+Prompt-Cache des Providers greift – plus eine Messung, wie lang der über einen
+Lauf geteilte Prefix tatsächlich ist.
+
+Requests eines Laufs aufzeichnen (z.B. gegen fake_openai_server.py) und messen:
+
+    OPENAI_RECORD_REQUESTS=logs/requests.jsonl python scripts/vlm_judge.py
+    python common/prompt_prefix.py logs/requests.jsonl
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from functools import lru_cache
+
+# OpenAI cached Prompts ab 1024 Tokens, danach in Schritten von 128 Tokens
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT_TOKENS = 128
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def load_prompt(path):
+    """Liest eine Prompt-Datei einmal pro Prozess, mit normalisierten Zeilenenden (byte-identischer Prefix)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().replace("\r\n", "\n").strip()
+
+
+def item_messages(system_prompt, item_text, image_url, detail="low"):
+    """System-Prompt (statisch) zuerst, dann Item-Text und Bild."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": item_text},
+                {"type": "image_url", "image_url": {"url": image_url, "detail": detail}},
+            ],
+        },
+    ]
+
+
+def serialize_prefix(request):
+    """
+    Kanonische Reihenfolge, in der der Provider den Prompt aufbaut: Schema
+    (response_format) vor den Nachrichten. Bilder werden als URL serialisiert.
+    """
+    return json.dumps(
+        {"response_format": request.get("response_format"), "messages": request.get("messages")},
+        ensure_ascii=False, sort_keys=False, separators=(",", ":"),
+    )
+
+
+def common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def cacheable_tokens(prefix_tokens):
+    if prefix_tokens < CACHE_MIN_TOKENS:
+        return 0
+    return CACHE_MIN_TOKENS + (prefix_tokens - CACHE_MIN_TOKENS) // CACHE_INCREMENT_TOKENS * CACHE_INCREMENT_TOKENS
+
+
+def measure_shared_prefix(records):
+    """
+    Pro Stage: Länge des mit dem ersten Request geteilten Prefix (Zeichen und
+    geschätzte Tokens), Anteil am Gesamtprompt und cachebare Tokens.
+    """
+    by_stage = defaultdict(list)
+    for record in records:
+        by_stage[record.get("stage")].append(serialize_prefix(record["request"]))
+
+    report = {}
+    for stage, serialized in by_stage.items():
+        first = serialized[0]
+        shared = [common_prefix_length(first, s) for s in serialized[1:]] or [len(first)]
+        min_shared = min(shared)
+        avg_total = sum(len(s) for s in serialized) / len(serialized)
+        prefix_tokens = min_shared // CHARS_PER_TOKEN
+        report[stage] = {
+            "requests": len(serialized),
+            "shared_prefix_chars": min_shared,
+            "shared_prefix_tokens": prefix_tokens,
+            "avg_request_chars": round(avg_total),
+            "shared_share": min_shared / avg_total if avg_total else 0.0,
+            "cacheable_tokens": cacheable_tokens(prefix_tokens),
+            "prefix_preview": first[max(0, min_shared - 60):min_shared],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Misst den über einen Lauf geteilten Prompt-Prefix pro Stage.")
+    parser.add_argument("path", nargs="?", default=os.getenv("OPENAI_RECORD_REQUESTS", "logs/requests.jsonl"))
+    args = parser.parse_args()
+
+    with open(args.path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    for stage, r in measure_shared_prefix(records).items():
+        status = "✅ cachebar" if r["cacheable_tokens"] else f"⚠️ unter {CACHE_MIN_TOKENS} Tokens, kein Caching"
+        print(f"\n## {stage} ({r['requests']} Requests)")
+        print(f"Geteilter Prefix: {r['shared_prefix_chars']:,} Zeichen ≈ {r['shared_prefix_tokens']:,} Tokens "
+              f"({r['shared_share']:.0%} des Requests) → {status}")
+        print(f"Cachebare Tokens pro Request: {r['cacheable_tokens']:,}")
+        print(f"Prefix endet bei: …{r['prefix_preview']!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Telemetrie für alle LLM-Calls: Tokens (Prompt, Completion, Bild, Cache),
+Latenz, Retries und Kosten pro Call in einer lokalen SQLite-Datenbank,
+optional zusätzlich als Prometheus-Textfile (node_exporter textfile collector).
+
+    python common/telemetry.py logs/llm_telemetry.db            # letzter Lauf
+    python common/telemetry.py logs/llm_telemetry.db --runs 5   # Vergleich der letzten Läufe
+"""
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+TELEMETRY_DB = os.getenv("LLM_TELEMETRY_DB", "logs/llm_telemetry.db")
+PROMETHEUS_TEXTFILE = os.getenv("LLM_TELEMETRY_PROM")   # z.B. /var/lib/node_exporter/llm.prom
+COMMIT_EVERY = 50
+
+# USD pro 1M Tokens: (Input, gecachter Input, Output)
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    script TEXT,
+    stage TEXT,
+    item_id TEXT,
+    model TEXT,
+    status TEXT,                -- ok | dead_letter
+    attempts INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    image_tokens INTEGER,       -- Schätzung (85 pro Bild bei detail=low)
+    estimated_prompt_tokens INTEGER,
+    latency_s REAL,             -- letzter Versuch
+    total_s REAL,               -- inkl. Warten auf Limits und Retries
+    cost_usd REAL,
+    started_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_run ON llm_calls(run_id, stage);
+"""
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    price_in, price_cached, price_out = PRICES.get(model, PRICES["gpt-4o-mini"])
+    uncached = (prompt_tokens or 0) - (cached_tokens or 0)
+    return (uncached * price_in + (cached_tokens or 0) * price_cached + (completion_tokens or 0) * price_out) / 1e6
+
+
+class Telemetry:
+    """Thread-sichere Senke für Call-Metriken eines Laufs (ein run_id pro Prozess)."""
+
+    def __init__(self, db_path=TELEMETRY_DB, script=None, prometheus_path=PROMETHEUS_TEXTFILE):
+        self.db_path = db_path
+        self.script = script
+        self.prometheus_path = prometheus_path
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.pending = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, stage, item_id, model, status, attempts, latency_s, total_s,
+               usage=None, image_tokens=0, estimated_prompt_tokens=None):
+        usage = usage or {}
+        prompt = usage.get("prompt_tokens")
+        completion = usage.get("completion_tokens")
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        row = (
+            self.run_id, self.script, stage, None if item_id is None else str(item_id), model, status, attempts,
+            prompt, completion, cached, image_tokens, estimated_prompt_tokens, latency_s, total_s,
+            call_cost(model, prompt, cached, completion) if prompt is not None else 0.0,
+            datetime.now().isoformat(timespec="seconds"),
+        )
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO llm_calls (run_id, script, stage, item_id, model, status, attempts, prompt_tokens, "
+                "completion_tokens, cached_tokens, image_tokens, estimated_prompt_tokens, latency_s, total_s, "
+                "cost_usd, started_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY:
+                self.conn.commit()
+                self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+        stages = stage_summary(self.conn, self.run_id, wall_s=time.monotonic() - self.started)
+        if self.prometheus_path:
+            write_prometheus(stages, self.prometheus_path, self.script)
+        self.conn.close()
+        return stages
+
+# --------------------------------------------------------------------
+# Auswertung
+# --------------------------------------------------------------------
+def stage_summary(conn, run_id, wall_s=None):
+    """Kennzahlen pro Stage eines Laufs."""
+    rows = conn.execute(
+        "SELECT stage, status, attempts, prompt_tokens, completion_tokens, cached_tokens, image_tokens, "
+        "latency_s, cost_usd, started_at FROM llm_calls WHERE run_id = ?",
+        (run_id,),
+    ).fetchall()
+    stages = {}
+    for stage, status, attempts, prompt, completion, cached, image, latency, cost, started_at in rows:
+        s = stages.setdefault(stage, {
+            "calls": 0, "dead_letters": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cached_tokens": 0, "image_tokens": 0, "cost_usd": 0.0, "latencies": [], "timestamps": [],
+        })
+        s["calls"] += 1
+        s["dead_letters"] += status != "ok"
+        s["retries"] += max((attempts or 1) - 1, 0)
+        s["prompt_tokens"] += prompt or 0
+        s["completion_tokens"] += completion or 0
+        s["cached_tokens"] += cached or 0
+        s["image_tokens"] += image or 0
+        s["cost_usd"] += cost or 0.0
+        s["timestamps"].append(started_at)
+        if status == "ok" and latency is not None:
+            s["latencies"].append(latency)
+
+    for s in stages.values():
+        latencies = s.pop("latencies")
+        timestamps = sorted(s.pop("timestamps"))
+        for q in (0.5, 0.9, 0.99):
+            s[f"latency_p{int(q * 100)}_s"] = percentile(latencies, q)
+        s["cache_hit_rate"] = s["cached_tokens"] / s["prompt_tokens"] if s["prompt_tokens"] else 0.0
+        if wall_s is None and timestamps:
+            span = (datetime.fromisoformat(timestamps[-1]) - datetime.fromisoformat(timestamps[0])).total_seconds()
+        else:
+            span = wall_s
+        s["calls_per_min"] = s["calls"] / span * 60 if span else None
+    return stages
+
+
+def format_summary(stages):
+    def fmt(value, spec):
+        return "–" if value is None else format(value, spec)
+
+    lines = [
+        f"{'Stage':<16} {'Calls':>6} {'DL':>4} {'Retry':>6} {'Prompt':>10} {'Compl.':>8} {'Bild':>8} "
+        f"{'Cache%':>7} {'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'Calls/min':>9} {'USD':>8}"
+    ]
+    for stage, s in sorted(stages.items()):
+        lines.append(
+            f"{stage:<16} {s['calls']:>6} {s['dead_letters']:>4} {s['retries']:>6} {s['prompt_tokens']:>10,} "
+            f"{s['completion_tokens']:>8,} {s['image_tokens']:>8,} {s['cache_hit_rate'] * 100:>6.1f}% "
+            f"{fmt(s['latency_p50_s'], '.2f'):>7} {fmt(s['latency_p90_s'], '.2f'):>7} "
+            f"{fmt(s['latency_p99_s'], '.2f'):>7} {fmt(s['calls_per_min'], '.1f'):>9} {s['cost_usd']:>8.4f}"
+        )
+    return "\n".join(lines)
+
+
+def write_prometheus(stages, path, script=None):
+    """Schreibt die Kennzahlen atomar im Prometheus-Textformat."""
+    job = f'script="{script or "unknown"}"'
+    lines = [
+        "# TYPE llm_calls_total counter", "# TYPE llm_tokens_total counter",
+        "# TYPE llm_retries_total counter", "# TYPE llm_cost_usd_total counter",
+        "# TYPE llm_latency_seconds gauge",
+    ]
+    for stage, s in stages.items():
+        labels = f'{job},stage="{stage}"'
+        lines.append(f'llm_calls_total{{{labels},status="ok"}} {s["calls"] - s["dead_letters"]}')
+        lines.append(f'llm_calls_total{{{labels},status="dead_letter"}} {s["dead_letters"]}')
+        for kind in ("prompt", "completion", "cached", "image"):
+            lines.append(f'llm_tokens_total{{{labels},kind="{kind}"}} {s[f"{kind}_tokens"]}')
+        lines.append(f"llm_retries_total{{{labels}}} {s['retries']}")
+        lines.append(f"llm_cost_usd_total{{{labels}}} {s['cost_usd']:.6f}")
+        for q in (50, 90, 99):
+            if s[f"latency_p{q}_s"] is not None:
+                lines.append(f'llm_latency_seconds{{{labels},quantile="0.{q}"}} {s[f"latency_p{q}_s"]:.4f}')
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zusammenfassung der LLM-Telemetrie.")
+    parser.add_argument("db", nargs="?", default=TELEMETRY_DB)
+    parser.add_argument("--runs", type=int, default=1, help="Anzahl der letzten Läufe")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    runs = conn.execute(
+        "SELECT run_id, script, MIN(started_at) FROM llm_calls GROUP BY run_id ORDER BY MIN(started_at) DESC LIMIT ?",
+        (args.runs,),
+    ).fetchall()
+    for run_id, script, started_at in reversed(runs):
+        print(f"\n## {run_id} ({script}, Start {started_at})")
+        print(format_summary(stage_summary(conn, run_id)))
+
+
+if __name__ == "__main__":
+    main()
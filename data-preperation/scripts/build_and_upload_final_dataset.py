@@ -1,27 +1,29 @@
+import hashlib
+import json
+import math
 import os
-from datasets import load_dataset
-from huggingface_hub import login
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# 1️⃣ Load environment variables and Hugging Face token
+from datasets import load_dataset, load_from_disk
+from dotenv import load_dotenv
+from huggingface_hub import HfApi, login
+
+# 1️⃣ Load environment variables
 load_dotenv()
 HF_TOKEN = os.getenv("HF_TOKEN")
-assert HF_TOKEN, "Please set your Hugging Face token in the .env file as HF_TOKEN."
 
 # 2️⃣ Configurations
 DATASET_NAME_RAW = "Alex23o4/n24news_sample_synthetic_alttext"
 DATASET_NAME_REDUCED = "Alex23o4/n24news_sample_synthetic_alttext_reduced"
-LOCAL_SAVE_PATH = "processed/n24news_reduced"
-
-# Hugging Face Login
-login(token=HF_TOKEN)
+LOCAL_SAVE_PATH = "processed/n24news_reduced"          # Parquet-Shards + shards_manifest.json
+# Offline: lokales Verzeichnis (save_to_disk-Format oder <split>-*.parquet) statt Hub-Download
+LOCAL_DATASET_DIR = os.getenv("LOCAL_DATASET_DIR")
+MAX_SHARD_BYTES = 64 * 1024 * 1024                     # Obergrenze pro Parquet-Shard (unkomprimiert)
+PUSH_TO_HUB = os.getenv("PUSH_TO_HUB", "true").lower() == "true"
+MANIFEST_NAME = "shards_manifest.json"
 
-# 3️⃣ Load Full Dataset
-print("📥 Loading full dataset...")
-raw_ds = load_dataset(DATASET_NAME_RAW)
-
-# 4️⃣ Fields to Retain
+# 3️⃣ Fields to Retain
 FIELDS_TO_KEEP = [
     "abstract",
     "caption",
@@ -33,31 +35,157 @@ FIELDS_TO_KEEP = [
     "image_url_clean",
 ]
 
-# 5️⃣ Transformation Function to Reduce Fields
-def reduce_example(example):
-    return {key: example[key] for key in FIELDS_TO_KEEP}
 
-print("🧹 Reducing dataset...")
-reduced_ds = raw_ds.map(
-    reduce_example,
-    remove_columns=raw_ds["train"].column_names  # Remove all other columns
-)
+def load_raw_dataset():
+    """Lädt den Rohdatensatz vom Hub oder – offline – aus LOCAL_DATASET_DIR."""
+    if not LOCAL_DATASET_DIR:
+        print(f"📥 Loading full dataset from the Hub: {DATASET_NAME_RAW}")
+        return load_dataset(DATASET_NAME_RAW)
+
+    local = Path(LOCAL_DATASET_DIR)
+    print(f"📥 Loading full dataset from local directory: {local}")
+    if (local / "dataset_dict.json").exists():
+        return load_from_disk(str(local))
+    parquet_files = sorted(local.rglob("*.parquet"))
+    splits = sorted({p.name.split("-", 1)[0] for p in parquet_files})
+    return load_dataset(
+        "parquet",
+        data_files={s: [str(p) for p in parquet_files if p.name.startswith(f"{s}-")] for s in splits},
+    )
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_split_shards(split_name, split_ds, output_dir):
+    """
+    Schreibt einen Split als größenbegrenzte Parquet-Shards und gibt pro Shard
+    Statistik (Zeilen, Bytes, Null-Werte je Spalte) und Content-Hash zurück.
+    """
+    num_shards = max(1, math.ceil(split_ds.data.nbytes / MAX_SHARD_BYTES))
+    shards = {}
+    for index in range(num_shards):
+        shard = split_ds.shard(num_shards=num_shards, index=index, contiguous=True)
+        name = f"{split_name}-{index:05d}-of-{num_shards:05d}.parquet"
+        path = Path(output_dir) / name
+        shard.to_parquet(str(path))
+        table = shard.data.table
+        shards[name] = {
+            "split": split_name,
+            "rows": shard.num_rows,
+            "bytes": path.stat().st_size,
+            "sha256": file_sha256(path),
+            "null_counts": {col: table.column(col).null_count for col in table.column_names},
+        }
+    return shards
+
+
+def load_manifest(output_dir):
+    path = Path(output_dir) / MANIFEST_NAME
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
 
-# 6️⃣ Show Example
-print("\n✅ Example after reduction:")
-print(reduced_ds["train"][0])
+def save_manifest(manifest, output_dir):
+    path = Path(output_dir) / MANIFEST_NAME
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
 
-# 7️⃣ (Optional) Save Locally
-if LOCAL_SAVE_PATH:
-    print(f"💾 Saving dataset locally to {LOCAL_SAVE_PATH}...")
+
+def upload_changed_shards(manifest, output_dir):
+    """
+    Lädt nur Shards hoch, deren Hash sich seit dem letzten Upload geändert hat oder
+    die im Repo fehlen, und entfernt Shards im Repo, die es lokal nicht mehr gibt.
+    Verglichen wird mit dem tatsächlichen Repo-Inhalt, damit auch Shards aus Läufen
+    mit PUSH_TO_HUB=false (andere Shard-Anzahl) erkannt werden. Das Manifest wird
+    nach jedem Upload gesichert; ein abgebrochener Lauf setzt beim nächsten Shard fort.
+    """
+    api = HfApi()
+    remote = {
+        path[len("data/"):]
+        for path in api.list_repo_files(DATASET_NAME_REDUCED, repo_type="dataset")
+        if path.startswith("data/") and path.endswith(".parquet")
+    }
+    changed = [name for name, info in manifest.items()
+               if info.get("uploaded_sha256") != info["sha256"] or name not in remote]
+    removed = sorted(remote - set(manifest))
+
+    for name in changed:
+        print(f"🚀 Uploading {name}...")
+        api.upload_file(
+            path_or_fileobj=str(Path(output_dir) / name),
+            path_in_repo=f"data/{name}",
+            repo_id=DATASET_NAME_REDUCED,
+            repo_type="dataset",
+            commit_message=f"Update shard {name}",
+        )
+        manifest[name]["uploaded_sha256"] = manifest[name]["sha256"]
+        save_manifest(manifest, output_dir)
+    for name in removed:
+        print(f"🗑️ Removing stale shard {name}...")
+        api.delete_file(path_in_repo=f"data/{name}", repo_id=DATASET_NAME_REDUCED, repo_type="dataset")
+
+    print(f"✅ {len(changed)} shard(s) uploaded, {len(removed)} removed, "
+          f"{len(manifest) - len(changed)} unchanged.")
+
+
+def main():
+    raw_ds = load_raw_dataset()
+
+    # 4️⃣ Reine Spaltenprojektion statt zeilenweisem map()
+    print("🧹 Reducing dataset...")
+    reduced_ds = raw_ds.select_columns(FIELDS_TO_KEEP)
+
+    # 5️⃣ Show Example
+    first_split = next(iter(reduced_ds))
+    print("\n✅ Example after reduction:")
+    print(reduced_ds[first_split][0])
+
+    # 6️⃣ Splits parallel als Parquet-Shards schreiben
     os.makedirs(LOCAL_SAVE_PATH, exist_ok=True)
-    reduced_ds.save_to_disk(LOCAL_SAVE_PATH)
+    previous = load_manifest(LOCAL_SAVE_PATH)
+    print(f"💾 Writing shards to {LOCAL_SAVE_PATH}...")
+    with ThreadPoolExecutor(max_workers=len(reduced_ds)) as pool:
+        futures = [
+            pool.submit(write_split_shards, name, split_ds, LOCAL_SAVE_PATH)
+            for name, split_ds in reduced_ds.items()
+        ]
+        manifest = {}
+        for future in futures:
+            manifest.update(future.result())
+    for name, info in manifest.items():
+        if "uploaded_sha256" in previous.get(name, {}):
+            info["uploaded_sha256"] = previous[name]["uploaded_sha256"]
+
+    # Alte Shards, die es nicht mehr gibt (z.B. andere Shard-Anzahl), lokal entfernen
+    for name in previous:
+        if name not in manifest:
+            (Path(LOCAL_SAVE_PATH) / name).unlink(missing_ok=True)
+
+    for name, info in sorted(manifest.items()):
+        print(f"  {name}: {info['rows']} rows, {info['bytes'] / 1e6:.1f} MB, sha256 {info['sha256'][:12]}")
+
+    # uploaded_sha256 beschreibt nur den Stand im Repo; noch nicht hochgeladene Shards
+    # weichen davon ab und werden beim nächsten Push erneut versucht
+    save_manifest(manifest, LOCAL_SAVE_PATH)
+
+    # 7️⃣ (Optional) Nur geänderte Shards zum Hub pushen
+    if PUSH_TO_HUB:
+        assert HF_TOKEN, "Please set your Hugging Face token in the .env file as HF_TOKEN (or PUSH_TO_HUB=false)."
+        login(token=HF_TOKEN)
+        upload_changed_shards(manifest, LOCAL_SAVE_PATH)
 
-# 8️⃣ (Optional) Push to Hugging Face Hub
-push_to_hub = True  # Set to False if you don't want to push
+    print("\n🎉 All done! Reduced dataset is ready.")
 
-if push_to_hub:
-    print(f"🚀 Pushing reduced dataset to Hugging Face Hub as '{DATASET_NAME_REDUCED}'...")
-    reduced_ds.push_to_hub(DATASET_NAME_REDUCED)
 
-print("\n🎉 All done! Reduced dataset is ready.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Vergleicht die Anreicherungs-Modi aus enrich_alttext_openai.py auf derselben
+Stichprobe: zwei getrennte Vision-Calls (Generierung + Verfeinerung), einmal
+mit Verfeinerung jedes Entwurfs und einmal nur auffälliger Entwürfe
+(SELECTIVE_REFINEMENT), gegen einen kombinierten Call mit Structured Output.
+
+Qualität über dieselben Analysen wie final_dataset_analyzis.py (Längen, leere
+und zu lange Alt-Texte) und die Lint-Regeln aus common/alt_text_checks.py,
+Kosten über die Telemetrie der beiden Läufe.
+
+    python scripts/compare_enrich_modes.py --n 50
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from enrich_alttext_openai import (
+    ENRICH_MODES, INPUT_PATH, PROMPT_GEN_PATH, PROMPT_REF_PATH, client, load_prompt, refinement_stats, telemetry,
+)
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.alt_text_checks import LINT_RULES, MAX_ALT_TEXT_LENGTH, clean_text, lint_alt_text, token_jaccard  # noqa: E402
+from common.openai_client import MAX_CONCURRENCY, imap_bounded  # noqa: E402
+from common.telemetry import stage_summary  # noqa: E402
+
+OUTPUT_DIR = "results/enrich_mode_comparison"
+SEED = 42
+
+# Telemetrie-Stages pro Modus
+MODE_STAGES = {
+    "two_call": ("generation", "refinement"),
+    "single_call": ("generate_refine",),
+}
+# Vergleichsarme: Name → (Modus, Keyword-Argumente). "two_call" verfeinert jeden Entwurf (der
+# ursprüngliche Zwei-Call-Pfad), "two_call_selective" nur Entwürfe mit Lint-Treffern.
+ARMS = {
+    "two_call": ("two_call", {"selective": False}),
+    "two_call_selective": ("two_call", {"selective": True}),
+    "single_call": ("single_call", {}),
+}
+COST_FIELDS = ("calls", "dead_letters", "prompt_tokens", "image_tokens", "completion_tokens", "cost_usd")
+
+
+def load_sample(path, n, seed=SEED):
+    with open(path, "r", encoding="utf-8") as f:
+        data = [item for item in json.load(f) if item.get("image_url_clean")]
+    return random.Random(seed).sample(data, min(n, len(data)))
+
+
+def run_mode(mode, sample, gen_prompt, ref_prompt, **kwargs):
+    """Reichert die Stichprobe in einem Modus an; gibt ({image_id: (initial, refined)}, Laufzeit in s) zurück."""
+    fn = ENRICH_MODES[mode]
+
+    def enrich(item):
+        return item.get("image_id"), fn(
+            item["image_url_clean"], item.get("headline", ""), item.get("abstract", ""), item.get("caption", ""),
+            gen_prompt, ref_prompt, item_id=item.get("image_id"), **kwargs,
+        )
+
+    t0 = time.perf_counter()
+    results = dict(imap_bounded(enrich, sample, max_workers=MAX_CONCURRENCY))
+    return results, time.perf_counter() - t0
+
+
+def text_metrics(texts, items):
+    """Längen- und Lint-Kennzahlen wie in final_dataset_analyzis.py, ergänzt um die Lint-Regeln."""
+    lengths = pd.Series([len(clean_text(t)) for t in texts], dtype=float)
+    row = {
+        "mean_length": lengths.mean(),
+        "median_length": lengths.median(),
+        "std_length": lengths.std(),
+        "max_length": lengths.max(),
+        "num_empty": int((lengths == 0).sum()),
+        "num_long": int((lengths > MAX_ALT_TEXT_LENGTH).sum()),
+    }
+    hits = [lint_alt_text(t, it.get("caption", ""), it.get("headline", ""), it.get("abstract", ""))
+            for t, it in zip(texts, items)]
+    for rule in LINT_RULES:
+        row[f"lint_{rule}"] = sum(rule in h for h in hits) / len(hits) if hits else 0.0
+    row["lint_clean_share"] = sum(not h for h in hits) / len(hits) if hits else 0.0
+    return row
+
+
+def cost_metrics(mode):
+    """Bisherige Summen der Telemetrie-Stages eines Modus in diesem Lauf."""
+    stages = stage_summary(telemetry.conn, telemetry.run_id)
+    rows = [stages[s] for s in MODE_STAGES[mode] if s in stages]
+    return {field: sum(r[field] for r in rows) for field in COST_FIELDS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergleicht Zwei-Call- (mit/ohne selektive Verfeinerung) und Single-Call-Anreicherung.")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--n", type=int, default=50, help="Größe der Stichprobe")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sample = load_sample(args.input, args.n, args.seed)
+    gen_prompt, ref_prompt = load_prompt(PROMPT_GEN_PATH), load_prompt(PROMPT_REF_PATH)
+    print(f"📥 Stichprobe: {len(sample)} Artikel aus {args.input}")
+
+    # Beide two_call-Arme teilen sich die Telemetrie-Stages → Kosten als Differenz vor/nach jedem Arm
+    outputs, wall, costs, refinement = {}, {}, {}, {}
+    for arm, (mode, kwargs) in ARMS.items():
+        print(f"🔄 Arm {arm} ...")
+        before = cost_metrics(mode)
+        refinement_stats.clear()
+        outputs[arm], wall[arm] = run_mode(mode, sample, gen_prompt, ref_prompt, **kwargs)
+        after = cost_metrics(mode)
+        costs[arm] = {field: after[field] - before[field] for field in COST_FIELDS}
+        refinement[arm] = dict(refinement_stats)
+
+    summary_rows, sample_rows = [], []
+    for arm in ARMS:
+        for field, pos in (("initial", 0), ("refined", 1)):
+            texts = [outputs[arm].get(it.get("image_id"), (None, None))[pos] for it in sample]
+            summary_rows.append({"mode": arm, "field": field, **text_metrics(texts, sample), **costs[arm]})
+    for row in summary_rows:
+        row["items_per_min"] = len(sample) / wall[row["mode"]] * 60 if wall[row["mode"]] else None
+
+    for it in sample:
+        row = {"image_id": it.get("image_id"), "headline": it.get("headline", "")}
+        for arm in ARMS:
+            initial, refined = outputs[arm].get(it.get("image_id"), (None, None))
+            row[f"{arm}_initial"], row[f"{arm}_refined"] = initial, refined
+            row[f"{arm}_lint"] = ",".join(lint_alt_text(refined, it.get("caption", ""), it.get("headline", ""),
+                                                        it.get("abstract", "")))
+        row["refined_jaccard"] = token_jaccard(row["two_call_refined"], row["single_call_refined"])
+        sample_rows.append(row)
+
+    df_summary = pd.DataFrame(summary_rows)
+    df_samples = pd.DataFrame(sample_rows)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    df_summary.to_csv(f"{OUTPUT_DIR}/summary.csv", index=False)
+    df_samples.to_csv(f"{OUTPUT_DIR}/side_by_side.csv", index=False)
+
+    print("\n## Qualität (Länge + Lint-Anteile)")
+    quality_cols = ["mode", "field", "mean_length", "median_length", "num_empty", "num_long",
+                    *[f"lint_{r}" for r in LINT_RULES], "lint_clean_share"]
+    print(df_summary[quality_cols].to_markdown(index=False, floatfmt=".2f"))
+    print("\n## Kosten und Durchsatz")
+    cost_cols = ["mode", "calls", "dead_letters", "prompt_tokens", "image_tokens", "completion_tokens", "cost_usd", "items_per_min"]
+    print(df_summary[df_summary["field"] == "refined"][cost_cols].to_markdown(index=False, floatfmt=".4f"))
+    print(f"\n🔁 Übereinstimmung der verfeinerten Fassungen two_call vs. single_call (Token-Jaccard): "
+          f"Mittel {df_samples['refined_jaccard'].mean():.2f}, Median {df_samples['refined_jaccard'].median():.2f}")
+    selective = refinement["two_call_selective"]
+    if selective.get("drafts"):
+        print(f"✂️ two_call_selective: Verfeinerung für {selective.get('skipped', 0)}/{selective['drafts']} "
+              f"Entwürfe übersprungen (lokale Checks bestanden)")
+    client_summary = client.summary()
+    if client_summary["dead_letters"]:
+        print(f"⚠️ {client_summary['dead_letters']} Calls endgültig fehlgeschlagen (siehe Dead-Letter-Datei)")
+    telemetry.close()
+    print(f"💾 Ergebnisse gespeichert unter: {OUTPUT_DIR}/summary.csv und {OUTPUT_DIR}/side_by_side.csv")
+
+
+if __name__ == "__main__":
+    main()
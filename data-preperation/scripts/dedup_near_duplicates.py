@@ -0,0 +1,421 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# --------------------------------------------------------------------
+# Konfiguration
+# --------------------------------------------------------------------
+INPUT_PATH = "data/processed/full_sampled_with_image_url_clean.json"
+OUTPUT_PATH = "data/processed/full_sampled_deduplicated.json"
+REPORT_PATH = "results/dedup_report.json"
+IMAGE_DIR = "data/images"          # lokal gecachte Bilder: <image_id>.jpg (download_images.py)
+MIN_IMAGE_COVERAGE = 0.9           # darunter Warnung: Bild-Duplikate werden nur teilweise erkannt
+MODE = "group"                     # "drop" = Duplikate entfernen, "group" = dedup_group setzen (Split-Pinning)
+SEED = 42
+
+# Bilder: 64-bit pHash, Multi-Index-Hashing mit 4 Bändern à 16 Bit. Bei Hamming ≤ 6 weicht
+# mindestens ein Band in ≤ 6 // 4 = 1 Bit ab → pro Band den eigenen Schlüssel und alle
+# 1-Bit-Nachbarn abfragen (Multi-Probe). Exakt, aber mit ~n/65536 statt ~n/256 Einträgen pro Bucket.
+IMAGE_BANDS = 4
+IMAGE_HAMMING_THRESHOLD = 6
+IMAGE_MAX_CHUNK_PAIRS = 2_000_000  # Kandidatenpaare pro Block → Speicher auch bei schiefen Buckets begrenzt
+DHASH_HAMMING_THRESHOLD = 10       # zweite Bestätigung der pHash-Kandidaten
+
+# Text: MinHash über Wort-3-Gramme aus Headline + Caption
+NUM_PERM = 128
+TEXT_BANDS = 32                    # 32 Bänder × 4 Zeilen → Kandidaten ab ~0.42 Jaccard
+TEXT_JACCARD_THRESHOLD = 0.7
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = np.uint64(4294967311)  # Primzahl > 2^32, a*h+b bleibt in uint64
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# --------------------------------------------------------------------
+# Perzeptuelle Bild-Hashes
+# --------------------------------------------------------------------
+def _dct_matrix(n):
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits):
+    return int("".join("1" if b else "0" for b in bits.flatten()), 2)
+
+
+def phash(img):
+    """pHash: 8×8 niederfrequente DCT-Koeffizienten eines 32×32-Graustufenbilds vs. Median."""
+    pixels = np.asarray(img.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    dct = _DCT32 @ pixels @ _DCT32.T
+    low = dct[:8, :8].flatten()[1:]   # DC-Anteil ignorieren
+    return _bits_to_int(np.append(low > np.median(low), False))
+
+
+def dhash(img):
+    """dHash: Helligkeitsgradient zwischen benachbarten Pixeln eines 9×8-Bilds."""
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_hashes(entries, image_dir=IMAGE_DIR):
+    """pHash/dHash pro Eintrag mit lokal vorhandenem Bild (sonst None)."""
+    hashes = []
+    for entry in entries:
+        path = Path(image_dir) / f"{entry.get('image_id')}.jpg"
+        if not path.exists():
+            hashes.append(None)
+            continue
+        try:
+            with Image.open(path) as img:
+                hashes.append((phash(img), dhash(img)))
+        except OSError:
+            hashes.append(None)
+    return hashes
+
+# --------------------------------------------------------------------
+# MinHash für Headline + Caption
+# --------------------------------------------------------------------
+def _permutations(num_perm, seed):
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingles(text):
+    tokens = _WORD_RE.findall(str(text or "").lower())
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, seed=SEED):
+    """Deterministische MinHash-Signaturen (crc32 statt des pro Prozess gesalzenen hash())."""
+    a, b = _permutations(num_perm, seed)
+    sigs = np.full((len(texts), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        sh = shingles(text)
+        if not sh:
+            continue
+        h = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.uint64, count=len(sh))
+        sigs[i] = ((a[:, None] * h[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+    return sigs
+
+# --------------------------------------------------------------------
+# LSH & Clustering
+# --------------------------------------------------------------------
+def lsh_candidates(band_keys, max_bucket=50):
+    """band_keys: Liste pro Eintrag mit je einem hashbaren Schlüssel pro Band."""
+    buckets = defaultdict(list)
+    for i, keys in enumerate(band_keys):
+        if keys is None:
+            continue
+        for band, key in enumerate(keys):
+            buckets[(band, key)].append(i)
+    pairs = set()
+    for members in buckets.values():
+        if len(members) <= 1:
+            continue
+        if len(members) <= max_bucket:
+            pairs.update((x, y) for k, x in enumerate(members) for y in members[k + 1:])
+        else:
+            # Sehr große Buckets: Stern um den ersten Eintrag plus Kette statt O(k²) Paaren
+            pairs.update((members[0], y) for y in members[1:])
+            pairs.update(zip(members[1:], members[2:]))
+    return pairs
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount64(x):
+    return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1)
+
+
+def _probe_masks(bits, radius):
+    """Alle XOR-Masken mit ≤ radius gesetzten Bits (inkl. 0) für einen Bandschlüssel."""
+    return np.array(
+        [sum(1 << b for b in combo) for r in range(radius + 1) for combo in itertools.combinations(range(bits), r)],
+        dtype=np.uint64,
+    )
+
+
+def image_duplicate_pairs(hashes):
+    """
+    Exakte Suche aller pHash-Paare mit Hamming ≤ IMAGE_HAMMING_THRESHOLD per
+    Multi-Index-Hashing: pro Band werden Einträge mit gleichem Bandschlüssel oder
+    einem Schlüssel im Abstand ≤ radius verglichen. Die Kandidaten werden blockweise
+    (≤ IMAGE_MAX_CHUNK_PAIRS) erzeugt und geprüft, nie als k×k-Matrix pro Bucket.
+    """
+    idx = np.array([i for i, h in enumerate(hashes) if h is not None], dtype=np.int64)
+    stats = {"image_candidate_pairs": 0, "image_largest_bucket": 0}
+    if len(idx) < 2:
+        return set(), stats
+    values = np.array([hashes[i][0] for i in idx], dtype=np.uint64)
+    step = 64 // IMAGE_BANDS
+    radius = IMAGE_HAMMING_THRESHOLD // IMAGE_BANDS
+    masks = _probe_masks(step, radius)
+    band_mask = np.uint64((1 << step) - 1)
+
+    found = []
+    for band in range(IMAGE_BANDS):
+        keys = (values >> np.uint64(band * step)) & band_mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        _, bucket_sizes = np.unique(sorted_keys, return_counts=True)
+        stats["image_largest_bucket"] = max(stats["image_largest_bucket"], int(bucket_sizes.max()))
+        for mask in masks:
+            probe = keys ^ mask
+            left = np.searchsorted(sorted_keys, probe, side="left")
+            counts = np.searchsorted(sorted_keys, probe, side="right") - left
+            # Abfragen so in Blöcke teilen, dass jeder ≤ IMAGE_MAX_CHUNK_PAIRS Kandidaten erzeugt
+            cum = np.cumsum(counts)
+            start = 0
+            while start < len(values):
+                base = cum[start - 1] if start else 0
+                stop = max(start + 1, int(np.searchsorted(cum, base + IMAGE_MAX_CHUNK_PAIRS, side="right")))
+                q = np.repeat(np.arange(start, stop), counts[start:stop])
+                if len(q):
+                    offsets = np.arange(len(q)) - np.repeat(cum[start:stop] - counts[start:stop] - base,
+                                                            counts[start:stop])
+                    c = order[np.repeat(left[start:stop], counts[start:stop]) + offsets]
+                    keep = q < c            # jedes Paar nur einmal, ohne Selbstpaare
+                    q, c = q[keep], c[keep]
+                    stats["image_candidate_pairs"] += len(q)
+                    close = _popcount64(values[q] ^ values[c]) <= IMAGE_HAMMING_THRESHOLD
+                    found.append(q[close] * len(values) + c[close])
+                start = stop
+
+    codes = np.unique(np.concatenate(found)) if found else np.array([], dtype=np.int64)
+    pairs = set(zip(idx[codes // len(values)].tolist(), idx[codes % len(values)].tolist()))
+    return pairs, stats
+
+
+def text_band_keys(sigs):
+    rows = sigs.shape[1] // TEXT_BANDS
+    empty = np.iinfo(np.uint64).max
+    return [
+        None if sig[0] == empty else [sig[b * rows:(b + 1) * rows].tobytes() for b in range(TEXT_BANDS)]
+        for sig in sigs
+    ]
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # kleinster Index bleibt Repräsentant → stabil über Läufe
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def find_duplicates(entries, img_hashes=None):
+    """Gibt (UnionFind, Statistik) für Bild- und Text-Near-Duplicates zurück."""
+    stats = {"items": len(entries)}
+    uf = UnionFind(len(entries))
+
+    t0 = time.perf_counter()
+    texts = [f"{e.get('headline', '')} {e.get('caption', '')}" for e in entries]
+    sigs = minhash_signatures(texts)
+    t1 = time.perf_counter()
+    text_pairs = lsh_candidates(text_band_keys(sigs))
+    text_dups = 0
+    for i, j in text_pairs:
+        if (sigs[i] == sigs[j]).mean() >= TEXT_JACCARD_THRESHOLD:
+            uf.union(i, j)
+            text_dups += 1
+    t2 = time.perf_counter()
+    stats.update({
+        "minhash_seconds": t1 - t0,
+        "text_lsh_seconds": t2 - t1,
+        "text_candidate_pairs": len(text_pairs),
+        "text_duplicate_pairs": text_dups,
+    })
+
+    if img_hashes is not None:
+        t3 = time.perf_counter()
+        image_pairs, image_stats = image_duplicate_pairs(img_hashes)
+        image_pairs = {
+            (i, j) for i, j in image_pairs
+            if bin(img_hashes[i][1] ^ img_hashes[j][1]).count("1") <= DHASH_HAMMING_THRESHOLD
+        }
+        for i, j in image_pairs:
+            uf.union(i, j)
+        stats.update({
+            "images_hashed": sum(h is not None for h in img_hashes),
+            "image_lsh_seconds": time.perf_counter() - t3,
+            **image_stats,
+            "image_duplicate_pairs": len(image_pairs),
+        })
+
+    total = time.perf_counter() - t0
+    stats["dedup_seconds"] = total
+    stats["items_per_second"] = len(entries) / total if total else None
+    return uf, stats
+
+
+def apply_dedup(entries, uf, mode=MODE):
+    """'drop': nur Repräsentanten behalten; 'group': dedup_group = image_id des Repräsentanten."""
+    result = []
+    for i, entry in enumerate(entries):
+        root = uf.find(i)
+        if mode == "drop":
+            if root == i:
+                result.append(entry)
+        else:
+            entry["dedup_group"] = entries[root].get("image_id")
+            result.append(entry)
+    return result
+
+# --------------------------------------------------------------------
+# Benchmark
+# --------------------------------------------------------------------
+BENCHMARK_WIDTH = 600             # wie die "articleLarge"-Bilder des Datensatzes
+
+
+def write_benchmark_images(sources, n_items, out_dir, rng):
+    """
+    n_items JPEGs aus echten Fotos: zuerst die Quellbilder selbst, danach zufällige
+    Ausschnitte/Spiegelungen davon; ~5 % sind neu kodierte Kopien früherer Bilder
+    (echte Near-Duplicates).
+    """
+    for i in range(n_items):
+        if i >= len(sources) and rng.rand() < 0.05:
+            with Image.open(Path(out_dir) / f"{rng.randint(i)}.jpg") as src:
+                img = src.convert("RGB").resize((BENCHMARK_WIDTH - rng.randint(40), src.height))
+                img.save(Path(out_dir) / f"{i}.jpg", quality=int(rng.randint(60, 90)))
+            continue
+        with Image.open(sources[i % len(sources)]) as src:
+            img = src.convert("RGB")
+        if i >= len(sources):
+            w, h = img.size
+            scale = np.sqrt(rng.uniform(0.5, 1.0))
+            cw, ch = max(8, int(w * scale)), max(8, int(h * scale))
+            x, y = rng.randint(w - cw + 1), rng.randint(h - ch + 1)
+            img = img.crop((x, y, x + cw, y + ch))
+            if rng.rand() < 0.5:
+                img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        img = img.resize((BENCHMARK_WIDTH, max(8, img.height * BENCHMARK_WIDTH // img.width)))
+        img.save(Path(out_dir) / f"{i}.jpg", quality=85)
+
+
+def benchmark(n_items, source_dir=IMAGE_DIR, seed=SEED):
+    """
+    Durchsatz inkl. Dekodieren und Hashen der Bilder. Die Bilder stammen aus echten
+    Fotos in source_dir (Standard: der Bild-Cache des Datensatzes); reichen sie nicht
+    für n_items, werden Ausschnitte davon ergänzt. Die Texte sind synthetisch
+    (~5 % Near-Duplicates).
+    """
+    sources = sorted(p for p in Path(source_dir).rglob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    if not sources:
+        raise FileNotFoundError(f"Keine Bilder in {source_dir} für den Benchmark gefunden.")
+    rng = np.random.RandomState(seed)
+    vocab = np.array([f"w{i}" for i in range(20000)])
+    entries = []
+    for i in range(n_items):
+        if i and rng.rand() < 0.05:
+            src = entries[rng.randint(len(entries))]
+            words = src["caption"].split()
+            words[rng.randint(len(words))] = "edited"
+            entries.append({"image_id": str(i), "headline": src["headline"], "caption": " ".join(words)})
+        else:
+            entries.append({
+                "image_id": str(i),
+                "headline": " ".join(rng.choice(vocab, 8)),
+                "caption": " ".join(rng.choice(vocab, 20)),
+            })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_benchmark_images(sources, n_items, tmp, rng)
+        t0 = time.perf_counter()
+        hashes = image_hashes(entries, tmp)
+        hash_seconds = time.perf_counter() - t0
+    _, stats = find_duplicates(entries, hashes)
+    total = hash_seconds + stats["dedup_seconds"]
+    stats.update({
+        "source_images": len(sources),
+        "image_hash_seconds": hash_seconds,
+        "total_seconds": total,
+        "items_per_second_incl_hashing": n_items / total,
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-Duplicate-Erkennung (pHash/dHash + MinHash/LSH).")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Nur Durchsatz auf N Einträgen messen")
+    parser.add_argument("--benchmark-images", default=IMAGE_DIR, help="Ordner mit echten Fotos für den Benchmark")
+    parser.add_argument("--text-only", action="store_true",
+                        help="Ohne lokale Bilder nur über Headline + Caption deduplizieren")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        stats = benchmark(args.benchmark, args.benchmark_images)
+        print(json.dumps(stats, indent=2))
+        print(f"[✓] {stats['items']} Einträge in {stats['total_seconds']:.1f}s inkl. Hashing "
+              f"({stats['items_per_second_incl_hashing']:.0f} Einträge/s; "
+              f"Hashing {stats['image_hash_seconds']:.1f}s, Dedup {stats['dedup_seconds']:.1f}s)")
+        return
+
+    with open(INPUT_PATH, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    print(f"[INFO] {len(entries)} Einträge geladen, berechne Bild-Hashes aus {IMAGE_DIR}...")
+
+    t0 = time.perf_counter()
+    img_hashes = image_hashes(entries)
+    hash_seconds = time.perf_counter() - t0
+    hashed = sum(h is not None for h in img_hashes)
+    if not hashed and entries and not args.text_only:
+        sys.exit(f"[ERROR] Keine Bilder in {IMAGE_DIR} gefunden – erst `python scripts/download_images.py` "
+                 "ausführen oder mit --text-only nur Texte deduplizieren.")
+    if hashed < MIN_IMAGE_COVERAGE * len(entries) and not args.text_only:
+        print(f"[WARN] Nur {hashed}/{len(entries)} Bilder lokal vorhanden – Bild-Duplikate der übrigen "
+              "Einträge werden nicht erkannt (`python scripts/download_images.py` lädt fehlende nach).")
+    uf, stats = find_duplicates(entries, img_hashes)
+    stats["image_hash_seconds"] = hash_seconds
+
+    result = apply_dedup(entries, uf, MODE)
+    clusters = defaultdict(int)
+    for i in range(len(entries)):
+        clusters[uf.find(i)] += 1
+    stats["duplicate_clusters"] = sum(1 for c in clusters.values() if c > 1)
+    stats["items_in_clusters"] = sum(c for c in clusters.values() if c > 1)
+    stats["mode"] = MODE
+    stats["items_out"] = len(result)
+
+    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+    print(json.dumps(stats, indent=2))
+    print(f"[✓] {stats['duplicate_clusters']} Duplikat-Cluster, {len(result)} Einträge in {OUTPUT_PATH} geschrieben.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Lädt die Bilder der Stichprobe (image_url_clean) nach data/images/<image_id>.jpg,
+den lokalen Bildspeicher für dedup_near_duplicates.py (pHash/dHash) und
+generate_html_preview.py. Bereits vorhandene Bilder werden übersprungen, ein
+erneuter Lauf lädt also nur fehlende bzw. zuvor fehlgeschlagene nach.
+
+    python scripts/download_images.py
+"""
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+
+# --------------------------------------------------------------------
+# Konfiguration
+# --------------------------------------------------------------------
+INPUT_PATH = "data/processed/full_sampled_with_image_url_clean.json"
+IMAGE_DIR = "data/images"          # gleicher Ordner wie in dedup_near_duplicates.py
+MAX_WORKERS = 16
+DOWNLOAD_TIMEOUT = 15
+
+_local = threading.local()
+
+
+def _session():
+    """Eine requests.Session pro Worker-Thread (Keep-Alive zum Bild-CDN)."""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def download_image(entry, image_dir=IMAGE_DIR):
+    """Gibt 'cached', 'downloaded' oder 'failed' zurück; Bilder werden atomar abgelegt."""
+    target = Path(image_dir) / f"{entry.get('image_id')}.jpg"
+    if target.exists():
+        return "cached"
+    url = entry.get("image_url_clean")
+    if not url:
+        return "failed"
+    try:
+        resp = _session().get(url, timeout=DOWNLOAD_TIMEOUT)
+        resp.raise_for_status()
+        Image.open(BytesIO(resp.content)).verify()     # keine HTML-Fehlerseiten als .jpg ablegen
+    except Exception as e:
+        print(f"[WARN] {entry.get('image_id')}: {e}")
+        return "failed"
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(resp.content)
+    os.replace(tmp, target)
+    return "downloaded"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lädt die Bilder der Stichprobe in den lokalen Bildspeicher.")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--image-dir", default=IMAGE_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.image_dir, exist_ok=True)
+    entries = [e for e in iter_json(args.input) if e.get("image_id")]
+    print(f"[INFO] {len(entries)} Einträge, lade fehlende Bilder nach {args.image_dir}...")
+
+    counts = {"cached": 0, "downloaded": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for status in pool.map(lambda entry: download_image(entry, args.image_dir), entries):
+            counts[status] += 1
+
+    print(f"[✓] {counts['downloaded']} geladen, {counts['cached']} bereits vorhanden, "
+          f"{counts['failed']} fehlgeschlagen.")
+    if entries and counts["failed"] == len(entries):
+        sys.exit("[ERROR] Kein Bild geladen – Netzwerkzugriff auf das Bild-CDN prüfen.")
+
+
+if __name__ == "__main__":
+    main()
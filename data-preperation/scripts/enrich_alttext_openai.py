@@ -1,22 +1,44 @@
 import json
-import time
 import logging
+import sys
+import threading
+from collections import Counter
 from datetime import datetime
 import os
-from openai import OpenAI
+from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.alt_text_checks import lint_alt_text  # noqa: E402
+from common.openai_client import MAX_CONCURRENCY, RateLimitedClient, imap_bounded  # noqa: E402
+from common.prompt_prefix import item_messages, load_prompt  # noqa: E402
+from common.telemetry import Telemetry, format_summary  # noqa: E402
+
 # --------------------------------------------------------------------
 # Setup & Konfiguration
 # --------------------------------------------------------------------
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-INPUT_PATH = "data/processed/full_sampled_with_image_url_clean.json"
+# Ausgabe von dedup_near_duplicates.py (mit dedup_group für split_dataset.py)
+INPUT_PATH = "data/processed/full_sampled_deduplicated.json"
 OUTPUT_PATH = "data/processed/full_sampled_with_alttext_augmented.json"
-PROMPT_GEN_PATH = "prompts/alt_text_generation_prompt.txt"
-PROMPT_REF_PATH = "prompts/alt_text_refinement_prompt.txt"
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+PROMPT_GEN_PATH = "src/alt_text_generation_prompt.txt"
+PROMPT_REF_PATH = "src/alt_text_refinement_prompt.txt"
+# Endgültig fehlgeschlagene Calls (nach Retries) landen hier statt stillschweigend im Datensatz zu fehlen
+DEAD_LETTER_PATH = f'logs/dead_letter_enrich_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jsonl'
+# "two_call": Generierung und Verfeinerung als getrennte Vision-Calls (Standard, wie bisher)
+# "single_call": Entwurf und verfeinerte Fassung aus einem Call (halbe Bild-Tokens und Latenz),
+# Vergleich beider Modi: python scripts/compare_enrich_modes.py
+ENRICH_MODE = os.getenv("ENRICH_MODE", "two_call")
+# Nur Entwürfe verfeinern, die die lokalen Checks (Länge, "image of"-Prefix, Caption-Kopie,
+# spekulative Wörter) nicht bestehen; unauffällige Entwürfe werden unverändert übernommen
+SELECTIVE_REFINEMENT = True
+
+refinement_stats = Counter()
+refinement_lock = threading.Lock()
+
+telemetry = Telemetry(script="enrich_alttext_openai")
+client = RateLimitedClient.with_api_key(OPENAI_API_KEY, DEAD_LETTER_PATH, telemetry=telemetry)
 
 def setup_logging():
     logging.basicConfig(
@@ -28,10 +50,6 @@ def setup_logging():
         ]
     )
 
-def load_prompt(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
-
 def load_data():
     with open(INPUT_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -40,76 +58,155 @@ def save_data(data):
     with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
-def generate_alt_text(image_url, headline, abstract, caption, prompt_text):
-    messages = [
-        {"role": "system", "content": prompt_text},
-        {
-        "role": "user",
-        "content": [
-            {
-            "type": "text",
-            "text": 
-                f"Headline: {headline}\n"
-                f"Abstract: {abstract}\n"
-                f"Caption: {caption}\n\n"
-                f"Please describe this image following the guidelines above."
-            },
-            {
-            "type": "image_url",
-            "image_url": {
-                "url": image_url,
-                "detail": "low"
-                }
-            }
-            ]
-        }
-    ]
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=75
-        )
-        return response.model_dump()["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        logging.error(f"Generation failed: {str(e)}")
+# Feste Arbeitsanweisungen gehören zum statischen Prefix (System-Prompt), nicht hinter den Item-Text
+GENERATION_INSTRUCTION = "Please describe this image following the guidelines above."
+REFINEMENT_INSTRUCTION = "Please refine this alt text according to the rules above."
+COMBINED_INSTRUCTION = (
+    "Work in two steps for the image and context below:\n"
+    "1. Write an initial alt text following the generation guidelines.\n"
+    "2. Refine that initial alt text following the refinement rules.\n"
+    'Return ONLY JSON: {"initial": "<initial alt text>", "refined": "<refined alt text>"}'
+)
+
+# Structured Output für den Single-Call-Modus: beide Fassungen in einem Objekt
+COMBINED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "alt_text_draft_and_refined",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"initial": {"type": "string"}, "refined": {"type": "string"}},
+            "required": ["initial", "refined"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def context_text(headline, abstract, caption):
+    return (
+        f"Headline: {headline}\n"
+        f"Abstract: {abstract}\n"
+        f"Caption: {caption}"
+    )
+
+def generate_alt_text(image_url, headline, abstract, caption, prompt_text, item_id=None):
+    messages = item_messages(
+        f"{prompt_text}\n\n{GENERATION_INSTRUCTION}",
+        context_text(headline, abstract, caption),
+        image_url,
+    )
+    response = client.chat(
+        item_id=item_id,
+        stage="generation",
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=75
+    )
+    if response is None:
         return None
+    return response.model_dump()["choices"][0]["message"]["content"].strip()
 
-def refine_alt_text(alt_text, headline, abstract, caption, image_url, prompt_text):
-    messages = [
-        {"role": "system", "content": prompt_text},
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text":
-                    f"Headline: {headline}\n"
-                    f"Abstract: {abstract}\n"
-                    f"Caption: {caption}\n\n"
-                    f"Initial Alt-Text: {alt_text}\n\n"
-                    "Please refine this alt text according to the rules above."
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": image_url,
-                        "detail": "low"
-                    }
-                }
-            ]
-        }
-    ]
+def refine_alt_text(alt_text, headline, abstract, caption, image_url, prompt_text, item_id=None):
+    messages = item_messages(
+        f"{prompt_text}\n\n{REFINEMENT_INSTRUCTION}",
+        f"{context_text(headline, abstract, caption)}\n\nInitial Alt-Text: {alt_text}",
+        image_url,
+    )
+    # Kein stiller Fallback auf den unverfeinerten Text: None + Dead-Letter-Eintrag
+    response = client.chat(
+        item_id=item_id,
+        stage="refinement",
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=75
+    )
+    if response is None:
+        return None
+    return response.model_dump()["choices"][0]["message"]["content"].strip()
+
+def generate_and_refine_alt_text(image_url, headline, abstract, caption, gen_prompt, ref_prompt, item_id=None):
+    """Single-Call-Modus: Entwurf und verfeinerte Fassung aus einem Vision-Call; gibt (initial, refined) zurück."""
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": item_messages(
+            f"{gen_prompt}\n\n{ref_prompt}\n\n{COMBINED_INSTRUCTION}",
+            context_text(headline, abstract, caption),
+            image_url,
+        ),
+        "response_format": COMBINED_RESPONSE_FORMAT,
+        "max_tokens": 200,
+    }
+    response = client.chat(item_id=item_id, stage="generate_refine", **request)
+    if response is None:
+        return None, None
+    content = response.choices[0].message.content or ""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=75
-        )
-        return response.model_dump()["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        logging.error(f"Refinement failed: {str(e)}")
-        return alt_text
+        result = json.loads(content)
+        initial, refined = result["initial"].strip(), result["refined"].strip()
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+        # Ungültige Antwort wie ein endgültig fehlgeschlagener Call behandeln
+        client.dead_letter(item_id, "generate_refine", ValueError(f"{type(e).__name__}: {content[:200]}"), request)
+        return None, None
+    return initial or None, refined or None
+
+def two_call_alt_text(image_url, headline, abstract, caption, gen_prompt, ref_prompt, item_id=None, selective=None):
+    """
+    Zwei-Call-Modus: erst generieren, dann mit demselben Bild verfeinern; gibt (initial, refined) zurück.
+    selective=None übernimmt SELECTIVE_REFINEMENT (compare_enrich_modes.py setzt es pro Arm).
+    """
+    selective = SELECTIVE_REFINEMENT if selective is None else selective
+    initial = generate_alt_text(image_url, headline, abstract, caption, gen_prompt, item_id=item_id)
+    if not initial:
+        return None, None
+    hits = lint_alt_text(initial, caption, headline, abstract)
+    with refinement_lock:
+        refinement_stats["drafts"] += 1
+        refinement_stats["skipped" if selective and not hits else "refined"] += 1
+        refinement_stats.update(f"lint_{h}" for h in hits)
+    if selective and not hits:
+        return initial, initial
+    refined = refine_alt_text(initial, headline, abstract, caption, image_url, ref_prompt, item_id=item_id)
+    return initial, refined
+
+ENRICH_MODES = {
+    "two_call": two_call_alt_text,
+    "single_call": generate_and_refine_alt_text,
+}
+
+def enrich_item(args):
+    i, item, gen_prompt, ref_prompt = args
+    headline = item.get("headline", "")
+    abstract = item.get("abstract", "")
+    caption = item.get("caption", "")
+    image_url = item.get("image_url_clean", "")
+    item_id = item.get("image_id")
+
+    if not image_url:
+        logging.warning(f"[{i}] Kein Bild gefunden – übersprungen")
+        return item
+
+    logging.info(f"[{i}] Generiere Alt-Text für: {headline[:60]}...")
+
+    initial, refined = ENRICH_MODES[ENRICH_MODE](
+        image_url, headline, abstract, caption, gen_prompt, ref_prompt, item_id=item_id
+    )
+    if not initial:
+        return item
+
+    # Datensatz-Eintrag um neue Felder ergänzen
+    item["openai_alt_text_initial"] = initial
+    item["openai_alt_text_refined"] = refined
+
+    logging.info(f"[{i}] ↳ Initial: {initial[:50]}")
+    logging.info(f"[{i}] ↳ Refined: {(refined or '<fehlgeschlagen>')[:50]}")
+    return item
+
+def enrich_failed(job, error):
+    """Unerwarteter Fehler in enrich_item: Eintrag unverändert lassen und in die Dead-Letter-Datei schreiben."""
+    _, item, _, _ = job
+    client.dead_letter(item.get("image_id"), "enrich_item", error, {"image_id": item.get("image_id")})
+    return item
 
 def main():
     setup_logging()
@@ -117,39 +214,31 @@ def main():
     gen_prompt = load_prompt(PROMPT_GEN_PATH)
     ref_prompt = load_prompt(PROMPT_REF_PATH)
 
-    logging.info(f"[✓] Starte Verarbeitung von {len(data)} Artikeln")
-
-    for i, item in enumerate(data, 1):
-        headline = item.get("headline", "")
-        abstract = item.get("abstract", "")
-        caption = item.get("caption", "")
-        image_url = item.get("image_url_clean", "")
-
-        if not image_url:
-            logging.warning(f"[{i}] Kein Bild gefunden – übersprungen")
-            continue
-
-        logging.info(f"[{i}] Generiere Alt-Text für: {headline[:60]}...")
-
-        initial = generate_alt_text(image_url, headline, abstract, caption, gen_prompt)
-        if not initial:
-            continue
-
-        refined = refine_alt_text(initial, headline, abstract, caption, image_url, ref_prompt)
-
-        # Datensatz-Eintrag um neue Felder ergänzen
-        item["openai_alt_text_initial"] = initial
-        item["openai_alt_text_refined"] = refined
+    if ENRICH_MODE not in ENRICH_MODES:
+        raise SystemExit(f"Unbekannter ENRICH_MODE '{ENRICH_MODE}', erlaubt: {', '.join(ENRICH_MODES)}")
 
-        logging.info(f"[{i}] ↳ Initial: {initial[:50]}")
-        logging.info(f"[{i}] ↳ Refined: {refined[:50]}")
+    logging.info(f"[✓] Starte Verarbeitung von {len(data)} Artikeln (Modus: {ENRICH_MODE})")
 
+    # Items laufen parallel; Token-Bucket und AIMD-Limit im Client regeln den tatsächlichen Durchsatz
+    jobs = ((i, item, gen_prompt, ref_prompt) for i, item in enumerate(data, 1))
+    for i, _ in enumerate(imap_bounded(enrich_item, jobs, max_workers=MAX_CONCURRENCY, on_error=enrich_failed), 1):
         if i % 25 == 0:
             save_data(data[:i])
             logging.info(f"[{i}] Zwischenspeicherung durchgeführt")
 
     save_data(data)
+    summary = client.summary()
+    logging.info(f"[✓] API-Calls: {summary['calls']}, Retries: {summary['retries']}, "
+                 f"429: {summary['throttled']}, Dead-Letter: {summary['dead_letters']}")
+    if refinement_stats["drafts"]:
+        rules = ", ".join(f"{k[5:]}: {v}" for k, v in sorted(refinement_stats.items()) if k.startswith("lint_"))
+        logging.info(f"[✓] Verfeinerung übersprungen: {refinement_stats['skipped']}/{refinement_stats['drafts']} "
+                     f"({refinement_stats['skipped'] / refinement_stats['drafts']:.1%}) Entwürfen"
+                     f"{f'; Lint-Treffer: {rules}' if rules else ''}")
+    if summary["dead_letters"]:
+        logging.warning(f"[!] {summary['dead_letters']} Calls endgültig fehlgeschlagen, siehe {DEAD_LETTER_PATH}")
+    logging.info(f"[✓] Telemetrie (Lauf {telemetry.run_id}, {telemetry.db_path}):\n{format_summary(telemetry.close())}")
     logging.info(f"[✓] Verarbeitung abgeschlossen. Ergebnisse gespeichert unter: {OUTPUT_PATH}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
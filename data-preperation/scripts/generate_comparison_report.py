@@ -0,0 +1,215 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.alt_text_checks import LINT_RULES, lint_alt_text  # noqa: E402
+from common.json_stream import iter_json  # noqa: E402
+
+INPUT_JSON = "../evaluation/data/full_sampled_with_judging.json"
+OUTPUT_DIR = "../evaluation/results/alttext_comparison"   # index.html + data.json
+
+# Spalte im Datensatz → Anzeigename; Judging-Feld ist jeweils "judging_<spalte>"
+VARIANTS = {
+    "openai_alt_text_refined": "Referenz",
+    "generated_baseline": "Baseline",
+    "generated_finetuned": "Fine-Tuned",
+    "generated_baseline_no_context": "Baseline ohne Kontext",
+    "generated_finetuned_no_context": "Fine-Tuned ohne Kontext",
+}
+
+CRITERIA = [
+    "visibility_principle",
+    "context_relevance",
+    "entity_naming",
+    "informativeness",
+    "redundancy_avoidance",
+    "style_readability",
+    "total",
+]
+
+
+def encode_scores(judge):
+    if not isinstance(judge, dict):
+        return None
+    return [judge.get(c) if isinstance(judge.get(c), (int, float)) else None for c in CRITERIA]
+
+
+def encode_lint(hits):
+    """Lint-Treffer als Bitmaske in der Reihenfolge von LINT_RULES."""
+    return sum(1 << LINT_RULES.index(h) for h in hits)
+
+
+def build_report_data(entries):
+    """
+    Kompakte, spaltenorientierte Darstellung: Sections werden als Index codiert,
+    pro Variante nur [Text, Scores|null, Lint-Bitmaske].
+    """
+    sections, section_idx, items = [], {}, []
+    for entry in entries:
+        section = entry.get("section", "Unknown")
+        if section not in section_idx:
+            section_idx[section] = len(sections)
+            sections.append(section)
+        variants = []
+        for key in VARIANTS:
+            text = entry.get(key) or ""
+            hits = lint_alt_text(text, entry.get("caption", ""), entry.get("headline", ""), entry.get("abstract", ""))
+            variants.append([text, encode_scores(entry.get(f"judging_{key}")), encode_lint(hits)])
+        items.append([
+            entry.get("image_id", ""),
+            section_idx[section],
+            entry.get("image_url_clean", ""),
+            entry.get("headline", ""),
+            entry.get("caption", ""),
+            variants,
+        ])
+    return {
+        "sections": sections,
+        "variants": list(VARIANTS.values()),
+        "criteria": CRITERIA,
+        "lint_rules": list(LINT_RULES),
+        "items": items,
+    }
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="UTF-8">
+<title>Alt-Text Vergleich</title>
+<style>
+  body { font-family: Arial, sans-serif; background: #f9f9f9; margin: 0; }
+  header { position: sticky; top: 0; z-index: 2; background: #fff; padding: 12px 20px;
+           box-shadow: 0 2px 5px rgba(0,0,0,0.1); display: flex; flex-wrap: wrap; gap: 14px; align-items: center; }
+  header label { font-size: 0.9rem; }
+  #viewport { height: calc(100vh - 70px); overflow-y: auto; position: relative; }
+  #spacer { position: relative; }
+  .row { position: absolute; left: 0; right: 0; height: ROW_HEIGHTpx; box-sizing: border-box; padding: 10px 20px;
+         display: grid; grid-template-columns: 220px repeat(var(--cols), minmax(160px, 1fr)); gap: 12px;
+         border-bottom: 1px solid #ddd; background: #fff; overflow: hidden; }
+  .row img { width: 100%; max-height: 150px; object-fit: cover; border-radius: 4px; background: #eee; }
+  .meta { font-size: 0.8rem; overflow: hidden; }
+  .meta h3 { font-size: 0.9rem; margin: 6px 0 4px; }
+  .variant { font-size: 0.85rem; background: #f0f0f0; border-radius: 4px; padding: 6px 8px; overflow: auto; }
+  .variant b { display: block; margin-bottom: 4px; }
+  .scores { font-family: monospace; font-size: 0.75rem; color: #444; margin-top: 6px; }
+  .lint { display: inline-block; background: #c62828; color: #fff; border-radius: 3px; padding: 0 4px;
+          margin: 4px 4px 0 0; font-size: 0.7rem; }
+  #count { font-weight: bold; }
+</style>
+</head>
+<body>
+<header>
+  <label>Section <select id="f-section"><option value="">alle</option></select></label>
+  <label>Varianten <select id="f-variant" multiple size="2"></select></label>
+  <label>Judge-Total ≤ <select id="f-score"><option value="">egal</option>
+    <option>1</option><option>2</option><option>3</option><option>4</option></select></label>
+  <label>Lint-Regel <select id="f-lint"><option value="">egal</option></select></label>
+  <span id="count"></span>
+  <input type="file" id="f-file" accept=".json" style="display:none">
+</header>
+<div id="viewport"><div id="spacer"></div></div>
+<script>
+const ROW = ROW_HEIGHT, BUFFER = 6;
+let DATA = null, rows = [], shown = [];
+const $ = (id) => document.getElementById(id);
+
+function el(tag, cls, text) {
+  const n = document.createElement(tag);
+  if (cls) n.className = cls;
+  if (text !== undefined) n.textContent = text;
+  return n;
+}
+
+function init(data) {
+  DATA = data;
+  data.sections.forEach((s, i) => $("f-section").append(new Option(s, i)));
+  data.variants.forEach((v, i) => { const o = new Option(v, i); o.selected = true; $("f-variant").append(o); });
+  data.lint_rules.forEach((r, i) => $("f-lint").append(new Option(r, i)));
+  ["f-section", "f-variant", "f-score", "f-lint"].forEach((id) => $(id).addEventListener("change", applyFilters));
+  $("viewport").addEventListener("scroll", () => requestAnimationFrame(render));
+  window.addEventListener("resize", () => requestAnimationFrame(render));
+  applyFilters();
+}
+
+function applyFilters() {
+  const sec = $("f-section").value, score = $("f-score").value, lint = $("f-lint").value;
+  shown = [...$("f-variant").selectedOptions].map((o) => +o.value);
+  const totalIdx = DATA.criteria.indexOf("total");
+  rows = DATA.items.filter((it) => {
+    if (sec !== "" && it[1] !== +sec) return false;
+    const vs = shown.map((v) => it[5][v]);
+    if (score !== "" && !vs.some((v) => v[1] && v[1][totalIdx] !== null && v[1][totalIdx] <= +score)) return false;
+    if (lint !== "" && !vs.some((v) => v[2] & (1 << +lint))) return false;
+    return true;
+  });
+  $("count").textContent = rows.length + " / " + DATA.items.length + " Bilder";
+  $("spacer").style.height = rows.length * ROW + "px";
+  $("spacer").style.setProperty("--cols", shown.length);
+  $("spacer").replaceChildren();
+  render();
+}
+
+function renderRow(it, i) {
+  const row = el("div", "row");
+  row.style.top = i * ROW + "px";
+  const meta = el("div", "meta");
+  const img = el("img");
+  img.loading = "lazy";
+  img.alt = "Artikelbild";
+  if (/^https?:/.test(it[2])) img.src = it[2];
+  meta.append(img, el("h3", "", it[3]), el("div", "", DATA.sections[it[1]] + " · " + it[0]));
+  row.append(meta);
+  shown.forEach((v) => {
+    const [text, scores, lint] = it[5][v];
+    const box = el("div", "variant");
+    box.append(el("b", "", DATA.variants[v]), el("span", "", text || "—"));
+    if (scores) box.append(el("div", "scores", DATA.criteria.map((c, k) => c.slice(0, 4) + ":" + (scores[k] ?? "–")).join(" ")));
+    DATA.lint_rules.forEach((r, k) => { if (lint & (1 << k)) box.append(el("span", "lint", r)); });
+    row.append(box);
+  });
+  return row;
+}
+
+function render() {
+  if (!DATA) return;
+  const vp = $("viewport");
+  const first = Math.max(0, Math.floor(vp.scrollTop / ROW) - BUFFER);
+  const last = Math.min(rows.length, Math.ceil((vp.scrollTop + vp.clientHeight) / ROW) + BUFFER);
+  const nodes = [];
+  for (let i = first; i < last; i++) nodes.push(renderRow(rows[i], i));
+  $("spacer").replaceChildren(...nodes);
+}
+
+fetch("data.json").then((r) => r.json()).then(init).catch(() => {
+  // file:// blockiert fetch in manchen Browsern → Datei manuell auswählen
+  const input = $("f-file");
+  input.style.display = "inline";
+  input.addEventListener("change", () => input.files[0].text().then((t) => init(JSON.parse(t))));
+});
+</script>
+</body>
+</html>
+"""
+
+ROW_HEIGHT = 240
+
+
+def main():
+    print(f"[INFO] Loading data from {INPUT_JSON}...")
+    data = build_report_data(iter_json(INPUT_JSON))
+
+    out = Path(OUTPUT_DIR)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / "data.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    with open(out / "index.html", "w", encoding="utf-8") as f:
+        f.write(PAGE.replace("ROW_HEIGHT", str(ROW_HEIGHT)))
+
+    print(f"[INFO] {len(data['items'])} Einträge, {len(data['variants'])} Varianten")
+    print(f"[INFO] Vergleichsseite gespeichert unter: {out / 'index.html'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,149 +1,245 @@
-import json
 import os
+import re
+import sys
+from html import escape
 from pathlib import Path
-from collections import defaultdict
+from string import Template
 
-INPUT_JSON = "results/sample_review.json"
-OUTPUT_HTML = "results/sample_alt_text_preview.html"
+from PIL import Image
 
-def load_data(path):
-    """Load the JSON data for visualization."""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
 
-def generate_html(data):
-    """Generate an HTML page to review Alt-Texts with navigation and previews."""
-    html = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Alt-Text Review</title>
+INPUT_JSON = "results/sample_review.json"
+OUTPUT_DIR = "results/sample_alt_text_preview"   # index.html + eine Seite pro Section/Seite
+IMAGE_DIR = "data/images"                        # lokaler Bildspeicher: <image_id>.jpg
+THUMB_SIZE = (480, 480)
+CARDS_PER_PAGE = 200                             # begrenzt Seitengewicht & DOM-Größe
+
+STYLE = """
     <style>
-        body {
-            font-family: Arial, sans-serif;
-            background-color: #fafafa;
-            margin: 0;
-            display: flex;
-        }
+        body { font-family: Arial, sans-serif; background-color: #fafafa; margin: 0; display: flex; }
         nav {
-            position: sticky;
-            top: 0;
-            align-self: flex-start;
-            background: #ffffff;
-            padding: 20px;
-            min-width: 250px;
-            height: 100vh;
-            box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-            overflow-y: auto;
+            position: sticky; top: 0; align-self: flex-start; background: #ffffff; padding: 20px;
+            min-width: 250px; height: 100vh; box-shadow: 2px 0 5px rgba(0,0,0,0.1); overflow-y: auto;
         }
         nav h2 { font-size: 1.2rem; margin-bottom: 10px; }
         nav ul { list-style: none; padding-left: 0; }
         nav li { margin-bottom: 8px; }
-        nav a { text-decoration: none; color: #0077cc; }
+        nav a, .pager a { text-decoration: none; color: #0077cc; }
         main { padding: 20px; flex-grow: 1; }
-        .section { margin-bottom: 60px; }
-        .section h2 { margin-top: 40px; border-bottom: 2px solid #ccc; padding-bottom: 5px; }
         .grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(350px, 1fr)); gap: 20px; }
-        .card { 
-            background: white; 
-            border-radius: 8px; 
-            box-shadow: 0 0 8px rgba(0,0,0,0.1); 
-            padding: 15px; 
-            display: flex; 
-            flex-direction: column; 
-            border: 3px solid transparent; 
+        .card {
+            background: white; border-radius: 8px; box-shadow: 0 0 8px rgba(0,0,0,0.1); padding: 15px;
+            display: flex; flex-direction: column; border: 3px solid transparent;
         }
         .card.short { border-color: #0077cc; } /* Blue border */
         .card.long { border-color: #cc0000; } /* Red border */
-        .card img { max-width: 100%; border-radius: 4px; }
+        .card img { max-width: 100%; border-radius: 4px; background: #eee; }
         .card h3 { font-size: 1.1rem; margin: 10px 0 5px; }
         .card p { margin: 4px 0; font-size: 0.9rem; }
         .card a { text-decoration: none; color: #0077cc; font-weight: bold; }
         .alt-text { background: #f0f0f0; padding: 6px 8px; border-radius: 4px; margin-top: 6px; font-family: monospace; }
         .sample-type { font-size: 0.85rem; font-weight: bold; margin-top: 8px; }
+        .pager { margin: 30px 0; display: flex; gap: 20px; }
     </style>
+"""
+
+PAGE_HEAD = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>$title</title>
+$style
 </head>
 <body>
     <nav>
         <h2>Navigation</h2>
         <ul>
-    """
+            <li><a href="index.html">Übersicht</a></li>
+        </ul>
+    </nav>
+    <main>
+        <h1>$title</h1>
+        <div class="grid">
+""")
 
-    sections = sorted(set(entry.get("section", "Unknown Section") for entry in data))
-    for section in sections:
-        section_id = section.replace(" ", "-").lower()
-        html += f'<li><a href="#{section_id}">{section}</a></li>'
+PAGE_FOOT = Template("""
+        </div>
+        <div class="pager">$prev_link $next_link</div>
+    </main>
+</body>
+</html>
+""")
 
-    html += """
+INDEX_PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Alt-Text Review</title>
+$style
+</head>
+<body>
+    <nav>
+        <h2>Navigation</h2>
+        <ul>
+            <li><a href="index.html">Übersicht</a></li>
         </ul>
     </nav>
     <main>
         <h1>Alt-Text Review</h1>
-    """
-
-    section_entries = defaultdict(list)
-    for entry in data:
-        section = entry.get("section", "Unknown Section")
-        section_entries[section].append(entry)
-
-    for section in sections:
-        section_id = section.replace(" ", "-").lower()
-        html += f'<div class="section" id="{section_id}">'
-        html += f'<h2>{section}</h2><div class="grid">'
-
-        for entry in section_entries[section]:
-            image = entry.get("image_url_clean", "")
-            headline = entry.get("headline", "No Title")
-            url = entry.get("article_url", "#")
-            abstract = entry.get("abstract", "")
-            caption = entry.get("caption", "")
-            alt_initial = entry.get("openai_alt_text_initial", "—")
-            alt_refined = entry.get("openai_alt_text_refined", "—")
-            sample_type = entry.get("sample_type", "random").lower()
-
-            # Determine CSS class for the border color
-            sample_class = ""
-            if sample_type == "short":
-                sample_class = "short"
-            elif sample_type == "long":
-                sample_class = "long"
-
-            html += f"""
-            <div class="card {sample_class}">
-                <img src="{image}" alt="Article Image">
-                <h3><a href="{url}" target="_blank">{headline}</a></h3>
-                <p><strong>Abstract:</strong> {abstract}</p>
-                <p><strong>Caption:</strong> {caption}</p>
+        <ul>
+$items
+        </ul>
+    </main>
+</body>
+</html>
+""")
+
+CARD = Template("""
+            <div class="card $sample_class">
+                <img src="$image" alt="Article Image" loading="lazy" decoding="async">
+                <h3><a href="$url" target="_blank" rel="noopener">$headline</a></h3>
+                <p><strong>Abstract:</strong> $abstract</p>
+                <p><strong>Caption:</strong> $caption</p>
                 <p><strong>Initial Alt-Text:</strong></p>
-                <div class="alt-text">{alt_initial}</div>
+                <div class="alt-text">$alt_initial</div>
                 <p><strong>Refined Alt-Text:</strong></p>
-                <div class="alt-text">{alt_refined}</div>
-                <p class="sample-type">Sample Type: {sample_type.capitalize()}</p>
+                <div class="alt-text">$alt_refined</div>
+                <p class="sample-type">Sample Type: $sample_type</p>
             </div>
-            """
+""")
 
-        html += "</div></div>"
 
-    html += """
-    </main>
-</body>
-</html>
-    """
-    return html
+def slugify(section, taken=()):
+    """Dateiname für eine Section; bei Kollision (z.B. "U.S." und "U S") mit Suffix -2, -3, …"""
+    base = re.sub(r"[^a-z0-9]+", "-", section.lower()).strip("-") or "section"
+    slug, n = base, 1
+    while slug in taken:
+        n += 1
+        slug = f"{base}-{n}"
+    return slug
 
-def main():
-    print("[INFO] Loading JSON data...")
-    data = load_data(INPUT_JSON)
 
-    print(f"[INFO] Generating HTML preview for {len(data)} entries...")
-    html_content = generate_html(data)
+def safe_url(url):
+    """Nur http(s)-Links übernehmen, alles andere wird zu '#'."""
+    url = str(url or "")
+    return url if url.startswith(("http://", "https://")) else "#"
+
 
-    Path(os.path.dirname(OUTPUT_HTML)).mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
-        f.write(html_content)
+def thumbnail_for(entry, output_dir):
+    """
+    Liefert den Bildpfad für die Karte: ein verkleinertes Thumbnail aus dem lokalen
+    Bildspeicher (einmalig erzeugt), sonst die Original-URL als Fallback.
+    """
+    image_id = entry.get("image_id")
+    source = Path(IMAGE_DIR) / f"{image_id}.jpg"
+    if image_id and source.exists():
+        thumb = Path(output_dir) / "thumbs" / f"{image_id}.jpg"
+        if not thumb.exists() or thumb.stat().st_mtime < source.stat().st_mtime:
+            thumb.parent.mkdir(parents=True, exist_ok=True)
+            with Image.open(source) as img:
+                img = img.convert("RGB")
+                img.thumbnail(THUMB_SIZE)
+                img.save(thumb, "JPEG", quality=80, optimize=True)
+        return f"thumbs/{thumb.name}"
+    return safe_url(entry.get("image_url_clean", ""))
+
+
+def render_card(entry, output_dir):
+    sample_type = str(entry.get("sample_type", "random")).lower()
+    sample_class = sample_type if sample_type in ("short", "long") else ""
+    return CARD.substitute(
+        sample_class=sample_class,
+        image=escape(thumbnail_for(entry, output_dir), quote=True),
+        url=escape(safe_url(entry.get("article_url", "#")), quote=True),
+        headline=escape(str(entry.get("headline", "No Title"))),
+        abstract=escape(str(entry.get("abstract", ""))),
+        caption=escape(str(entry.get("caption", ""))),
+        alt_initial=escape(str(entry.get("openai_alt_text_initial", "—"))),
+        alt_refined=escape(str(entry.get("openai_alt_text_refined", "—"))),
+        sample_type=escape(sample_type.capitalize()),
+    )
+
+
+class SectionWriter:
+    """Schreibt die Karten einer Section direkt auf Platte, max. CARDS_PER_PAGE pro Seite."""
+
+    def __init__(self, section, output_dir, slug):
+        self.section = section
+        self.slug = slug
+        self.output_dir = output_dir
+        self.count = 0
+        self.pages = 0
+        self.handle = None
+
+    def page_name(self, page):
+        return f"{self.slug}-{page}.html"
+
+    def _open_page(self):
+        self.pages += 1
+        self.handle = open(Path(self.output_dir) / self.page_name(self.pages), "w", encoding="utf-8")
+        title = escape(f"{self.section} – Seite {self.pages}")
+        self.handle.write(PAGE_HEAD.substitute(title=title, style=STYLE))
+
+    def _close_page(self, has_next):
+        prev_link = f'<a href="{self.page_name(self.pages - 1)}">← Zurück</a>' if self.pages > 1 else ""
+        next_link = f'<a href="{self.page_name(self.pages + 1)}">Weiter →</a>' if has_next else ""
+        self.handle.write(PAGE_FOOT.substitute(prev_link=prev_link, next_link=next_link))
+        self.handle.close()
+        self.handle = None
+
+    def write(self, entry):
+        if self.handle is None:
+            self._open_page()
+        elif self.count % CARDS_PER_PAGE == 0:
+            self._close_page(has_next=True)
+            self._open_page()
+        self.handle.write(render_card(entry, self.output_dir))
+        self.count += 1
+
+    def close(self):
+        if self.handle is not None:
+            self._close_page(has_next=False)
+
+
+def write_index(writers, output_dir):
+    items = []
+    for section in sorted(writers):
+        w = writers[section]
+        pages = " ".join(
+            f'<a href="{w.page_name(p)}">{p}</a>' for p in range(1, w.pages + 1)
+        )
+        items.append(f"            <li><strong>{escape(section)}</strong> ({w.count} Einträge) – Seiten: {pages}</li>")
+    with open(Path(output_dir) / "index.html", "w", encoding="utf-8") as f:
+        f.write(INDEX_PAGE.substitute(style=STYLE, items="\n".join(items)))
+
+
+def generate_html(entries, output_dir=OUTPUT_DIR):
+    """Streamt alle Einträge als HTML-Seiten pro Section nach `output_dir`."""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    writers = {}
+    total = 0
+    try:
+        for entry in entries:
+            section = str(entry.get("section", "Unknown Section"))
+            if section not in writers:
+                slug = slugify(section, taken={w.slug for w in writers.values()})
+                writers[section] = SectionWriter(section, output_dir, slug)
+            writers[section].write(entry)
+            total += 1
+    finally:
+        for w in writers.values():
+            w.close()
+    write_index(writers, output_dir)
+    return total
+
+
+def main():
+    print(f"[INFO] Streaming JSON data from {INPUT_JSON}...")
+    total = generate_html(iter_json(INPUT_JSON), OUTPUT_DIR)
+    print(f"[INFO] HTML preview for {total} entries saved to: {os.path.join(OUTPUT_DIR, 'index.html')}")
 
-    print(f"[INFO] HTML file saved to: {OUTPUT_HTML}")
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,19 @@
+import argparse
 import json
 import random
+import sys
 from collections import defaultdict
+from pathlib import Path
 import os
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+
+
+def clean_image_url(raw_url):
+    """Bild-URL ohne GET-Parameter."""
+    return (raw_url or "").split("?", 1)[0]
+
 def sample_by_category_with_clean_image_url(
     input_json_path,
     output_json_path,
@@ -49,9 +60,7 @@ def sample_by_category_with_clean_image_url(
 
         for s in selected:
             new_entry = dict(s)  # Kopie des Originaleintrags
-            raw_url = s.get("image", "")
-            base_url = raw_url.split("?", 1)[0]
-            new_entry["image_url_clean"] = base_url  # Neues Feld ergänzen
+            new_entry["image_url_clean"] = clean_image_url(s.get("image", ""))  # Neues Feld ergänzen
             sampled.append(new_entry)
 
     os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
@@ -62,9 +71,80 @@ def sample_by_category_with_clean_image_url(
     print(f"[✓] Gesamtanzahl: {len(sampled)} Einträge in {output_json_path} geschrieben.")
 
 
+class JsonArrayWriter:
+    """Schreibt Einträge nacheinander als JSON-Array, ohne die Liste im Speicher zu halten."""
+
+    def __init__(self, path):
+        self.f = open(path, "w", encoding="utf-8")
+        self.count = 0
+        self.f.write("[")
+
+    def write(self, item):
+        self.f.write(",\n" if self.count else "\n")
+        self.f.write(json.dumps(item, ensure_ascii=False, indent=2))
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]\n" if self.count else "]\n")
+        self.f.close()
+
+
+def stream_sample_by_category_with_clean_image_url(
+    input_json_path,
+    output_json_path,
+    category_key="section",
+    max_per_category=400,
+    seed=42
+):
+    """
+    Streaming-Variante von `sample_by_category_with_clean_image_url`.
+
+    Liest die Eingabe inkrementell (JSON-Array via ijson oder JSONL) und hält pro
+    Kategorie nur ein Reservoir mit `max_per_category` Einträgen (Algorithmus R).
+    Der Speicherbedarf ist damit O(Kategorien × max_per_category), unabhängig von
+    der Korpusgröße. Bei gleicher Eingabe und gleichem `seed` ist das Ergebnis
+    reproduzierbar. Die Ausgabe wird Eintrag für Eintrag geschrieben.
+    """
+    rng = random.Random(seed)
+    reservoirs = defaultdict(list)
+    seen = defaultdict(int)
+
+    for item in iter_json(input_json_path):
+        cat = item.get(category_key, "UNKNOWN")
+        seen[cat] += 1
+        reservoir = reservoirs[cat]
+        if len(reservoir) < max_per_category:
+            reservoir.append(item)
+        else:
+            j = rng.randrange(seen[cat])
+            if j < max_per_category:
+                reservoir[j] = item
+
+    os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
+    writer = JsonArrayWriter(output_json_path)
+    try:
+        for cat, reservoir in reservoirs.items():
+            for item in reservoir:
+                item["image_url_clean"] = clean_image_url(item.get("image", ""))
+                writer.write(item)
+    finally:
+        writer.close()
+
+    print(f"[✓] {sum(seen.values())} Einträge gelesen, {len(reservoirs)} Kategorien.")
+    print(f"[✓] Gesamtanzahl: {writer.count} Einträge in {output_json_path} geschrieben.")
+
+
 # Beispielhafte Ausführung
 if __name__ == "__main__":
-    sample_by_category_with_clean_image_url(
+    parser = argparse.ArgumentParser(description="Kategoriebasiertes Sampling mit bereinigter Bild-URL.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Eingabe inkrementell lesen (Reservoir pro Kategorie) statt komplett zu laden")
+    args = parser.parse_args()
+
+    # Standard bleibt das bisherige In-Memory-Sampling (identische Stichprobe wie in der Arbeit);
+    # --stream zieht bei gleichem Seed eine andere, aber ebenso reproduzierbare Stichprobe
+    sample = stream_sample_by_category_with_clean_image_url if args.stream else sample_by_category_with_clean_image_url
+    sample(
         input_json_path="data/raw/nytimes.json",
         output_json_path="data/processed/full_sampled_with_image_url_clean.json",
         category_key="section",
@@ -1,26 +1,146 @@
 from dotenv import load_dotenv
+import hashlib
+import json
 import os
+from collections import defaultdict
+from datetime import datetime
 from datasets import load_dataset, DatasetDict, ClassLabel, Features
-import wandb
-from huggingface_hub import login
+from datasets.exceptions import DatasetNotFoundError
+try:
+    import wandb
+except ImportError:     # offline ohne W&B: Splits und Zustand liegen ohnehin lokal
+    wandb = None
+from huggingface_hub import login, HfApi
 
 # Load .env variables
 load_dotenv()
 
 # Configurations
-DATASET_JSON = "src/data/raw/full_sampled_with_alttext_augmented.json"
-PROCESSED_DATA_DIR = "src/data/processed"
+DATASET_JSON = "data/processed/full_sampled_with_alttext_augmented.json"
+PROCESSED_DATA_DIR = "data/processed/splits"
+SHARD_DIR = os.path.join(PROCESSED_DATA_DIR, "data")             # <split>-<timestamp>-<digest>.parquet
+STATE_PATH = os.path.join(PROCESSED_DATA_DIR, "split_assignments.json")
 SEED = int(os.getenv("SEED", 42))
 TRAIN_RATIO = 0.8
 VAL_RATIO = 0.1
 TEST_RATIO = 0.1
+SPLIT_RATIOS = {"train": TRAIN_RATIO, "validation": VAL_RATIO, "test": TEST_RATIO}
+
+# Gruppierung: alle Einträge einer Gruppe landen im selben Split (z.B. "dedup_group"
+# aus dedup_near_duplicates.py oder "article_url"); ohne Spalte gilt image_id.
+GROUP_COLUMN = os.getenv("SPLIT_GROUP_COLUMN", "dedup_group")
+
+HF_DATASET_REPO = "Alex23o4/n24news_sample_synthetic_alttext"
 
 #W&B Configurations
 WANDB_PROJECT = os.getenv("WANDB_PROJECT", "qwen-vlm-alttext")
 WANDB_ENTITY = os.getenv("WANDB_ENTITY")
 WANDB_RUN_NAME = "n24_split"
 
-assert TRAIN_RATIO + VAL_RATIO + TEST_RATIO == 1, "Train, validation, and test ratios must sum to 1."
+assert abs(TRAIN_RATIO + VAL_RATIO + TEST_RATIO - 1) < 1e-9, "Train, validation, and test ratios must sum to 1."
+
+def stable_hash(key: str) -> int:
+    """Prozess- und plattformunabhängiger Hash (im Gegensatz zu hash())."""
+    return int(hashlib.sha256(f"{SEED}:{key}".encode("utf-8")).hexdigest()[:16], 16)
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state.setdefault("pending_upload", [])
+        return state
+    return seed_state_from_hub()
+
+def seed_state_from_hub():
+    """
+    Erster Lauf ohne Zustandsdatei: Zuordnung aus den bereits veröffentlichten Splits
+    übernehmen, damit Train/Val/Test (und alle Vorhersagen/Judgings auf dem Testset)
+    gültig bleiben. Nur wenn noch nichts veröffentlicht ist, wird bei null begonnen.
+    """
+    state = {"sections": [], "assignments": {}, "groups": {}, "pending_upload": []}
+    try:
+        published = load_dataset(HF_DATASET_REPO)
+    except DatasetNotFoundError:
+        print(f"Kein veröffentlichter Datensatz unter {HF_DATASET_REPO} – Zuordnung beginnt leer.")
+        return state
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    for split_name, split_dataset in published.items():
+        if split_name not in SPLIT_RATIOS:
+            raise ValueError(f"Unbekannter Split im veröffentlichten Datensatz: {split_name}")
+        # lokale Kopie als Basis-Shard, damit SHARD_DIR (LOCAL_DATASET_DIR) vollständig ist;
+        # auf dem Hub liegt er bereits und wird nicht erneut hochgeladen
+        split_dataset.to_parquet(os.path.join(SHARD_DIR, f"{split_name}-published.parquet"))
+        for image_id in split_dataset["image_id"]:
+            state["assignments"][image_id] = split_name
+        if not state["sections"] and "section_label" in split_dataset.features:
+            # bestehende Label-IDs übernehmen
+            state["sections"] = list(split_dataset.features["section_label"].names)
+    print(f"Zuordnung aus {HF_DATASET_REPO} übernommen: {len(state['assignments'])} Einträge.")
+    return state
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = f"{STATE_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+def assign_new_rows(rows, state):
+    """
+    Deterministische, gruppierte und stratifizierte Zuordnung neuer Einträge.
+
+    - Bereits zugeordnete image_ids bleiben, wo sie sind.
+    - Neue Mitglieder einer bekannten Gruppe folgen dem Split der Gruppe.
+    - Jede neue Gruppe wird genau einmal (global, über Sections hinweg) zugeordnet:
+      in Reihenfolge ihres stabilen Hashes auf den Split mit dem größten Defizit
+      gegenüber SPLIT_RATIOS, summiert über die Sections ihrer Mitglieder. Das
+      Ergebnis hängt damit nur von der Menge der Einträge ab, nicht von ihrer Reihenfolge.
+
+    Gibt die Anzahl bekannter Gruppen zurück, die schon vor diesem Lauf über
+    mehrere Splits verteilt waren (veröffentlichte Zuordnungen werden nicht verschoben).
+    """
+    rows = [(image_id, section, image_id if group is None else group) for image_id, section, group in rows]
+    assignments, groups = state["assignments"], state["groups"]
+
+    # Gruppen, deren Mitglieder schon zugeordnet sind (z.B. aus den veröffentlichten Splits)
+    known_splits = defaultdict(set)
+    for image_id, _, group in sorted(rows):
+        if image_id in assignments:
+            known_splits[group].add(assignments[image_id])
+            groups.setdefault(group, assignments[image_id])
+    leaked = sum(len(splits) > 1 for splits in known_splits.values())
+
+    counts = defaultdict(lambda: dict.fromkeys(SPLIT_RATIOS, 0))
+    new_groups = defaultdict(list)
+    for image_id, section, group in rows:
+        if image_id in assignments:
+            counts[section][assignments[image_id]] += 1
+        elif group in groups:
+            assignments[image_id] = groups[group]
+            counts[section][groups[group]] += 1
+        else:
+            new_groups[group].append((image_id, section))
+
+    for group in sorted(new_groups, key=stable_hash):
+        members = new_groups[group]
+        sections = defaultdict(int)
+        for _, section in members:
+            sections[section] += 1
+
+        def deficit(split):
+            return sum(
+                SPLIT_RATIOS[split] * (sum(counts[section].values()) + n) - counts[section][split]
+                for section, n in sections.items()
+            )
+
+        split = max(SPLIT_RATIOS, key=deficit)
+        groups[group] = split
+        for image_id, section in members:
+            assignments[image_id] = split
+            counts[section][split] += 1
+
+    return leaked
 
 def main():
     # Load the dataset
@@ -31,75 +151,98 @@ def main():
     )
 
     print(f"Loaded {dataset.num_rows} samples.")
+    state = load_state()
+    known_ids = set(state["assignments"])
 
-    # maps secions to integers
-    unique_sections = sorted(dataset.unique("section"))
-    section_label = ClassLabel(names=unique_sections)
+    # maps secions to integers – neue Sections werden angehängt, damit bestehende Labels stabil bleiben
+    for section in sorted(dataset.unique("section")):
+        if section not in state["sections"]:
+            state["sections"].append(section)
+    section_label = ClassLabel(names=state["sections"])
+
+    group_col = GROUP_COLUMN if GROUP_COLUMN in dataset.column_names else "image_id"
+    rows = zip(dataset["image_id"], dataset["section"], dataset[group_col])
+    leaked = assign_new_rows(rows, state)
+    if leaked:
+        print(f"⚠️ {leaked} Gruppen waren schon vor diesem Lauf über mehrere Splits verteilt "
+              f"(veröffentlichte Zuordnung bleibt unverändert).")
+
+    # Nur neue Einträge bilden den Delta-Split
+    delta = dataset.filter(lambda image_id: image_id not in known_ids, input_columns="image_id")
+    print(f"Neue Einträge: {delta.num_rows} (bereits zugeordnet: {len(known_ids)})")
 
     # Convert the 'section' column to numeric labels
-    dataset = dataset.map(
+    delta = delta.map(
         lambda example: {"section_label": section_label.str2int(example["section"])},
     )
 
     # Add the section_label column to the dataset
-    dataset = dataset.cast(
+    delta = delta.cast(
         Features({
-            **dataset.features,
+            **delta.features,
             "section_label": section_label
         })
     )
-    
-    # First Split
-    split_results = dataset.train_test_split(
-       test_size=TEST_RATIO + VAL_RATIO,
-       stratify_by_column="section_label",
-       seed=SEED,
-    )
-
-    train_dataset = split_results["train"]
-    test_val_dataset = split_results["test"]
 
-    # Second Split
-    # Split the test_val_dataset into validation and test sets
-    val_test_split = test_val_dataset.train_test_split(
-        test_size=TEST_RATIO / (TEST_RATIO + VAL_RATIO),
-        stratify_by_column="section_label",
-        seed=SEED,
-    )
-    val_dataset = val_test_split["train"]
-    test_dataset = val_test_split["test"]   
+    assignments = state["assignments"]
+    splits = DatasetDict({
+        split_name: delta.filter(lambda image_id, name=split_name: assignments[image_id] == name, input_columns="image_id")
+        for split_name in SPLIT_RATIOS
+    })
 
     # Check and report the number of samples in each split
-    print(f"Train samples: {len(train_dataset)}")
-    print(f"Validation samples: {len(val_dataset)}")
-    print(f"Test samples: {len(test_dataset)}")
-    print(f"Total samples: {len(train_dataset) + len(val_dataset) + len(test_dataset)}")
-
-    return DatasetDict({
-        "train": train_dataset,
-        "validation": val_dataset,
-        "test": test_dataset,
-    })
+    totals = defaultdict(int)
+    for split_name in assignments.values():
+        totals[split_name] += 1
+    for split_name in SPLIT_RATIOS:
+        print(f"{split_name.capitalize()} samples: +{len(splits[split_name])} (gesamt {totals[split_name]})")
+    print(f"Total samples: {len(assignments)}")
+
+    return splits, state
 
 def save_splits(dataset_splits: DatasetDict):
-    os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+    """Schreibt nur die neuen Einträge als Delta-Shards; bestehende Shards bleiben unverändert."""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    written = []
 
     for split_name, split_dataset in dataset_splits.items():
-        path = os.path.join(PROCESSED_DATA_DIR, f"n24_{split_name}.arrow")
-        split_dataset.save_to_disk(path)
-        print(f"{split_name.capitalize()}-Split gespeichert unter: {path}")
+        if len(split_dataset) == 0:
+            continue
+        digest = hashlib.sha256("\n".join(sorted(split_dataset["image_id"])).encode("utf-8")).hexdigest()[:8]
+        path = os.path.join(SHARD_DIR, f"{split_name}-{stamp}-{digest}.parquet")
+        split_dataset.to_parquet(path)
+        written.append(path)
+        print(f"{split_name.capitalize()}-Delta gespeichert unter: {path}")
 
-def log_splits_to_wandb():
+    return written
+
+def load_all_splits():
+    """Lädt alle Shards (alt + neu) als vollständige Splits."""
+    data_files = {name: os.path.join(SHARD_DIR, f"{name}-*.parquet") for name in SPLIT_RATIOS}
+    return load_dataset("parquet", data_files=data_files)
+
+def log_splits_to_wandb(delta_files):
+    if wandb is None or os.getenv("WANDB_MODE") == "disabled":
+        print(f"W&B nicht verfügbar – Artifact übersprungen (Shards und Zustand unter {PROCESSED_DATA_DIR}).")
+        return
     wandb.init(project=WANDB_PROJECT, entity=WANDB_ENTITY, job_type="data-split")
 
-    artifact = wandb.Artifact("n24_dataset_splits", type="dataset")
-    artifact.add_dir(PROCESSED_DATA_DIR)
+    # Das Artefakt referenziert alle Shards; W&B lädt nur Dateien mit neuer Prüfsumme
+    # hoch, d.h. effektiv nur die Delta-Shards dieses Laufs.
+    artifact = wandb.Artifact(
+        "n24_dataset_splits",
+        type="dataset",
+        metadata={"delta_shards": [os.path.basename(p) for p in delta_files]},
+    )
+    artifact.add_dir(SHARD_DIR, name="data")
+    artifact.add_file(STATE_PATH)
     wandb.log_artifact(artifact)
 
     wandb.finish()
     print("W&B Artifact für die Splits erstellt.")
 
-def push_splits_to_hf(dataset_splits: DatasetDict):
+def push_splits_to_hf(delta_files, on_uploaded=None):
     # Load your Hugging Face token from .env or environment variable
     hf_token = os.getenv("HF_TOKEN")
     if hf_token is None:
@@ -107,17 +250,45 @@ def push_splits_to_hf(dataset_splits: DatasetDict):
 
     login(token=hf_token)
 
-    # Push the DatasetDict directly to Hugging Face Hub
-    dataset_splits.push_to_hub(
-        "Alex23o4/n24news_sample_synthetic_alttext",
-        private=False,  # Set to True if you want it to be private
-        commit_message="Uploading processed and split dataset for training."
-    )
-    print("Dataset successfully pushed to Hugging Face Hub.")
+    # Nur die Delta-Shards hochladen; sie passen zum Muster data/<split>-* der Hub-Konfiguration
+    # und ergänzen die bereits veröffentlichten Shards (deren Einträge sind nicht im Delta).
+    api = HfApi()
+    for path in delta_files:
+        api.upload_file(
+            path_or_fileobj=path,
+            path_in_repo=f"data/{os.path.basename(path)}",
+            repo_id=HF_DATASET_REPO,
+            repo_type="dataset",
+            commit_message=f"Add split shard {os.path.basename(path)}",
+        )
+        if on_uploaded is not None:
+            on_uploaded(path)
+    print(f"{len(delta_files)} Delta-Shards nach Hugging Face Hub hochgeladen.")
+
+def upload_pending(state):
+    """
+    Lädt alle Shards aus state["pending_upload"] hoch und trägt jeden erst nach
+    erfolgreichem Upload aus. Schlägt der Upload fehl, holt der nächste Lauf ihn nach.
+    """
+    pending = list(state["pending_upload"])
+    log_splits_to_wandb(pending)
+
+    def mark_uploaded(path):
+        state["pending_upload"].remove(path)
+        save_state(state)
+
+    push_splits_to_hf(pending, on_uploaded=mark_uploaded)
 
 
 if __name__ == "__main__":
-    splits = main()
-    save_splits(splits)
-    log_splits_to_wandb()
-    push_splits_to_hf(splits)
\ No newline at end of file
+    splits, state = main()
+    delta_files = save_splits(splits)
+    # Zuordnung und noch hochzuladende Shards gemeinsam sichern
+    state["pending_upload"] += delta_files
+    save_state(state)
+    if state["pending_upload"]:
+        if len(state["pending_upload"]) > len(delta_files):
+            print(f"{len(state['pending_upload']) - len(delta_files)} Shards aus einem früheren Lauf werden nachgeladen.")
+        upload_pending(state)
+    else:
+        print("Keine neuen Einträge – nichts zu schreiben oder hochzuladen.")
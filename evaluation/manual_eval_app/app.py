@@ -1,10 +1,8 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import requests
-from PIL import Image
-from io import BytesIO
 from itertools import zip_longest
+from eval_store import CRITERIA, EvalStore, build_row_index, default_eval
+from image_cache import PREFETCH_AHEAD, ImageCache
 
 # --- PAGE CONFIG muss als erstes stehen ---
 st.set_page_config(layout="wide")
@@ -31,27 +29,6 @@ st.markdown(
 CSV_FILE = "manual_eval_pairwise.csv"
 DB_FILE  = "eval_detailed.db"
 
-# --- SQLITE-DB EINRICHTEN ---
-conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-conn.execute("""
-CREATE TABLE IF NOT EXISTS detailed_evals (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    image_id TEXT,
-    model_variant TEXT,
-    visibility_principle    INTEGER,
-    context_relevance       INTEGER,
-    entity_naming           INTEGER,
-    informativeness         INTEGER,
-    redundancy_avoidance    INTEGER,
-    style_readability       INTEGER,
-    total                   INTEGER,
-    justification           TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(image_id, model_variant)
-)
-""")
-conn.commit()
-
 # --- DATEN LADEN UND CACHE ---
 @st.cache_data
 def load_df():
@@ -60,10 +37,64 @@ def load_df():
 df = load_df()
 image_ids = sorted(df["image_id"].unique())
 
+# Zeilen einmalig nach (image_id, model_variant) indizieren statt den DataFrame pro Rerun zu filtern
+# (cache_resource: kein Kopieren des Dicts bei jedem Rerun)
+@st.cache_resource
+def load_row_index():
+    return build_row_index(df)
+
+row_index = load_row_index()
+
+# --- SQLITE-DB (WAL, eine Verbindung pro Session-Thread) + serverseitige Arbeitsliste ---
+@st.cache_resource
+def get_store():
+    store = EvalStore(DB_FILE)
+    store.seed_queue(sorted(row_index))
+    return store
+
+store = get_store()
+
+# Ein Bild-Cache pro Server-Prozess; Thumbnails liegen auf der Platte, die nächsten Bilder werden vorab geladen
+@st.cache_resource
+def get_image_cache():
+    return ImageCache()
+
+@st.cache_data
+def load_image_urls():
+    return df.groupby("image_id")["image_url_clean"].first().reindex(image_ids).tolist()
+
+image_cache = get_image_cache()
+image_urls = load_image_urls()
+
 # --- SESSIONSTATE INIT ---
 if "idx" not in st.session_state:
     st.session_state.idx = 0
 
+annotator_id = st.sidebar.text_input("Annotator-ID", key="annotator_id").strip()
+if not annotator_id:
+    st.info("Bitte links eine Annotator-ID eingeben.")
+    st.stop()
+
+VARIANTS = ("baseline", "finetuned")
+
+def release_current():
+    """Offene Zuweisungen beider Varianten des aktuellen Bildes zurück in die Queue (übersprungen)."""
+    for variant in VARIANTS:
+        store.release(image_ids[st.session_state.idx], variant, annotator_id)
+
+def go(step):
+    if 0 <= st.session_state.idx + step < len(image_ids):
+        release_current()
+        st.session_state.idx += step
+
+def jump_to_open():
+    """Springt zum Bild des nächsten offenen Paars aus der Arbeitsliste und reserviert beide Varianten."""
+    release_current()
+    pick = store.next_item(annotator_id, exclude=[(image_ids[st.session_state.idx], v) for v in VARIANTS],
+                           whole_image=True)
+    if pick:
+        st.session_state.idx = image_ids.index(pick[0])
+
 # --- FRAGEN-RENDERING -----------------------------------------------
 def render_questions(variant_prefix: str, defaults: dict):
     """
@@ -94,32 +125,15 @@ def render_questions(variant_prefix: str, defaults: dict):
             )
 
 # --- ANNOTATE-FUNKTION -----------------------------------------------
-def annotate(image_id, variant):
-    entry = df[(df["image_id"] == image_id) & (df["model_variant"] == variant)].iloc[0]
+def annotate(image_id, variant, saved):
+    entry = row_index[(image_id, variant)]
 
     st.subheader(f"{variant.title()} Alt-Text")
     st.markdown(f"> **{entry['alt_text']}**")
     st.markdown("---")
 
-    # Lade Defaults aus DB oder verwende Mittelwert = 4
-    cur = conn.execute("""
-       SELECT visibility_principle, context_relevance, entity_naming,
-              informativeness, redundancy_avoidance, style_readability,
-              total, justification
-       FROM detailed_evals
-       WHERE image_id=? AND model_variant=?
-    """, (image_id, variant))
-    row = cur.fetchone()
-    defaults = {
-        "visibility_principle": row[0] if row else 4,
-        "context_relevance":    row[1] if row else 4,
-        "entity_naming":        row[2] if row else 4,
-        "informativeness":      row[3] if row else 4,
-        "redundancy_avoidance": row[4] if row else 4,
-        "style_readability":    row[5] if row else 4,
-        "total":                row[6] if row else 4,
-        "justification":        row[7] if row else ""
-    }
+    # Defaults aus der bereits geladenen Bewertung oder Mittelwert = 4
+    defaults = saved or default_eval()
 
     # Fragen rendern
     render_questions(variant, defaults)
@@ -134,26 +148,12 @@ def annotate(image_id, variant):
 
     # Speichern-Button
     if st.button(f"💾 {variant.title()} speichern", key=f"save_{variant}"):
-        conn.execute("DELETE FROM detailed_evals WHERE image_id=? AND model_variant=?", (image_id, variant))
-        conn.execute("""
-          INSERT INTO detailed_evals (
-            image_id, model_variant,
-            visibility_principle, context_relevance, entity_naming,
-            informativeness, redundancy_avoidance, style_readability,
-            total, justification
-          ) VALUES (?,?,?,?,?,?,?,?,?,?)
-        """, (
-          image_id, variant,
-          st.session_state[f"visibility_principle_{variant}"],
-          st.session_state[f"context_relevance_{variant}"],
-          st.session_state[f"entity_naming_{variant}"],
-          st.session_state[f"informativeness_{variant}"],
-          st.session_state[f"redundancy_avoidance_{variant}"],
-          st.session_state[f"style_readability_{variant}"],
-          st.session_state[f"total_{variant}"],
-          justification
-        ))
-        conn.commit()
+        store.save_eval(
+            image_id, variant,
+            {c: st.session_state[f"{c}_{variant}"] for c in CRITERIA},
+            justification,
+            annotator_id=annotator_id,
+        )
         st.success(f"{variant.title()} gespeichert!")
 
 # --- HAUPT-UI ---------------------------------------------------------
@@ -165,13 +165,19 @@ left, right = st.columns((1, 2), gap="large")
 
 with left:
     cid = image_ids[st.session_state.idx]
-    row = df[df["image_id"] == cid].iloc[0]
-    try:
-        resp = requests.get(row["image_url_clean"], timeout=3)
-        img  = Image.open(BytesIO(resp.content))
+    row = row_index.get((cid, "baseline")) or row_index[(cid, "finetuned")]
+    img = image_cache.get(row["image_url_clean"])
+    if img is not None:
         st.image(img, caption="Originalbild", use_container_width=True)
-    except:
+    elif image_cache.loading(row["image_url_clean"]):
+        st.info("⏳ Bild wird noch geladen und erscheint beim nächsten Klick.")
+    else:
         st.warning("Bild konnte nicht geladen werden.")
+    # Nächste offene Bilder aus der Arbeitsliste, danach die Nachbarn hinter "Zurück"/"Weiter"
+    upcoming = store.upcoming(annotator_id, PREFETCH_AHEAD, exclude=[(cid, v) for v in VARIANTS])
+    neighbours = [i for i in (st.session_state.idx + 1, st.session_state.idx - 1) if 0 <= i < len(image_ids)]
+    image_cache.prefetch([row_index[p]["image_url_clean"] for p in upcoming]
+                         + [image_urls[i] for i in neighbours])
     st.markdown("---")
     st.markdown(f"**Headline:** {row['headline']}")
     st.markdown(f"**Abstract:** {row['abstract']}")
@@ -180,15 +186,18 @@ with left:
 
     col_back, col_next = st.columns(2, gap="small")
     with col_back:
-        if st.button("⬅️ Zurück") and st.session_state.idx > 0:
-            st.session_state.idx -= 1
+        st.button("⬅️ Zurück", on_click=go, args=(-1,))
     with col_next:
-        if st.button("➡️ Weiter") and st.session_state.idx < len(image_ids)-1:
-            st.session_state.idx += 1
+        st.button("➡️ Weiter", on_click=go, args=(1,))
 
-    st.markdown(f"{st.session_state.idx+1} / {len(image_ids)}")
+    st.button("⏭️ Nächstes offenes Bild", on_click=jump_to_open)
+    progress = store.progress(annotator_id)
+    st.markdown(f"{st.session_state.idx+1} / {len(image_ids)} · {progress['own']} eigene Bewertungen · "
+                f"{progress['covered']} / {progress['total']} Paare abgedeckt")
 
 with right:
-    annotate(cid, "baseline")
+    # Alle Bewertungen des Bildes mit einer Abfrage
+    saved = store.load_evals(cid, annotator_id)
+    annotate(cid, "baseline", saved.get("baseline"))
     st.markdown("---")
-    annotate(cid, "finetuned")
+    annotate(cid, "finetuned", saved.get("finetuned"))
@@ -1,9 +1,7 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import requests
-from PIL import Image
-from io import BytesIO
+from eval_store import CRITERIA, EvalStore, default_eval
+from image_cache import PREFETCH_AHEAD, ImageCache
 
 # --------------------------------------------------
 # 1) PAGE CONFIG – muss immer zuerst kommen
@@ -34,29 +32,6 @@ st.markdown(
 CSV_FILE = "manual_eval_pairwise.csv"     # Datensatz mit beiden Varianten
 DB_FILE  = "eval_detailed.db"             # SQLite‑DB für Bewertungen
 
-# -------- SQLite‑DB anlegen (falls nicht vorhanden) --------
-conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-conn.execute(
-    """
-    CREATE TABLE IF NOT EXISTS detailed_evals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        image_id TEXT,
-        model_variant TEXT,
-        visibility_principle    INTEGER,
-        context_relevance       INTEGER,
-        entity_naming           INTEGER,
-        informativeness         INTEGER,
-        redundancy_avoidance    INTEGER,
-        style_readability       INTEGER,
-        total                   INTEGER,
-        justification           TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(image_id, model_variant)
-    )
-    """
-)
-conn.commit()
-
 # -------- Daten laden & (einmalig) mischen --------
 @st.cache_data
 def load_df():
@@ -64,13 +39,63 @@ def load_df():
     return pd.read_csv(CSV_FILE).sample(frac=1, random_state=42).reset_index(drop=True)
 
 df = load_df()
-num_entries = len(df)
+
+# Zeilen einmalig als Dicts, Zugriff per Position statt df.iloc pro Rerun
+@st.cache_resource
+def load_rows():
+    return df.to_dict(orient="records")
+
+rows = load_rows()
+pos_by_pair = {(r["image_id"], r["model_variant"]): i for i, r in enumerate(rows)}
+
+# -------- SQLite‑DB (WAL, eine Verbindung pro Session‑Thread) + serverseitige Arbeitsliste --------
+@st.cache_resource
+def get_store():
+    store = EvalStore(DB_FILE)
+    store.seed_queue((r["image_id"], r["model_variant"]) for r in rows)
+    return store
+
+store = get_store()
+
+# -------- Bild-Cache (einer pro Server-Prozess, überlebt Reruns) --------
+@st.cache_resource
+def get_image_cache():
+    return ImageCache()
+
+image_cache = get_image_cache()
 
 # --------------------------------------------------
 # 4) SESSION‑STATE
 # --------------------------------------------------
-if "idx" not in st.session_state:
-    st.session_state.idx = 0       # Zeigt auf den aktuellen Datensatz‑Eintrag
+annotator_id = st.sidebar.text_input("Annotator‑ID", key="annotator_id").strip()
+if not annotator_id:
+    st.info("Bitte links eine Annotator‑ID eingeben, um Einträge aus der Arbeitsliste zu erhalten.")
+    st.stop()
+
+def assign_next():
+    """Holt das nächste offene Paar aus der Queue; None = alles abgedeckt."""
+    pick = store.next_item(annotator_id, exclude=st.session_state.history)
+    st.session_state.idx = pos_by_pair[pick] if pick else None
+
+# Neue Session oder Wechsel der Annotator‑ID: Arbeitsliste neu beginnen
+if st.session_state.get("active_annotator") != annotator_id:
+    st.session_state.active_annotator = annotator_id
+    st.session_state.history = []  # bereits gezeigte Paare (für "Zurück")
+    assign_next()                  # idx zeigt auf den aktuellen Datensatz‑Eintrag
+
+def go_next():
+    current = rows[st.session_state.idx]
+    pair = (current["image_id"], current["model_variant"])
+    store.release(*pair, annotator_id)   # nicht gespeichert = übersprungen, geht zurück in die Queue
+    st.session_state.history.append(pair)
+    assign_next()
+
+def go_back():
+    if st.session_state.history:
+        current = rows[st.session_state.idx] if st.session_state.idx is not None else None
+        if current is not None:
+            store.release(current["image_id"], current["model_variant"], annotator_id)
+        st.session_state.idx = pos_by_pair[st.session_state.history.pop()]
 
 # --------------------------------------------------
 # 5) Hilfs‑Funktionen
@@ -112,28 +137,8 @@ def annotate(row):
     st.markdown(f"> **{row['alt_text']}**")
     st.markdown("---")
 
-    # --- Defaults holen (4 = Mittelwert) ---
-    cur = conn.execute(
-        """
-        SELECT visibility_principle, context_relevance, entity_naming,
-               informativeness, redundancy_avoidance, style_readability,
-               total, justification
-        FROM detailed_evals
-        WHERE image_id=? AND model_variant=?
-        """,
-        (image_id, model_variant),
-    )
-    res = cur.fetchone()
-    defaults = {
-        "visibility_principle": res[0] if res else 4,
-        "context_relevance":    res[1] if res else 4,
-        "entity_naming":        res[2] if res else 4,
-        "informativeness":      res[3] if res else 4,
-        "redundancy_avoidance": res[4] if res else 4,
-        "style_readability":    res[5] if res else 4,
-        "total":                res[6] if res else 4,
-        "justification":        res[7] if res else "",
-    }
+    # --- Defaults aus der DB (eine Abfrage pro Bild) oder 4 = Mittelwert ---
+    defaults = store.load_evals(image_id, annotator_id).get(model_variant) or default_eval()
 
     # --- Fragen rendern ---
     render_questions(suffix, defaults)
@@ -148,33 +153,13 @@ def annotate(row):
 
     # --- Speichern‑Button ---
     if st.button("💾 Speichern", key=f"save_{suffix}"):
-        conn.execute(
-            "DELETE FROM detailed_evals WHERE image_id=? AND model_variant=?",
-            (image_id, model_variant),
-        )
-        conn.execute(
-            """
-            INSERT INTO detailed_evals (
-              image_id, model_variant,
-              visibility_principle, context_relevance, entity_naming,
-              informativeness, redundancy_avoidance, style_readability,
-              total, justification
-            ) VALUES (?,?,?,?,?,?,?,?,?,?)
-            """,
-            (
-                image_id,
-                model_variant,
-                st.session_state[f"visibility_principle_{suffix}"],
-                st.session_state[f"context_relevance_{suffix}"],
-                st.session_state[f"entity_naming_{suffix}"],
-                st.session_state[f"informativeness_{suffix}"],
-                st.session_state[f"redundancy_avoidance_{suffix}"],
-                st.session_state[f"style_readability_{suffix}"],
-                st.session_state[f"total_{suffix}"],
-                justification,
-            ),
+        store.save_eval(
+            image_id,
+            model_variant,
+            {c: st.session_state[f"{c}_{suffix}"] for c in CRITERIA},
+            justification,
+            annotator_id=annotator_id,
         )
-        conn.commit()
         st.success("Bewertung gespeichert!")
 
 # --------------------------------------------------
@@ -183,20 +168,32 @@ def annotate(row):
 
 st.title("🔍 Manuelle Qualitätsbewertung von Alt‑Texten")
 
+progress = store.progress(annotator_id)
+if st.session_state.idx is None:
+    st.success(f"Keine offenen Einträge mehr für {annotator_id} – danke! "
+               f"({progress['own']} eigene Bewertungen, {progress['covered']} / {progress['total']} Paare abgedeckt)")
+    st.button("⬅️ Zurück", on_click=go_back)
+    st.stop()
+
 left, right = st.columns((1, 2), gap="large")
 
 # -------- LINKER BEREICH: Bild & Kontext --------
 with left:
-    row = df.iloc[st.session_state.idx]
+    row = rows[st.session_state.idx]
     image_id = row["image_id"]
 
-    # Bild laden
-    try:
-        resp = requests.get(row["image_url_clean"], timeout=3)
-        img  = Image.open(BytesIO(resp.content))
+    # Bild aus dem Cache (Thumbnail)
+    img = image_cache.get(row["image_url_clean"])
+    if img is not None:
         st.image(img, caption="Originalbild", use_container_width=True)
-    except Exception:
+    elif image_cache.loading(row["image_url_clean"]):
+        st.info("⏳ Bild wird noch geladen und erscheint beim nächsten Klick.")
+    else:
         st.warning("Bild konnte nicht geladen werden.")
+    # Nächste Paare aus der Arbeitsliste (ohne Reservierung) und das Paar hinter "Zurück" vorladen
+    upcoming = store.upcoming(annotator_id, PREFETCH_AHEAD,
+                              exclude=[*st.session_state.history, (row["image_id"], row["model_variant"])])
+    image_cache.prefetch(rows[pos_by_pair[p]]["image_url_clean"] for p in [*upcoming, *st.session_state.history[-1:]])
 
     st.markdown("---")
     st.markdown(f"**Headline:** {row['headline']}")
@@ -204,16 +201,14 @@ with left:
     st.markdown(f"**Caption:** {row['caption']}")
     st.markdown("---")
 
-    # Navigation
+    # Navigation über die Arbeitsliste (Callbacks laufen vor dem nächsten Rendern)
     col_back, col_next = st.columns(2, gap="small")
     with col_back:
-        if st.button("⬅️ Zurück") and st.session_state.idx > 0:
-            st.session_state.idx -= 1
+        st.button("⬅️ Zurück", on_click=go_back, disabled=not st.session_state.history)
     with col_next:
-        if st.button("➡️ Weiter") and st.session_state.idx < num_entries - 1:
-            st.session_state.idx += 1
+        st.button("➡️ Weiter", on_click=go_next)
 
-    st.markdown(f"Eintrag {st.session_state.idx + 1} / {num_entries}")
+    st.markdown(f"{progress['own']} eigene Bewertungen · {progress['covered']} / {progress['total']} Paare abgedeckt")
 
 # -------- RECHTER BEREICH: Bewertung --------
 with right:
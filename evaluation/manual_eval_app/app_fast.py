@@ -0,0 +1,270 @@
+import json
+import statistics
+import time
+
+import streamlit as st
+import streamlit.components.v1 as components
+import pandas as pd
+from eval_store import CRITERIA, BatchedWriter, EvalStore, default_eval
+from image_cache import PREFETCH_AHEAD, ImageCache
+
+# --------------------------------------------------
+# Schnellmodus: Tastatur statt Klicks, Autosave statt "Speichern"
+#   1–5  Score für das markierte Kriterium, danach springt die Markierung weiter
+#   ↑/↓  Kriterium wechseln      c  Kommentar      Esc  Kommentar verlassen
+#   Enter  speichern & weiter    s  überspringen    ←  zurück
+# Score-Änderungen laufen in einem Fragment (kein Rerun der ganzen Seite) und
+# werden entprellt über den BatchedWriter als Entwurf gesichert. Als Bewertung
+# zählt ein Eintrag erst nach Enter; Überspringen verwirft den Entwurf.
+# --------------------------------------------------
+st.set_page_config(layout="wide")
+
+CSV_FILE = "manual_eval_pairwise.csv"     # Datensatz mit beiden Varianten
+DB_FILE  = "eval_detailed.db"             # SQLite‑DB für Bewertungen
+
+QUESTIONS = {
+    "visibility_principle": "Nur visuell Erkennbares?",
+    "context_relevance": "Redaktioneller Kontext sinnvoll & korrekt?",
+    "entity_naming": "Objekte, Personen, Orte korrekt benannt?",
+    "informativeness": "Spezifischer, bildbezogener Mehrwert?",
+    "redundancy_avoidance": "Keine Wiederholung aus Headline/Caption?",
+    "style_readability": "Klar, präzise, verständlich?",
+    "total": "Gesamteindruck (1 schlecht … 5 sehr gut)",
+}
+
+# Button-Beschriftungen, über die die Tastenkürzel die Buttons finden
+LABEL_SAVE = "✅ Speichern & weiter (Enter)"
+LABEL_SKIP = "⏭️ Überspringen (s)"
+LABEL_BACK = "⬅️ Zurück (←)"
+
+# Tastatur-Handler im Eltern-Dokument; wird bei jedem Eintrag neu registriert
+# (der alte Handler gehört zum vorherigen iframe und wird entfernt)
+HOTKEYS_JS = """
+<script>
+const doc = window.parent.document;
+const state = window.parent.__fastAnnotation = window.parent.__fastAnnotation || {};
+if (state.item !== __ITEM__) { state.item = __ITEM__; state.crit = 0; }
+
+const groups = () => doc.querySelectorAll('section.main div[role="radiogroup"], div[data-testid="stMain"] div[role="radiogroup"]');
+const mark = () => groups().forEach((g, i) => {
+  g.style.outline = i === state.crit ? "2px solid #ff4b4b" : "none";
+  g.style.borderRadius = "6px";
+});
+const press = (label) => {
+  const b = [...doc.querySelectorAll("button")].find((b) => b.innerText.trim() === label);
+  if (b && !b.disabled) b.click();
+};
+
+if (state.handler) doc.removeEventListener("keydown", state.handler);
+state.handler = (e) => {
+  const tag = (e.target.tagName || "").toUpperCase();
+  if (tag === "TEXTAREA" || (tag === "INPUT" && e.target.type !== "radio")) {
+    if (e.key === "Escape") e.target.blur();
+    return;
+  }
+  if (e.ctrlKey || e.metaKey || e.altKey) return;
+  const n = groups().length;
+  if (e.key >= "1" && e.key <= "5" && n) {
+    const labels = groups()[state.crit].querySelectorAll("label");
+    if (labels[+e.key - 1]) labels[+e.key - 1].click();
+    state.crit = Math.min(state.crit + 1, n - 1);
+  } else if (e.key === "ArrowDown") {
+    state.crit = Math.min(state.crit + 1, n - 1);
+  } else if (e.key === "ArrowUp") {
+    state.crit = Math.max(state.crit - 1, 0);
+  } else if (e.key === "Enter") {
+    press(__SAVE__);
+  } else if (e.key === "s") {
+    press(__SKIP__);
+  } else if (e.key === "ArrowLeft") {
+    press(__BACK__);
+  } else if (e.key === "c") {
+    const area = doc.querySelector('div[data-testid="stMain"] textarea, section.main textarea');
+    if (area) area.focus();
+  } else {
+    return;
+  }
+  e.preventDefault();
+  mark();
+};
+doc.addEventListener("keydown", state.handler);
+setTimeout(mark, 300);
+</script>
+"""
+
+# -------- Daten laden & (einmalig) mischen --------
+@st.cache_data
+def load_df():
+    # Anzeige-Reihenfolge; die Reihenfolge der Arbeitsliste legt seed_queue selbst fest
+    return pd.read_csv(CSV_FILE).sample(frac=1, random_state=42).reset_index(drop=True)
+
+df = load_df()
+
+@st.cache_resource
+def load_rows():
+    return df.to_dict(orient="records")
+
+rows = load_rows()
+pos_by_pair = {(r["image_id"], r["model_variant"]): i for i, r in enumerate(rows)}
+
+@st.cache_resource
+def get_store():
+    store = EvalStore(DB_FILE)
+    store.seed_queue((r["image_id"], r["model_variant"]) for r in rows)
+    return store
+
+store = get_store()
+
+# -------- Ein Schreib-Thread pro Server-Prozess --------
+@st.cache_resource
+def get_writer():
+    return BatchedWriter(store)
+
+writer = get_writer()
+
+@st.cache_resource
+def get_image_cache():
+    return ImageCache()
+
+image_cache = get_image_cache()
+
+# --------------------------------------------------
+# SESSION‑STATE & NAVIGATION
+# --------------------------------------------------
+annotator_id = st.sidebar.text_input("Annotator‑ID", key="annotator_id").strip()
+if not annotator_id:
+    st.info("Bitte links eine Annotator‑ID eingeben, um Einträge aus der Arbeitsliste zu erhalten.")
+    st.stop()
+
+def show(idx):
+    st.session_state.idx = idx
+    st.session_state.item_started = time.perf_counter()
+
+def assign_next():
+    pick = store.next_item(annotator_id, exclude=st.session_state.history)
+    show(pos_by_pair[pick] if pick else None)
+
+if st.session_state.get("active_annotator") != annotator_id:
+    st.session_state.active_annotator = annotator_id
+    st.session_state.history = []
+    st.session_state.item_seconds = []  # Bearbeitungszeit pro gespeichertem Eintrag
+    assign_next()
+
+def suffix_of(row):
+    return f"{row['image_id']}_{row['model_variant']}"
+
+def current_values(row):
+    suffix = suffix_of(row)
+    scores = {c: st.session_state[f"{c}_{suffix}"] for c in CRITERIA}
+    return scores, st.session_state.get(f"just_{suffix}", "")
+
+def touched_of(row):
+    """Aktiv gesetzte Kriterien (und "justification"), auch über Reloads aus dem Entwurf."""
+    return st.session_state.setdefault(f"touched_{suffix_of(row)}", set())
+
+def autosave(row, field):
+    """on_change der Widgets: Feld als berührt merken und den Entwurf puffern."""
+    touched = touched_of(row)
+    touched.add(field)
+    writer.submit(row["image_id"], row["model_variant"], *current_values(row),
+                  annotator_id=annotator_id, touched=touched)
+
+def leave(save):
+    row = rows[st.session_state.idx]
+    pair = (row["image_id"], row["model_variant"])
+    writer.discard(*pair, annotator_id)  # Entwurf verwerfen; gespeichert wird nur explizit
+    if save:
+        store.save_eval(*pair, *current_values(row), annotator_id=annotator_id, touched=touched_of(row))
+        st.session_state.item_seconds.append(time.perf_counter() - st.session_state.item_started)
+    store.release(*pair, annotator_id)   # ohne Bewertung = übersprungen, zurück in die Queue
+    st.session_state.history.append(pair)
+    assign_next()
+
+def go_back():
+    if st.session_state.history:
+        writer.flush()
+        if st.session_state.idx is not None:
+            row = rows[st.session_state.idx]
+            store.release(row["image_id"], row["model_variant"], annotator_id)
+        show(pos_by_pair[st.session_state.history.pop()])
+
+# --------------------------------------------------
+# SIDEBAR: Fortschritt & Zeitmessung
+# --------------------------------------------------
+progress = store.progress(annotator_id)
+st.sidebar.progress(progress["covered"] / progress["total"] if progress["total"] else 0.0,
+                    text=f"{progress['covered']} / {progress['total']} Paare abgedeckt")
+st.sidebar.markdown(f"**{progress['own']}** eigene Bewertungen")
+
+seconds = st.session_state.item_seconds
+if seconds:
+    median = statistics.median(seconds)
+    st.sidebar.metric("Median pro Eintrag", f"{median:.1f} s")
+    st.sidebar.metric("Einträge pro Stunde", f"{3600 / median:.0f}")
+    st.sidebar.caption(f"{len(seconds)} Einträge in dieser Session, zuletzt {seconds[-1]:.1f} s")
+st.sidebar.caption(f"Autosave: {writer.stats['rows']} Zeilen in {writer.stats['flushes']} Schreibvorgängen, "
+                   f"zuletzt {writer.stats['last_flush_ms']:.1f} ms")
+st.sidebar.markdown("**Tasten:** `1–5` Score · `↑/↓` Kriterium · `Enter` speichern & weiter · "
+                    "`s` überspringen · `←` zurück · `c` Kommentar · `Esc` Kommentar verlassen")
+
+# --------------------------------------------------
+# HAUPT‑UI
+# --------------------------------------------------
+if st.session_state.idx is None:
+    st.success(f"Keine offenen Einträge mehr für {annotator_id} – danke!")
+    st.button(LABEL_BACK, on_click=go_back)
+    st.stop()
+
+row = rows[st.session_state.idx]
+
+@st.fragment
+def rating_panel(row):
+    """Kriterien & Kommentar: Änderungen rerunnen nur dieses Fragment und gehen an den Autosave."""
+    suffix = suffix_of(row)
+    # Entwurf (ungespeicherte Änderungen) vor gespeicherter Bewertung vor Default
+    draft = store.load_draft(row["image_id"], row["model_variant"], annotator_id)
+    if draft is not None:
+        st.session_state.setdefault(f"touched_{suffix}", set(draft["touched"]))
+    defaults = draft or store.load_evals(row["image_id"], annotator_id).get(row["model_variant"]) or default_eval()
+    for c in CRITERIA:
+        st.radio(QUESTIONS[c], [1, 2, 3, 4, 5], index=defaults[c] - 1, key=f"{c}_{suffix}",
+                 horizontal=True, on_change=autosave, args=(row, c))
+    st.text_area("Begründung / Kommentar", value=defaults["justification"], key=f"just_{suffix}",
+                 height=80, on_change=autosave, args=(row, "justification"))
+
+left, right = st.columns((1, 2), gap="large")
+
+with left:
+    img = image_cache.get(row["image_url_clean"])
+    if img is not None:
+        st.image(img, use_container_width=True)
+    elif image_cache.loading(row["image_url_clean"]):
+        st.info("⏳ Bild wird noch geladen und erscheint beim nächsten Klick.")
+    else:
+        st.warning("Bild konnte nicht geladen werden.")
+    # Nächste Paare aus der Arbeitsliste (ohne Reservierung) und das Paar hinter "Zurück" vorladen
+    upcoming = store.upcoming(annotator_id, PREFETCH_AHEAD,
+                              exclude=[*st.session_state.history, (row["image_id"], row["model_variant"])])
+    image_cache.prefetch(rows[pos_by_pair[p]]["image_url_clean"] for p in [*upcoming, *st.session_state.history[-1:]])
+    st.markdown(f"**Headline:** {row['headline']}")
+    st.markdown(f"**Abstract:** {row['abstract']}")
+    st.markdown(f"**Caption:** {row['caption']}")
+
+with right:
+    st.markdown(f"> **{row['alt_text']}**")
+    rating_panel(row)
+    col_save, col_skip, col_back = st.columns(3, gap="small")
+    with col_save:
+        st.button(LABEL_SAVE, on_click=leave, args=(True,), type="primary")
+    with col_skip:
+        st.button(LABEL_SKIP, on_click=leave, args=(False,))
+    with col_back:
+        st.button(LABEL_BACK, on_click=go_back, disabled=not st.session_state.history)
+
+components.html(
+    HOTKEYS_JS.replace("__ITEM__", json.dumps(suffix_of(row)))
+    .replace("__SAVE__", json.dumps(LABEL_SAVE))
+    .replace("__SKIP__", json.dumps(LABEL_SKIP))
+    .replace("__BACK__", json.dumps(LABEL_BACK)),
+    height=0,
+)
@@ -0,0 +1,452 @@
+"""
+Datenzugriff der Annotations-Apps: Alt-Text-Zeilen einmalig nach
+(image_id, model_variant) indiziert, gespeicherte Bewertungen eines Bildes
+mit einer Abfrage geladen und per Upsert geschrieben.
+
+Die SQLite-DB läuft im WAL-Modus mit einer Verbindung pro Thread (Streamlit
+rendert jede Session in einem eigenen Thread), sodass mehrere Annotierende
+gleichzeitig lesen und schreiben können, ohne "database is locked".
+
+Mehrere Annotierende: jede Bewertung gehört zu einer `annotator_id`, die
+Arbeitsliste liegt serverseitig in `queue_items` / `assignments`.
+`next_item()` vergibt zuerst unbewertete, dann unterdeckte Paare
+(image_id, model_variant), bis jedes Paar sein Overlap-Ziel erreicht hat.
+
+Autosave (app_fast.py) schreibt nur Entwürfe in `draft_evals`; in
+`detailed_evals` landet eine Bewertung erst beim expliziten Speichern.
+"""
+import atexit
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+CRITERIA = [
+    "visibility_principle",
+    "context_relevance",
+    "entity_naming",
+    "informativeness",
+    "redundancy_avoidance",
+    "style_readability",
+    "total",
+]
+DEFAULT_SCORE = 4
+BUSY_TIMEOUT_MS = 5000
+
+DEFAULT_ANNOTATOR = "default"     # Bewertungen aus der Zeit vor annotator_id
+OVERLAP_TARGET = 2                # Annotierende pro Paar im Overlap-Anteil (für Agreement)
+OVERLAP_SHARE = 0.3               # Anteil der Paare, die mehrfach bewertet werden
+LEASE_SECONDS = 15 * 60           # offene Zuweisungen verfallen danach und gehen zurück in die Queue
+FLUSH_INTERVAL_S = 1.0            # Autosave: gesammelte Änderungen spätestens nach dieser Zeit schreiben
+
+EVALS_TABLE = """
+CREATE TABLE IF NOT EXISTS detailed_evals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image_id TEXT,
+    model_variant TEXT,
+    annotator_id TEXT NOT NULL DEFAULT 'default',
+    visibility_principle    INTEGER,
+    context_relevance       INTEGER,
+    entity_naming           INTEGER,
+    informativeness         INTEGER,
+    redundancy_avoidance    INTEGER,
+    style_readability       INTEGER,
+    total                   INTEGER,
+    justification           TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    touched TEXT,                       -- JSON-Liste der aktiv gesetzten Kriterien (NULL = nicht erfasst)
+    UNIQUE(image_id, model_variant, annotator_id)
+);
+"""
+
+SCHEMA = EVALS_TABLE + """
+-- UNIQUE(image_id, model_variant, annotator_id) deckt die Abfrage pro Bild ab; diese dienen Auswertung und Export
+CREATE INDEX IF NOT EXISTS idx_detailed_evals_variant ON detailed_evals(model_variant);
+CREATE INDEX IF NOT EXISTS idx_detailed_evals_timestamp ON detailed_evals(timestamp);
+CREATE INDEX IF NOT EXISTS idx_detailed_evals_annotator ON detailed_evals(annotator_id);
+
+CREATE TABLE IF NOT EXISTS queue_items (
+    image_id TEXT NOT NULL,
+    model_variant TEXT NOT NULL,
+    position INTEGER NOT NULL,          -- Vergabereihenfolge
+    target INTEGER NOT NULL DEFAULT 1,  -- gewünschte Anzahl Annotierender
+    PRIMARY KEY (image_id, model_variant)
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    image_id TEXT NOT NULL,
+    model_variant TEXT NOT NULL,
+    annotator_id TEXT NOT NULL,
+    assigned_at REAL NOT NULL,          -- Unix-Zeit
+    completed_at REAL,
+    PRIMARY KEY (image_id, model_variant, annotator_id)
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_open ON assignments(completed_at, assigned_at);
+
+-- Autosave-Entwürfe: zählen weder für Fortschritt noch Auswertung
+CREATE TABLE IF NOT EXISTS draft_evals (
+    image_id TEXT NOT NULL,
+    model_variant TEXT NOT NULL,
+    annotator_id TEXT NOT NULL,
+    visibility_principle    INTEGER,
+    context_relevance       INTEGER,
+    entity_naming           INTEGER,
+    informativeness         INTEGER,
+    redundancy_avoidance    INTEGER,
+    style_readability       INTEGER,
+    total                   INTEGER,
+    justification           TEXT,
+    touched TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (image_id, model_variant, annotator_id)
+);
+"""
+
+UPSERT = f"""
+INSERT INTO detailed_evals (image_id, model_variant, annotator_id, {", ".join(CRITERIA)}, justification, touched)
+VALUES (?, ?, ?, {", ".join("?" for _ in CRITERIA)}, ?, ?)
+ON CONFLICT(image_id, model_variant, annotator_id) DO UPDATE SET
+    {", ".join(f"{c} = excluded.{c}" for c in CRITERIA)},
+    justification = excluded.justification,
+    touched = excluded.touched,
+    timestamp = CURRENT_TIMESTAMP
+"""
+
+UPSERT_DRAFT = f"""
+INSERT OR REPLACE INTO draft_evals
+    (image_id, model_variant, annotator_id, {", ".join(CRITERIA)}, justification, touched, updated_at)
+VALUES (?, ?, ?, {", ".join("?" for _ in CRITERIA)}, ?, ?, ?)
+"""
+
+DELETE_DRAFT = "DELETE FROM draft_evals WHERE image_id = ? AND model_variant = ? AND annotator_id = ?"
+
+# Kandidaten für ein Annotator: noch nicht selbst bewertet, Abdeckung (fertige Bewertungen +
+# offene Zuweisungen anderer) unter dem Ziel; unbewertete zuerst, dann nach Queue-Position
+CANDIDATES = """
+WITH rated AS (
+    SELECT image_id, model_variant, COUNT(*) AS n FROM detailed_evals GROUP BY image_id, model_variant
+), leased AS (
+    SELECT image_id, model_variant, COUNT(*) AS n FROM assignments
+    WHERE completed_at IS NULL AND assigned_at >= ? GROUP BY image_id, model_variant
+)
+SELECT q.image_id, q.model_variant
+FROM queue_items q
+LEFT JOIN rated r ON r.image_id = q.image_id AND r.model_variant = q.model_variant
+LEFT JOIN leased l ON l.image_id = q.image_id AND l.model_variant = q.model_variant
+WHERE COALESCE(r.n, 0) + COALESCE(l.n, 0) < q.target
+  AND NOT EXISTS (
+      SELECT 1 FROM detailed_evals e
+      WHERE e.image_id = q.image_id AND e.model_variant = q.model_variant AND e.annotator_id = ?
+  )
+ORDER BY COALESCE(r.n, 0) + COALESCE(l.n, 0), q.position
+LIMIT ?
+"""
+
+
+def build_row_index(df):
+    """{(image_id, model_variant): Zeile als Dict} – ersetzt das O(n)-Filtern des DataFrames pro Rerun."""
+    return {(r["image_id"], r["model_variant"]): r for r in df.to_dict(orient="records")}
+
+
+def default_eval():
+    return {**{c: DEFAULT_SCORE for c in CRITERIA}, "justification": ""}
+
+
+class EvalStore:
+    """SQLite-Zugriff mit einer WAL-Verbindung pro Thread."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")     # bleibt in der DB-Datei gesetzt
+        self._migrate(conn)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        """
+        Alte DBs mit UNIQUE(image_id, model_variant) auf das Mehr-Annotierenden-Schema
+        heben; vorhandene Bewertungen erhalten annotator_id = 'default'. DBs ohne
+        `touched` bekommen die Spalte (NULL = nicht erfasst).
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cols = [row[1] for row in conn.execute("PRAGMA table_info(detailed_evals)")]
+            if cols and "annotator_id" not in cols:
+                conn.execute("ALTER TABLE detailed_evals RENAME TO detailed_evals_v1")
+                for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'detailed_evals_v1' "
+                    "AND sql IS NOT NULL"
+                ).fetchall():
+                    conn.execute(f"DROP INDEX {name}")
+                conn.execute(EVALS_TABLE)
+                columns = ", ".join(["image_id", "model_variant", *CRITERIA, "justification", "timestamp"])
+                conn.execute(
+                    f"INSERT INTO detailed_evals (annotator_id, {columns}) "
+                    f"SELECT '{DEFAULT_ANNOTATOR}', {columns} FROM detailed_evals_v1"
+                )
+                conn.execute("DROP TABLE detailed_evals_v1")
+            elif cols and "touched" not in cols:
+                conn.execute("ALTER TABLE detailed_evals ADD COLUMN touched TEXT")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @property
+    def conn(self):
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = self._connect()
+        return self.local.conn
+
+    def load_evals(self, image_id, annotator_id=DEFAULT_ANNOTATOR):
+        """Alle Bewertungen eines Bildes durch einen Annotator mit einer Abfrage: {model_variant: Dict}."""
+        rows = self.conn.execute(
+            f"SELECT model_variant, {', '.join(CRITERIA)}, justification FROM detailed_evals "
+            "WHERE image_id = ? AND annotator_id = ?",
+            (image_id, annotator_id),
+        ).fetchall()
+        return {row[0]: dict(zip([*CRITERIA, "justification"], row[1:])) for row in rows}
+
+    def save_eval(self, image_id, model_variant, scores, justification, annotator_id=DEFAULT_ANNOTATOR,
+                  touched=None):
+        """Upsert einer Bewertung (Zeitstempel wird aktualisiert) und Abschluss der Zuweisung."""
+        self.save_evals([(image_id, model_variant, annotator_id, scores, justification, touched)])
+
+    def save_evals(self, batch):
+        """
+        Mehrere Bewertungen [(image_id, model_variant, annotator_id, scores, justification, touched)]
+        in einer Transaktion; ein vorhandener Entwurf wird dabei verworfen.
+        """
+        if not batch:
+            return
+        now = time.time()
+        keys = [(image_id, variant, annotator_id) for image_id, variant, annotator_id, *_ in batch]
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT, [
+                (image_id, variant, annotator_id, *(scores[c] for c in CRITERIA), justification,
+                 None if touched is None else json.dumps(sorted(touched)))
+                for image_id, variant, annotator_id, scores, justification, touched in batch
+            ])
+            conn.executemany(
+                "UPDATE assignments SET completed_at = ? "
+                "WHERE image_id = ? AND model_variant = ? AND annotator_id = ?",
+                [(now, *key) for key in keys],
+            )
+            conn.executemany(DELETE_DRAFT, keys)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ----------------------------------------------------------------
+    # Entwürfe (Autosave)
+    # ----------------------------------------------------------------
+    def load_draft(self, image_id, model_variant, annotator_id):
+        """Ungespeicherter Stand eines Paars inkl. `touched` (Liste) oder None."""
+        row = self.conn.execute(
+            f"SELECT {', '.join(CRITERIA)}, justification, touched FROM draft_evals "
+            "WHERE image_id = ? AND model_variant = ? AND annotator_id = ?",
+            (image_id, model_variant, annotator_id),
+        ).fetchone()
+        if row is None:
+            return None
+        draft = dict(zip([*CRITERIA, "justification"], row[:-1]))
+        draft["touched"] = json.loads(row[-1] or "[]")
+        return draft
+
+    def save_drafts(self, batch):
+        """Entwürfe [(image_id, model_variant, annotator_id, scores, justification, touched)] in einer Transaktion."""
+        if not batch:
+            return
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT_DRAFT, [
+                (image_id, variant, annotator_id, *(scores[c] for c in CRITERIA), justification,
+                 json.dumps(sorted(touched)), now)
+                for image_id, variant, annotator_id, scores, justification, touched in batch
+            ])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def discard_draft(self, image_id, model_variant, annotator_id):
+        self.conn.execute(DELETE_DRAFT, (image_id, model_variant, annotator_id))
+
+    # ----------------------------------------------------------------
+    # Arbeitsliste
+    # ----------------------------------------------------------------
+    def seed_queue(self, pairs, overlap_target=OVERLAP_TARGET, overlap_share=OVERLAP_SHARE, seed=42):
+        """
+        Legt die Paare an (bestehende bleiben unverändert). Die Reihenfolge hängt nur von
+        `seed` ab (sortiert, dann gemischt), nicht davon, welche App zuerst startet.
+        Ein fester, zufälliger Anteil bekommt das Overlap-Ziel, der Rest Ziel 1.
+        """
+        pairs = sorted(set(pairs))
+        rng = random.Random(seed)
+        rng.shuffle(pairs)
+        overlap = set(rng.sample(range(len(pairs)), round(len(pairs) * overlap_share))) if pairs else set()
+        rows = [(img, var, pos, overlap_target if pos in overlap else 1) for pos, (img, var) in enumerate(pairs)]
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO queue_items (image_id, model_variant, position, target) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def next_item(self, annotator_id, exclude=(), lease_seconds=LEASE_SECONDS, whole_image=False):
+        """
+        Nächstes Paar für einen Annotator: zuerst die eigene offene Zuweisung, sonst das
+        am schlechtesten abgedeckte Paar (atomar reserviert). None = nichts mehr offen.
+        `exclude` überspringt Paare, die in dieser Session schon gezeigt wurden.
+        `whole_image` reserviert alle noch nicht selbst bewerteten Varianten des Bildes mit.
+        """
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pick = next(iter(self._open_pairs(annotator_id, 1, exclude, now - lease_seconds)), None)
+            if pick is not None:
+                leases = [pick]
+                if whole_image:
+                    leases = [tuple(p) for p in conn.execute(
+                        "SELECT image_id, model_variant FROM queue_items q WHERE image_id = ? AND NOT EXISTS ("
+                        "  SELECT 1 FROM detailed_evals e WHERE e.image_id = q.image_id"
+                        "  AND e.model_variant = q.model_variant AND e.annotator_id = ?)",
+                        (pick[0], annotator_id),
+                    )]
+                conn.executemany(
+                    "INSERT INTO assignments (image_id, model_variant, annotator_id, assigned_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(image_id, model_variant, annotator_id) DO UPDATE SET "
+                    "assigned_at = excluded.assigned_at, completed_at = NULL",
+                    [(*pair, annotator_id, now) for pair in leases],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return pick
+
+    def upcoming(self, annotator_id, n, exclude=(), lease_seconds=LEASE_SECONDS):
+        """Die nächsten `n` Paare, die `next_item` liefern würde – ohne sie zu reservieren (Prefetch)."""
+        return self._open_pairs(annotator_id, n, exclude, time.time() - lease_seconds)
+
+    def _open_pairs(self, annotator_id, n, exclude, lease_cutoff):
+        """Eigene offene Zuweisungen, danach Kandidaten in Queue-Reihenfolge (ohne `exclude`)."""
+        exclude = set(exclude)
+        own = self.conn.execute(
+            "SELECT image_id, model_variant FROM assignments "
+            "WHERE annotator_id = ? AND completed_at IS NULL AND assigned_at >= ? ORDER BY assigned_at",
+            (annotator_id, lease_cutoff),
+        ).fetchall()
+        pairs = [tuple(p) for p in own if tuple(p) not in exclude][:n]
+        if len(pairs) < n:
+            candidates = self.conn.execute(
+                CANDIDATES, (lease_cutoff, annotator_id, len(exclude) + len(pairs) + n)
+            ).fetchall()
+            taken = exclude | set(pairs)
+            pairs += [tuple(p) for p in candidates if tuple(p) not in taken][:n - len(pairs)]
+        return pairs
+
+    def release(self, image_id, model_variant, annotator_id):
+        """Gibt eine offene Zuweisung zurück (z.B. beim Überspringen)."""
+        self.conn.execute(
+            "DELETE FROM assignments WHERE image_id = ? AND model_variant = ? AND annotator_id = ? "
+            "AND completed_at IS NULL",
+            (image_id, model_variant, annotator_id),
+        )
+
+    def progress(self, annotator_id):
+        """Eigene Bewertungen, vollständig abgedeckte Paare und Gesamtzahl der Paare."""
+        own = self.conn.execute(
+            "SELECT COUNT(*) FROM detailed_evals WHERE annotator_id = ?", (annotator_id,)
+        ).fetchone()[0]
+        done, total = self.conn.execute(
+            "SELECT SUM(COALESCE(r.n, 0) >= q.target), COUNT(*) FROM queue_items q LEFT JOIN ("
+            "  SELECT image_id, model_variant, COUNT(*) AS n FROM detailed_evals GROUP BY image_id, model_variant"
+            ") r ON r.image_id = q.image_id AND r.model_variant = q.model_variant"
+        ).fetchone()
+        return {"own": own, "covered": done or 0, "total": total}
+
+
+class BatchedWriter:
+    """
+    Entprelltes Autosave von Entwürfen: Änderungen landen in einem Puffer (letzter
+    Stand pro Paar gewinnt) und werden von einem Hintergrund-Thread gesammelt in einer
+    Transaktion nach `draft_evals` geschrieben. `flush()` schreibt sofort, `discard()`
+    verwirft den Entwurf eines Paars (Puffer und DB), z.B. beim Überspringen.
+    """
+
+    def __init__(self, store, interval=FLUSH_INTERVAL_S):
+        self.store = store
+        self.interval = interval
+        self.pending = {}
+        self.lock = threading.Lock()        # schützt den Puffer
+        self.write_lock = threading.Lock()  # hält die Reihenfolge der Schreibvorgänge
+        self.stats = {"submitted": 0, "flushes": 0, "rows": 0, "last_flush_ms": 0.0}
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="eval-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, image_id, model_variant, scores, justification, annotator_id=DEFAULT_ANNOTATOR, touched=()):
+        with self.lock:
+            self.pending[(image_id, model_variant, annotator_id)] = (dict(scores), justification, set(touched))
+            self.stats["submitted"] += 1
+
+    def discard(self, image_id, model_variant, annotator_id=DEFAULT_ANNOTATOR):
+        """Entwurf verwerfen; unter write_lock, damit kein laufender Flush ihn danach wieder anlegt."""
+        key = (image_id, model_variant, annotator_id)
+        with self.write_lock:
+            with self.lock:
+                self.pending.pop(key, None)
+            self.store.discard_draft(*key)
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                self.store.save_drafts([(*key, *values) for key, values in batch.items()])
+            except Exception:
+                with self.lock:             # zurück in den Puffer, neuere Stände haben Vorrang
+                    self.pending = {**batch, **self.pending}
+                raise
+            with self.lock:
+                self.stats["flushes"] += 1
+                self.stats["rows"] += len(batch)
+                self.stats["last_flush_ms"] = (time.perf_counter() - t0) * 1000
+            return len(batch)
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.warning(f"Autosave fehlgeschlagen, neuer Versuch in {self.interval}s: {e}")
+
+    def close(self):
+        self.stop.set()
+        self.flush()
@@ -0,0 +1,233 @@
+"""
+Inkrementeller Export der manuellen Bewertungen in einen Parquet-Store für
+Dashboards. Statt bei jedem Lauf die ganze Tabelle zu lesen und alles neu zu
+rechnen (wie manual_eval_metrics.py), merkt sich der Export ein Wasserzeichen
+(timestamp, rowid) und hängt nur neue bzw. geänderte Bewertungen als weitere
+Part-Datei an. Die Aggregate (gesamt und pro Section, gleiche Definition wie in
+manual_eval_metrics.py: erst Mittel über Annotierende pro Paar, dann über Paare)
+entstehen aus pair_means.parquet, in dem nur die betroffenen Paare neu gemittelt
+werden.
+
+    python export_evals.py            # einmal exportieren
+    python export_evals.py --watch 5  # alle 5 s nachziehen
+    python export_evals.py --rebuild  # Store verwerfen und komplett neu aufbauen
+
+Store-Layout (STORE_DIR):
+    evals/part-00001.parquet …   jede exportierte Version einer Bewertung (append-only)
+    current.parquet               letzter Stand pro (image_id, model_variant, annotator_id)
+    pair_means.parquet            Mittel über Annotierende pro (image_id, model_variant)
+    overall.parquet / section.parquet   Summen, Zähler und Mittelwerte pro Gruppe
+    _watermark.json               zuletzt exportierter (timestamp, rowid)
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from eval_store import CRITERIA
+
+BASE = Path(__file__).parent
+DB_PATH = BASE / "eval_detailed.db"
+CSV_PATH = BASE / "manual_eval_pairwise.csv"
+STORE_DIR = BASE / "results" / "manual_store"
+
+RATING_KEY = ["image_id", "model_variant", "annotator_id"]
+PAIR_KEY = ["image_id", "model_variant"]
+GROUPS = {
+    "overall": ["model_variant"],
+    "section": ["section", "model_variant"],
+}
+
+# CURRENT_TIMESTAMP hat Sekundenauflösung: Änderungen in derselben Sekunde wie das
+# Wasserzeichen werden erneut gelesen und über ihren Inhalts-Hash aussortiert
+CHANGES = """
+SELECT rowid AS rowid, image_id, model_variant, {annotator_col}, {criteria}, justification, timestamp
+FROM detailed_evals
+WHERE timestamp >= ?
+ORDER BY timestamp, rowid
+"""
+
+
+def row_hash(row):
+    payload = json.dumps([str(row[c]) for c in [*RATING_KEY, *CRITERIA, "justification", "timestamp"]])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def write_parquet(df, path):
+    """Atomar schreiben, damit ein Dashboard nie eine halbe Datei liest."""
+    tmp = f"{path}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def read_parquet(path, columns):
+    return pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame(columns=columns)
+
+
+class EvalExporter:
+    def __init__(self, db_path=DB_PATH, csv_path=CSV_PATH, store_dir=STORE_DIR):
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self.store = Path(store_dir)
+        self.parts = self.store / "evals"
+        self.watermark_path = self.store / "_watermark.json"
+        os.makedirs(self.parts, exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Wasserzeichen
+    # ------------------------------------------------------------
+    def load_watermark(self):
+        if not self.watermark_path.exists():
+            return {"timestamp": "", "rowid": 0, "boundary": [], "parts": 0}
+        with open(self.watermark_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_watermark(self, watermark):
+        tmp = f"{self.watermark_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(watermark, f)
+        os.replace(tmp, self.watermark_path)
+
+    # ------------------------------------------------------------
+    # Lesen
+    # ------------------------------------------------------------
+    def read_changes(self, watermark):
+        """Neue/geänderte Zeilen seit dem Wasserzeichen (nutzt idx_detailed_evals_timestamp)."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(detailed_evals)")]
+            annotator_col = "annotator_id" if "annotator_id" in columns else "'default' AS annotator_id"
+            query = CHANGES.format(annotator_col=annotator_col, criteria=", ".join(CRITERIA))
+            changes = pd.read_sql_query(query, conn, params=(watermark["timestamp"],))
+        finally:
+            conn.close()
+        changes["row_hash"] = changes.apply(row_hash, axis=1) if len(changes) else pd.Series(dtype=str)
+        return changes[~changes["row_hash"].isin(set(watermark["boundary"]))]
+
+    def sections(self):
+        df_csv = pd.read_csv(self.csv_path, usecols=["image_id", "model_variant", "section"])
+        return df_csv.drop_duplicates(subset=PAIR_KEY)
+
+    # ------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------
+    def export(self):
+        """Ein inkrementeller Lauf; gibt die Anzahl exportierter Zeilen zurück."""
+        watermark = self.load_watermark()
+        changes = self.read_changes(watermark)
+        if changes.empty:
+            return 0
+
+        changes = changes.merge(self.sections(), on=PAIR_KEY, how="left")
+        if changes["section"].isnull().any():
+            missing = changes[changes["section"].isnull()][PAIR_KEY].drop_duplicates()
+            raise KeyError(f"Für diese Kombinationen fehlt die Sektion in der CSV:\n{missing}")
+        # mehrere Versionen desselben Schlüssels im Batch: nur die letzte zählt
+        changes = changes.drop_duplicates(subset=RATING_KEY, keep="last")
+
+        part = watermark["parts"] + 1
+        write_parquet(changes.assign(exported_at=pd.Timestamp.now(tz="UTC")),
+                      self.parts / f"part-{part:05d}.parquet")
+
+        self.update_aggregates(changes)
+
+        last = changes.iloc[-1]
+        boundary = changes.loc[changes["timestamp"] == last["timestamp"], "row_hash"].tolist()
+        if last["timestamp"] == watermark["timestamp"]:
+            boundary += watermark["boundary"]
+        self.save_watermark({
+            "timestamp": last["timestamp"], "rowid": int(last["rowid"]), "boundary": boundary, "parts": part,
+        })
+        return len(changes)
+
+    def update_aggregates(self, changes):
+        """
+        Schreibt den aktuellen Stand fort, mittelt nur die betroffenen Paare neu und
+        leitet die Gruppenaggregate danach aus pair_means ab. Wiederholbar – bricht ein
+        Lauf zwischen zwei Dateien ab, ergibt der nächste Lauf denselben Stand, weil
+        overall/section keinen eigenen Zwischenstand fortschreiben.
+        """
+        rating_cols = [*RATING_KEY, "section", *CRITERIA]
+        current = read_parquet(self.store / "current.parquet", rating_cols)
+        current = pd.concat([current[rating_cols], changes[rating_cols]]).drop_duplicates(subset=RATING_KEY, keep="last")
+
+        affected = changes[PAIR_KEY].drop_duplicates()
+        pair_cols = [*PAIR_KEY, "section", "n_annotators", *CRITERIA]
+        pair_means = read_parquet(self.store / "pair_means.parquet", pair_cols)
+        new = (
+            current.merge(affected, on=PAIR_KEY)
+            .groupby([*PAIR_KEY, "section"], as_index=False)
+            .agg(n_annotators=("annotator_id", "size"), **{c: (c, "mean") for c in CRITERIA})
+        )
+        untouched = pair_means.merge(affected, on=PAIR_KEY, how="left", indicator=True)
+        pair_means = pd.concat([untouched[untouched["_merge"] == "left_only"][pair_cols], new[pair_cols]])
+
+        # Zuerst die Grundlagen, dann die abgeleiteten Dateien (ein Paar pro Zeile → Groupby in ms)
+        write_parquet(current.sort_values(RATING_KEY), self.store / "current.parquet")
+        write_parquet(pair_means.sort_values(PAIR_KEY), self.store / "pair_means.parquet")
+        for name, keys in GROUPS.items():
+            agg = self.group_sums(pair_means, keys)
+            for c in CRITERIA:
+                agg[c] = agg[f"sum_{c}"] / agg["n_pairs"]
+            write_parquet(agg.reset_index().sort_values(keys), self.store / f"{name}.parquet")
+
+    @staticmethod
+    def group_sums(pairs, keys):
+        sums = pairs.groupby(keys)[CRITERIA].sum().add_prefix("sum_")
+        sums.insert(0, "n_pairs", pairs.groupby(keys).size())
+        return sums
+
+    def rebuild(self):
+        shutil.rmtree(self.store, ignore_errors=True)
+        os.makedirs(self.parts, exist_ok=True)
+        return self.export()
+
+
+def load_overall(store_dir=STORE_DIR):
+    """Für Dashboards: Mittelwerte pro Modellvariante ohne Zugriff auf die DB."""
+    return pd.read_parquet(Path(store_dir) / "overall.parquet", columns=["model_variant", "n_pairs", *CRITERIA])
+
+
+def load_section(store_dir=STORE_DIR):
+    return pd.read_parquet(Path(store_dir) / "section.parquet", columns=["section", "model_variant", "n_pairs", *CRITERIA])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportiert neue/geänderte manuelle Bewertungen in den Parquet-Store.")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--csv", default=str(CSV_PATH))
+    parser.add_argument("--store", default=str(STORE_DIR))
+    parser.add_argument("--watch", type=float, default=None, help="Intervall in Sekunden für fortlaufenden Export")
+    parser.add_argument("--rebuild", action="store_true", help="Store löschen und komplett neu exportieren")
+    args = parser.parse_args()
+
+    exporter = EvalExporter(args.db, args.csv, args.store)
+    if args.rebuild:
+        print(f"🧹 Store neu aufgebaut: {exporter.rebuild()} Bewertungen exportiert")
+
+    while True:
+        t0 = time.perf_counter()
+        n = exporter.export()
+        if n:
+            wm = exporter.load_watermark()
+            print(f"📦 {n} neue/geänderte Bewertungen in {(time.perf_counter() - t0) * 1000:.0f} ms exportiert "
+                  f"(Wasserzeichen {wm['timestamp']} / rowid {wm['rowid']}, Part {wm['parts']})")
+        elif args.watch is None:
+            print("✅ Keine neuen Bewertungen seit dem letzten Export")
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+    if os.path.exists(Path(args.store) / "overall.parquet"):
+        print("\n## Overall Mean Scores per Model Variant\n")
+        print(load_overall(args.store).to_markdown(index=False, floatfmt=".3f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Bild-Cache für die Annotations-Apps: verkleinerte Thumbnails auf der Platte,
+dekodierte Bilder im Speicher (LRU, überlebt Streamlit-Reruns über
+st.cache_resource) und ein Hintergrund-Prefetch der nächsten Bilder aus der
+Arbeitsliste, damit ein Klick nie auf einen JPEG-Download wartet.
+
+Thumbnails für einen ganzen Datensatz vorab laden und Trefferzeiten messen:
+
+    python image_cache.py manual_eval_pairwise.csv
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+CACHE_DIR = ".image_cache"
+THUMBNAIL_SIZE = (800, 800)      # reicht für die linke Spalte im Wide-Layout
+JPEG_QUALITY = 85
+MEMORY_ITEMS = 64                # dekodierte Bilder im Speicher
+PREFETCH_AHEAD = 5               # nächste Paare aus der Arbeitsliste
+PREFETCH_WORKERS = 4
+DOWNLOAD_TIMEOUT = 10            # Download selbst, läuft immer in einem Worker-Thread
+FOREGROUND_WAIT = 3              # so lange wartet get() im Streamlit-Thread, danach "wird geladen"
+FAILED_RETRY_S = 300             # fehlgeschlagene Downloads danach erneut versuchen
+
+
+class ImageCache:
+    """Thread-sicherer Zwei-Stufen-Cache (Speicher-LRU → Thumbnail auf Platte → Download)."""
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_items=MEMORY_ITEMS, workers=PREFETCH_WORKERS):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.in_flight = {}                     # URL → Future des laufenden Downloads
+        self.failed = {}                        # URL → Zeitpunkt des letzten Fehlschlags
+        self.session = requests.Session()       # Keep-Alive zum Bild-CDN
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-prefetch")
+        # Eigener Worker für das angezeigte Bild, damit es nicht hinter dem Prefetch wartet
+        self.foreground = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-foreground")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _download(self, url):
+        """Lädt das Original, verkleinert es und legt das Thumbnail atomar auf der Platte ab."""
+        target = self.path(url)
+        if os.path.exists(target):
+            return target
+        try:
+            resp = self.session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            resp.raise_for_status()
+            img = Image.open(BytesIO(resp.content))
+            img.thumbnail(THUMBNAIL_SIZE)
+            tmp = f"{target}.{threading.get_ident()}.tmp"
+            img.convert("RGB").save(tmp, "JPEG", quality=JPEG_QUALITY)
+            os.replace(tmp, target)
+            return target
+        except Exception:
+            with self.lock:
+                self.failed[url] = time.monotonic()
+            return None
+
+    def _fetch(self, url, future):
+        """Download im Worker; nur der Ersteller des In-flight-Eintrags entfernt ihn wieder."""
+        with self.lock:
+            if future.running() or future.done():
+                return                          # schon von einem anderen Worker übernommen
+            future.set_running_or_notify_cancel()
+        try:
+            future.set_result(self._download(url))
+        finally:
+            with self.lock:
+                if self.in_flight.get(url) is future:
+                    del self.in_flight[url]
+
+    def _start(self, url, executor, promote=False):
+        """
+        Future des Downloads; startet einen neuen, falls keiner läuft (Aufrufer hält den Lock).
+        promote=True: ein noch wartender Prefetch wird zusätzlich auf `executor` gestartet,
+        der schnellere Worker übernimmt.
+        """
+        future = self.in_flight.get(url)
+        if future is None:
+            future = self.in_flight[url] = Future()
+        elif not promote or future.running() or future.done():
+            return future
+        executor.submit(self._fetch, url, future)
+        return future
+
+    def _failed_recently(self, url):
+        """Innerhalb von FAILED_RETRY_S nach einem Fehlschlag nicht erneut laden (Aufrufer hält den Lock)."""
+        failed_at = self.failed.get(url)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < FAILED_RETRY_S:
+            return True
+        del self.failed[url]
+        return False
+
+    def _remember(self, url, img):
+        with self.lock:
+            self.memory[url] = img
+            self.memory.move_to_end(url)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def get(self, url):
+        """Dekodiertes Thumbnail oder None, wenn das Bild nicht geladen werden kann."""
+        if not isinstance(url, str) or not url:
+            return None
+        with self.lock:
+            if url in self.memory:
+                self.memory.move_to_end(url)
+                return self.memory[url]
+            if self._failed_recently(url):   # nicht bei jedem Rerun erneut auf den Timeout warten
+                return None
+            target = self.path(url)
+            future = None if os.path.exists(target) else self._start(url, self.foreground, promote=True)
+        if future is not None:
+            # Läuft der Download (z.B. schon als Prefetch) länger, weiter im Hintergrund → loading()
+            try:
+                if future.result(timeout=FOREGROUND_WAIT) is None:
+                    return None
+            except FutureTimeout:
+                return None
+        img = Image.open(target)
+        img.load()
+        self._remember(url, img)
+        return img
+
+    def prefetch(self, urls):
+        """Lädt fehlende Thumbnails im Hintergrund; bereits geladene oder laufende werden übersprungen."""
+        for url in urls:
+            if not isinstance(url, str) or not url:
+                continue
+            with self.lock:
+                if url in self.in_flight or self._failed_recently(url) or url in self.memory:
+                    continue
+                if os.path.exists(self.path(url)):
+                    continue
+                self._start(url, self.executor)
+
+    def loading(self, url):
+        """True, solange ein Download für die URL läuft (get() hat nach FOREGROUND_WAIT aufgegeben)."""
+        with self.lock:
+            return url in self.in_flight
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Lädt alle Thumbnails eines Eval-Datensatzes in den Platten-Cache.")
+    parser.add_argument("csv", nargs="?", default="manual_eval_pairwise.csv")
+    args = parser.parse_args()
+
+    urls = pd.read_csv(args.csv)["image_url_clean"].dropna().unique().tolist()
+    cache = ImageCache()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as pool:
+        paths = list(pool.map(cache._download, urls))
+    print(f"📥 {sum(p is not None for p in paths)}/{len(urls)} Thumbnails in {time.perf_counter() - t0:.1f}s "
+          f"unter {cache.cache_dir}")
+
+    cached = [u for u, p in zip(urls, paths) if p]
+    if not cached:
+        return
+    for label, repeat in (("Platte (dekodieren)", False), ("Speicher (LRU)", True)):
+        times = []
+        for url in cached[:MEMORY_ITEMS]:
+            if not repeat:
+                cache.memory.pop(url, None)
+            t0 = time.perf_counter()
+            cache.get(url)
+            times.append((time.perf_counter() - t0) * 1000)
+        times.sort()
+        print(f"⏱️  Treffer {label}: Median {times[len(times) // 2]:.2f} ms, Max {times[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
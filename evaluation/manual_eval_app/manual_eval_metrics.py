@@ -1,6 +1,8 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
+from itertools import combinations
 from pathlib import Path
 
 # --- KONFIGURATION ---
@@ -11,12 +13,97 @@ DB_PATH = BASE / "eval_detailed.db"
 CSV_PATH = BASE / "manual_eval_pairwise.csv"
 OUTPUT_DIR = BASE / "results" / "manual_metrics"
 
+SCORES = np.arange(1, 6)   # Likert 1–5
+
 # Verzeichnisse anlegen
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# --- Agreement-Maße (vektorisiert über NumPy) ---
+def krippendorff_alpha(ratings, level="ordinal", categories=SCORES):
+    """
+    Krippendorffs Alpha für eine Matrix (Annotierende × Einheiten), NaN = nicht bewertet.
+    Über die Koinzidenzmatrix; level ∈ {"nominal", "ordinal", "interval"}.
+    """
+    ratings = np.asarray(ratings, dtype=float)
+    # n_uk: wie viele Annotierende Einheit u mit Kategorie k bewertet haben
+    counts = (ratings[:, :, None] == categories[None, None, :]).sum(axis=0)
+    m_u = counts.sum(axis=1)
+    counts, m_u = counts[m_u >= 2], m_u[m_u >= 2]          # nur paarbare Einheiten
+    if len(m_u) == 0:
+        return np.nan
+    weights = 1.0 / (m_u - 1)
+    coincidence = np.einsum("uc,uk,u->ck", counts, counts, weights) - np.diag((counts * weights[:, None]).sum(axis=0))
+    n_c = coincidence.sum(axis=1)
+    n = n_c.sum()
+
+    c, k = np.meshgrid(categories, categories, indexing="ij")
+    if level == "nominal":
+        delta = (c != k).astype(float)
+    elif level == "interval":
+        delta = (c - k) ** 2.0
+    elif level == "ordinal":
+        cum = np.concatenate([[0.0], np.cumsum(n_c)])
+        idx_c, idx_k = np.meshgrid(np.arange(len(categories)), np.arange(len(categories)), indexing="ij")
+        lo, hi = np.minimum(idx_c, idx_k), np.maximum(idx_c, idx_k)
+        delta = (cum[hi + 1] - cum[lo] - (n_c[idx_c] + n_c[idx_k]) / 2) ** 2
+    else:
+        raise ValueError(f"Unbekanntes Skalenniveau: {level}")
+
+    expected = (np.outer(n_c, n_c) * delta).sum()
+    if expected == 0:
+        return np.nan
+    return 1 - (n - 1) * (coincidence * delta).sum() / expected
+
+
+def cohen_kappa(a, b, weights=None, categories=SCORES):
+    """Cohens Kappa zweier Bewertungsvektoren (gleiche Einheiten); weights ∈ {None, "linear", "quadratic"}."""
+    a, b = np.asarray(a, dtype=int), np.asarray(b, dtype=int)
+    k = len(categories)
+    observed = np.bincount((a - categories[0]) * k + (b - categories[0]), minlength=k * k).reshape(k, k).astype(float)
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / observed.sum()
+    i, j = np.meshgrid(np.arange(k), np.arange(k), indexing="ij")
+    if weights is None:
+        w = (i != j).astype(float)
+    elif weights == "linear":
+        w = np.abs(i - j) / (k - 1)
+    else:
+        w = ((i - j) / (k - 1)) ** 2
+    denom = (w * expected).sum()
+    return 1 - (w * observed).sum() / denom if denom else np.nan
+
+
+def agreement_table(df, criteria):
+    """Alpha (ordinal/interval) und mittleres paarweises Kappa pro Kriterium über alle Annotierenden."""
+    annotators = sorted(df["annotator_id"].unique())
+    rows = []
+    for crit in criteria:
+        wide = df.pivot_table(index="annotator_id", columns=["image_id", "model_variant"], values=crit, aggfunc="first")
+        matrix = wide.reindex(annotators).to_numpy(dtype=float)
+        kappas, kappas_q, overlap = [], [], []
+        for i, j in combinations(range(len(annotators)), 2):
+            both = ~np.isnan(matrix[i]) & ~np.isnan(matrix[j])
+            if both.sum() < 2:
+                continue
+            kappas.append(cohen_kappa(matrix[i, both], matrix[j, both]))
+            kappas_q.append(cohen_kappa(matrix[i, both], matrix[j, both], weights="quadratic"))
+            overlap.append(both.sum())
+        rows.append({
+            "criterion": crit,
+            "units_multi_rated": int(((~np.isnan(matrix)).sum(axis=0) >= 2).sum()),
+            "alpha_ordinal": krippendorff_alpha(matrix, "ordinal"),
+            "alpha_interval": krippendorff_alpha(matrix, "interval"),
+            "kappa_mean": np.nanmean(kappas) if kappas else np.nan,
+            "kappa_quadratic_mean": np.nanmean(kappas_q) if kappas_q else np.nan,
+            "annotator_pairs": len(overlap),
+        })
+    return pd.DataFrame(rows)
+
 # --- 1) DB öffnen und manuelle Scores laden ---
 conn = sqlite3.connect(DB_PATH)
-df_db = pd.read_sql_query("SELECT image_id, model_variant, visibility_principle, context_relevance, entity_naming, informativeness, redundancy_avoidance, style_readability, total FROM detailed_evals;", conn)
+# Ältere DBs (vor eval_store.py) haben noch keine annotator_id-Spalte
+columns = [row[1] for row in conn.execute("PRAGMA table_info(detailed_evals)")]
+annotator_col = "annotator_id" if "annotator_id" in columns else "'default' AS annotator_id"
+df_db = pd.read_sql_query(f"SELECT image_id, model_variant, {annotator_col}, visibility_principle, context_relevance, entity_naming, informativeness, redundancy_avoidance, style_readability, total FROM detailed_evals;", conn)
 
 # --- 2) CSV laden, um section zu bekommen ---
 df_csv = pd.read_csv(CSV_PATH, usecols=["image_id", "model_variant", "section"])
@@ -41,6 +128,9 @@ criteria = [
 ]
 
 # --- 5) Overall-Mittelwerte pro Modellvariante ---
+# Agreement über die Einzelbewertungen; für die Mittelwerte zählt jedes Paar einmal (Mittel über Annotierende)
+df_ratings = df
+df = df.groupby(["image_id", "model_variant", "section"], as_index=False)[criteria].mean()
 df_overall = df.groupby("model_variant")[criteria].mean().reset_index()
 
 # --- 6) Mittelwerte pro Section und Modellvariante ---
@@ -70,4 +160,17 @@ with open(OUTPUT_DIR / "manual_section_scores.md", "w", encoding="utf-8") as f:
     f.write("# Manual Evaluation – Mean Scores per Section & Model Variant\n\n")
     f.write(df_section.to_markdown())
 
+# --- 9) Inter-Rater-Agreement (nur Paare mit ≥ 2 Annotierenden) ---
+n_annotators = df_ratings["annotator_id"].nunique()
+if n_annotators < 2:
+    print("\nℹ️ Nur ein Annotator in der DB – kein Inter-Rater-Agreement berechenbar.")
+else:
+    df_agreement = agreement_table(df_ratings, criteria)
+    print(f"\n## Inter-Rater Agreement ({n_annotators} Annotierende)\n")
+    print(df_agreement.to_markdown(index=False, floatfmt=".3f"))
+    df_agreement.to_csv(OUTPUT_DIR / "manual_agreement.csv", index=False)
+    with open(OUTPUT_DIR / "manual_agreement.md", "w", encoding="utf-8") as f:
+        f.write("# Manual Evaluation – Inter-Rater Agreement (Krippendorff's Alpha, Cohen's Kappa)\n\n")
+        f.write(df_agreement.to_markdown(index=False, floatfmt=".3f"))
+
 print(f"\nErgebnisse gespeichert in: {OUTPUT_DIR}")
@@ -1,70 +1,170 @@
-import json
-import pandas as pd
-import random
+import argparse
+import sys
+from pathlib import Path
 
-# Inputdatei laden
-with open("data/processed/testset_with_predictions_20250602_220302.json", "r", encoding="utf-8") as f:
-    data = [json.loads(line) for line in f]  # falls NDJSON
+import numpy as np
+import pandas as pd
 
-# Optional: als DataFrame für einfaches Handling
-df = pd.DataFrame(data)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "scripts"))
+from common.alt_text_checks import lint_alt_text  # noqa: E402
+from common.json_stream import iter_json  # noqa: E402
+from judge_parsing import CRITERIA, parse_judgement, validate_judgement  # noqa: E402
 
-# Verfügbare Sektionen anzeigen
-print("Verfügbare Sektionen:", df["section"].unique())
+INPUT_PATH = "data/processed/testset_with_predictions_20250602_220302.json"
+JUDGING_PATH = "data/processed/full_sampled_with_judging.json"
+SAMPLE_CSV = "manual_eval_app/manual_eval_sample.csv"
+PAIRWISE_CSV = "manual_eval_app/manual_eval_pairwise.csv"
 
 # Ziel: 96 Beispiele → 4 pro Kategorie, falls 24 Sektionen
-samples_per_section = 4
-selected_entries = []
-
-for section in df["section"].unique():
-    section_df = df[df["section"] == section]
-    sampled = section_df.sample(n=samples_per_section, random_state=42)
-    selected_entries.extend(sampled.to_dict(orient="records"))
-
-# Als CSV speichern für Streamlit
-output_df = pd.DataFrame(selected_entries)
-
-# Optional: Auswahl der Spalten
-output_df = output_df[[
-    "image_id",
-    "image_url_clean",
-    "headline",
-    "abstract",
-    "caption",
-    "openai_alt_text_refined",
+SAMPLES_PER_SECTION = 4
+SEED = 42
+
+# Aktive Auswahl: Varianten, deren Judge-Scores verglichen werden, und Gewichte der Signale
+JUDGED_VARIANTS = [
     "generated_baseline",
     "generated_finetuned",
-    "section"
-]]
-
-output_df.to_csv("manual_eval_app/manual_eval_sample.csv", index=False)
-print("✅ 96 Beispiele gespeichert in manual_eval_sample.csv")
-
-# Aus einem Beispiel zwei machen: 1x baseline, 1x fine-tuned
-baseline_df = output_df.copy()
-baseline_df["model_variant"] = "baseline"
-baseline_df["alt_text"] = baseline_df["generated_baseline"]
-
-finetuned_df = output_df.copy()
-finetuned_df["model_variant"] = "finetuned"
-finetuned_df["alt_text"] = finetuned_df["generated_finetuned"]
-
-# Kombinieren und sortieren (damit pro Bild Baseline & Fine-Tuned direkt beieinander stehen)
-final_df = pd.concat([baseline_df, finetuned_df])
-final_df = final_df.sort_values(by=["image_id", "model_variant"])
-
-# Unnötige Spalten entfernen
-final_df = final_df[[
-    "image_id",
-    "image_url_clean",
-    "headline",
-    "abstract",
-    "caption",
-    "alt_text",
-    "model_variant",
-    "section"
-]]
-
-# Exportieren
-final_df.to_csv("manual_eval_app/manual_eval_pairwise.csv", index=False)
-print("✅ Paarweise Vergleichsdatei gespeichert als manual_eval_pairwise.csv")
\ No newline at end of file
+    "generated_baseline_no_context",
+    "generated_finetuned_no_context",
+]
+ANNOTATED_VARIANTS = ["generated_baseline", "generated_finetuned"]
+SIGNAL_WEIGHTS = {
+    "judge_variance": 0.35,   # Judge ist sich über die Varianten hinweg uneinig
+    "score_gap": 0.35,        # Baseline und Fine-Tuned liegen weit auseinander
+    "lint_hits": 0.15,        # Regelverstöße in den zu annotierenden Texten
+    "parse_failures": 0.15,   # Judge-Antwort fehlt oder ist ungültig
+}
+
+
+def informativeness(df, judging):
+    """
+    Signale pro Testitem, jeweils als Rang-Perzentil (0–1) normiert und gewichtet
+    summiert: hoher Wert = Annotation bringt voraussichtlich viel Information.
+    """
+    judged = {e.get("image_id"): e for e in judging}
+    signals = []
+    for _, row in df.iterrows():
+        entry = judged.get(row["image_id"], {})
+        scores, failures = {}, 0
+        for key in JUDGED_VARIANTS:
+            if not entry.get(key) and not row.get(key):
+                continue
+            raw = entry.get(f"judging_{key}")
+            result, _ = parse_judgement(raw) if isinstance(raw, str) else validate_judgement(raw)
+            if result is None:
+                failures += 1
+            else:
+                scores[key] = result
+
+        if len(scores) >= 2:
+            matrix = np.array([[s[c] for c in CRITERIA] for s in scores.values()], dtype=float)
+            variance = matrix.var(axis=0).mean()
+        else:
+            variance = 0.0
+        a, b = (scores.get(k) for k in ANNOTATED_VARIANTS)
+        gap = np.mean([abs(a[c] - b[c]) for c in CRITERIA]) if a and b else 0.0
+        lint = sum(
+            len(lint_alt_text(row.get(k), row.get("caption", ""), row.get("headline", ""), row.get("abstract", "")))
+            for k in ANNOTATED_VARIANTS
+        )
+        signals.append({"judge_variance": variance, "score_gap": gap, "lint_hits": lint, "parse_failures": failures})
+
+    signals = pd.DataFrame(signals, index=df.index)
+    normed = signals.rank(pct=True, method="average")
+    signals["informativeness"] = sum(normed[k] * w for k, w in SIGNAL_WEIGHTS.items())
+    return signals
+
+
+def select_random(df, per_section, seed=SEED):
+    parts = [g.sample(n=min(per_section, len(g)), random_state=seed) for _, g in df.groupby("section", sort=False)]
+    return pd.concat(parts)
+
+
+def select_active(df, scores, per_section):
+    """
+    Pro Section die informativsten Items; fehlen einer Section Items, gehen die
+    freien Plätze an die insgesamt informativsten übrigen Items.
+    """
+    ranked = df.assign(_score=scores).sort_values("_score", ascending=False, kind="stable")
+    selected = ranked.groupby("section", sort=False).head(per_section)
+    missing = per_section * df["section"].nunique() - len(selected)
+    if missing > 0:
+        selected = pd.concat([selected, ranked.drop(selected.index).head(missing)])
+    return selected.drop(columns="_score")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stellt das Set für die manuelle Bewertung zusammen.")
+    parser.add_argument("--mode", choices=["random", "active"], default="random",
+                        help="random: gleichverteilt pro Section; active: nach erwartetem Informationsgewinn")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--judging", default=JUDGING_PATH, help="Judge-Ergebnisse für --mode active")
+    parser.add_argument("--per-section", type=int, default=SAMPLES_PER_SECTION)
+    args = parser.parse_args()
+
+    # Optional: als DataFrame für einfaches Handling
+    df = pd.DataFrame(list(iter_json(args.input)))
+
+    # Verfügbare Sektionen anzeigen
+    print("Verfügbare Sektionen:", df["section"].unique())
+
+    if args.mode == "active":
+        signals = informativeness(df, iter_json(args.judging))
+        output_df = select_active(df, signals["informativeness"], args.per_section)
+        baseline = select_random(df, args.per_section)
+        print(f"📈 Mittlere Informativität: aktiv {signals.loc[output_df.index, 'informativeness'].mean():.3f} "
+              f"vs. zufällig {signals.loc[baseline.index, 'informativeness'].mean():.3f}")
+        print(signals.loc[output_df.index, list(SIGNAL_WEIGHTS)].mean().to_frame("Mittel aktiv")
+              .join(signals.loc[baseline.index, list(SIGNAL_WEIGHTS)].mean().to_frame("Mittel zufällig"))
+              .to_markdown(floatfmt=".2f"))
+    else:
+        output_df = select_random(df, args.per_section)
+
+    # Optional: Auswahl der Spalten
+    output_df = output_df[[
+        "image_id",
+        "image_url_clean",
+        "headline",
+        "abstract",
+        "caption",
+        "openai_alt_text_refined",
+        "generated_baseline",
+        "generated_finetuned",
+        "section"
+    ]]
+
+    output_df.to_csv(SAMPLE_CSV, index=False)
+    print(f"✅ {len(output_df)} Beispiele gespeichert in manual_eval_sample.csv ({args.mode})")
+
+    # Aus einem Beispiel zwei machen: 1x baseline, 1x fine-tuned
+    baseline_df = output_df.copy()
+    baseline_df["model_variant"] = "baseline"
+    baseline_df["alt_text"] = baseline_df["generated_baseline"]
+
+    finetuned_df = output_df.copy()
+    finetuned_df["model_variant"] = "finetuned"
+    finetuned_df["alt_text"] = finetuned_df["generated_finetuned"]
+
+    # Kombinieren und sortieren (damit pro Bild Baseline & Fine-Tuned direkt beieinander stehen)
+    final_df = pd.concat([baseline_df, finetuned_df])
+    final_df = final_df.sort_values(by=["image_id", "model_variant"])
+
+    # Unnötige Spalten entfernen
+    final_df = final_df[[
+        "image_id",
+        "image_url_clean",
+        "headline",
+        "abstract",
+        "caption",
+        "alt_text",
+        "model_variant",
+        "section"
+    ]]
+
+    # Exportieren
+    final_df.to_csv(PAIRWISE_CSV, index=False)
+    print("✅ Paarweise Vergleichsdatei gespeichert als manual_eval_pairwise.csv")
+
+
+if __name__ == "__main__":
+    main()
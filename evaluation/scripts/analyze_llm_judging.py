@@ -1,8 +1,12 @@
-import json
 import os
+import sys
 import pandas as pd
+from pathlib import Path
 from statistics import mean
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+
 # Pfade anpassen
 INPUT_PATH = "data/processed/full_sampled_with_judging.json"
 OUTPUT_DIR = "results/metrics"
@@ -31,17 +35,7 @@ criteria = [
 ]
 
 # 1. Daten laden (JSONL oder Array)
-data = []
-with open(INPUT_PATH, "r", encoding="utf-8") as f:
-    first = f.read(1)
-    f.seek(0)
-    if first == '[':
-        data = json.load(f)
-    else:
-        for line in f:
-            line = line.strip()
-            if line:
-                data.append(json.loads(line))
+data = list(iter_json(INPUT_PATH))
 
 # 2. Analyse pro Modellvariante
 def calculate_model_means(data, variant_fields, criteria):
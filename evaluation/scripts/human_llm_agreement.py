@@ -0,0 +1,267 @@
+"""
+Vergleich manueller Bewertungen (manual_eval_app/eval_detailed.db) mit den
+Scores des VLM-Judges (vlm_judge.py) auf denselben Alt-Texten: Spearman,
+Kendall, Bias und Konfusionsmatrizen pro Kriterium, jeweils mit Bootstrap-
+Konfidenzintervallen (Resampling nach image_id, da beide Varianten eines
+Bildes nicht unabhängig sind).
+
+Beantwortet, ob der günstige automatische Judge manuelle Runden ersetzen kann.
+
+    python scripts/human_llm_agreement.py
+    python scripts/human_llm_agreement.py --judging data/full_sampled_with_judging.json --bootstrap 5000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kendalltau, spearmanr
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+
+# --------------------------------------------------------------------
+# Konfiguration
+# --------------------------------------------------------------------
+JUDGING_PATH = "data/processed/full_sampled_with_judging.json"
+MANUAL_DB_PATH = "manual_eval_app/eval_detailed.db"
+OUTPUT_DIR = "results/human_llm_agreement"
+N_BOOTSTRAP = 2000
+CI_LEVEL = 0.95
+SEED = 42
+# Ab dieser unteren CI-Grenze der Rangkorrelation gilt der Judge für ein Kriterium als Ersatz
+REPLACEMENT_MIN_RHO = 0.6
+
+# Varianten der manuellen App → Feldnamen im Judging-Datensatz
+VARIANT_MAP = {
+    "baseline": "generated_baseline",
+    "finetuned": "generated_finetuned",
+}
+
+criteria = [
+    "visibility_principle",
+    "context_relevance",
+    "entity_naming",
+    "informativeness",
+    "redundancy_avoidance",
+    "style_readability",
+    "total",
+]
+SCORES = np.arange(1, 6)
+
+
+# --------------------------------------------------------------------
+# Daten
+# --------------------------------------------------------------------
+def load_manual(db_path):
+    """Manuelle Scores, bei mehreren Annotierenden gemittelt (Konsens pro Paar)."""
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(f"SELECT image_id, model_variant, {', '.join(criteria)} FROM detailed_evals", conn)
+    conn.close()
+    df = df[df["model_variant"].isin(VARIANT_MAP)]
+    df["variant_key"] = df["model_variant"].map(VARIANT_MAP)
+    return df.groupby(["image_id", "variant_key"], as_index=False)[criteria].mean()
+
+
+def load_llm(path):
+    """Scores des VLM-Judges pro (image_id, Variante); Proxy-Bewertungen werden ausgelassen."""
+    rows = []
+    for entry in iter_json(path):
+        for variant_key in VARIANT_MAP.values():
+            judge = entry.get(f"judging_{variant_key}")
+            # Scores des lokalen Proxys (judge_proxy.py) sind kein VLM-Urteil
+            if not isinstance(judge, dict) or judge.get("judge_source") == "proxy":
+                continue
+            row = {"image_id": entry.get("image_id"), "variant_key": variant_key, "section": entry.get("section")}
+            for crit in criteria:
+                value = judge.get(crit)
+                row[crit] = value if isinstance(value, (int, float)) else np.nan
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def join_scores(manual, llm):
+    """Inner Join auf (image_id, Variante); Spalten <kriterium>_human / <kriterium>_llm."""
+    return manual.merge(llm, on=["image_id", "variant_key"], how="inner", suffixes=("_human", "_llm"))
+
+
+# --------------------------------------------------------------------
+# Kennzahlen
+# --------------------------------------------------------------------
+def point_metrics(human, llm):
+    """Kennzahlen für zwei gleich lange Score-Vektoren (ohne NaN)."""
+    rho = spearmanr(human, llm).statistic if np.ptp(human) and np.ptp(llm) else np.nan
+    tau = kendalltau(human, llm).statistic if np.ptp(human) and np.ptp(llm) else np.nan
+    diff = llm - human
+    rounded = np.rint(human)
+    return {
+        "spearman": rho,
+        "kendall": tau,
+        "bias": diff.mean(),                              # > 0: Judge bewertet großzügiger
+        "mae": np.abs(diff).mean(),
+        "exact": (rounded == llm).mean(),
+        "within_1": (np.abs(rounded - llm) <= 1).mean(),
+    }
+
+
+def weighted_metrics(human, llm, weights):
+    """
+    Kennzahlen für viele Bootstrap-Stichproben auf einmal. Eine Cluster-Stichprobe ist
+    äquivalent zu Gewichten w (wie oft jede Zeile gezogen wurde); Ränge, Kendall-Paare und
+    Mittelwerte werden exakt wie auf den duplizierten Daten berechnet. weights: (B, n).
+    Der Speicher wächst mit B·n², daher übergibt bootstrap_ci nur die verschiedenen
+    (Mensch, Judge)-Wertepaare mit aufsummierten Gewichten statt aller Zeilen.
+    """
+    w = weights.astype(float)
+    total = w.sum(axis=1)
+    dh = np.sign(human[:, None] - human[None, :])             # (n, n)
+    dl = np.sign(llm[:, None] - llm[None, :])
+    ww = w[:, :, None] * w[:, None, :]                         # (B, n, n)
+
+    # Kendall tau-b: Paare zwischen Kopien derselben Zeile tragen nichts bei (Vorzeichen 0)
+    tau = np.einsum("bij,ij->b", ww, dh * dl) / np.sqrt(
+        np.einsum("bij,ij->b", ww, dh * dh) * np.einsum("bij,ij->b", ww, dl * dl))
+
+    # Spearman: Mittelränge auf den duplizierten Daten, dann gewichtete Pearson-Korrelation
+    def ranks(x):
+        less = np.einsum("bj,ij->bi", w, (x[None, :] < x[:, None]).astype(float))
+        equal = np.einsum("bj,ij->bi", w, (x[None, :] == x[:, None]).astype(float))
+        return less + (equal + 1) / 2
+
+    rh, rl = ranks(human), ranks(llm)
+    mh = (w * rh).sum(axis=1) / total
+    ml = (w * rl).sum(axis=1) / total
+    cov = (w * (rh - mh[:, None]) * (rl - ml[:, None])).sum(axis=1)
+    var_h = (w * (rh - mh[:, None]) ** 2).sum(axis=1)
+    var_l = (w * (rl - ml[:, None]) ** 2).sum(axis=1)
+    rho = cov / np.sqrt(var_h * var_l)
+
+    diff = llm - human
+    rounded = np.rint(human)
+    return {
+        "spearman": rho,
+        "kendall": tau,
+        "bias": (w * diff).sum(axis=1) / total,
+        "mae": (w * np.abs(diff)).sum(axis=1) / total,
+        "exact": (w * (rounded == llm)).sum(axis=1) / total,
+        "within_1": (w * (np.abs(rounded - llm) <= 1)).sum(axis=1) / total,
+    }
+
+
+def bootstrap_ci(df, human_col, llm_col, n_boot=N_BOOTSTRAP, level=CI_LEVEL, seed=SEED, chunk=200):
+    """Percentile-Bootstrap über image_id-Cluster (vektorisiert); gibt {Kennzahl: (lo, hi)} zurück."""
+    rng = np.random.default_rng(seed)
+    cluster = pd.factorize(df["image_id"])[0]
+    n_clusters = cluster.max() + 1
+    human, llm = df[human_col].to_numpy(float), df[llm_col].to_numpy(float)
+
+    # Suffiziente Statistik: Scores liegen auf einer 1–5-Skala, es gibt also nur wenige
+    # verschiedene (Mensch, Judge)-Paare. membership[c, k] = Zeilen von Bild c mit Paar k;
+    # alle Kennzahlen hängen nur vom Gewicht pro Paar ab, unabhängig von der Zeilenzahl.
+    pairs, pair_idx = np.unique(np.column_stack([human, llm]), axis=0, return_inverse=True)
+    membership = np.zeros((n_clusters, len(pairs)))
+    np.add.at(membership, (cluster, pair_idx.ravel()), 1)
+
+    results = {}
+    for start in range(0, n_boot, chunk):
+        size = min(chunk, n_boot - start)
+        # Wie oft wurde jedes Bild gezogen → Gewicht jeder Zeile
+        draws = rng.integers(0, n_clusters, (size, n_clusters))
+        counts = np.zeros((size, n_clusters))
+        np.add.at(counts, (np.arange(size)[:, None], draws), 1)
+        # Stichproben ohne Varianz liefern NaN (wie scipy) und fallen aus den Quantilen
+        with np.errstate(invalid="ignore", divide="ignore"):
+            metrics = weighted_metrics(pairs[:, 0], pairs[:, 1], counts @ membership)
+        for metric, values in metrics.items():
+            results.setdefault(metric, []).append(values)
+
+    alpha = (1 - level) / 2
+    ci = {}
+    for metric, values in results.items():
+        values = np.concatenate(values)
+        values = values[~np.isnan(values)]
+        ci[metric] = tuple(np.quantile(values, [alpha, 1 - alpha])) if len(values) else (np.nan, np.nan)
+    return ci
+
+
+def confusion(human, llm):
+    """5×5-Matrix: Zeilen = Mensch (gerundet), Spalten = Judge."""
+    h = np.clip(np.rint(human), 1, 5).astype(int) - 1
+    l = np.clip(np.rint(llm), 1, 5).astype(int) - 1
+    return np.bincount(h * 5 + l, minlength=25).reshape(5, 5)
+
+
+def agreement_report(joined, n_boot=N_BOOTSTRAP):
+    rows, matrices = [], []
+    for variant, df_v in [("all", joined), *joined.groupby("variant_key")]:
+        for crit in criteria:
+            df_c = df_v.dropna(subset=[f"{crit}_human", f"{crit}_llm"])
+            if len(df_c) < 3:
+                continue
+            human, llm = df_c[f"{crit}_human"].to_numpy(float), df_c[f"{crit}_llm"].to_numpy(float)
+            row = {"variant": variant, "criterion": crit, "n": len(df_c), **point_metrics(human, llm)}
+            for metric, (lo, hi) in bootstrap_ci(df_c, f"{crit}_human", f"{crit}_llm", n_boot).items():
+                row[f"{metric}_lo"], row[f"{metric}_hi"] = lo, hi
+            rows.append(row)
+            matrix = confusion(human, llm)
+            for i, j in np.ndindex(matrix.shape):
+                matrices.append({"variant": variant, "criterion": crit,
+                                 "human": SCORES[i], "llm": SCORES[j], "count": int(matrix[i, j])})
+    return pd.DataFrame(rows), pd.DataFrame(matrices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agreement zwischen manuellen und LLM-Judge-Bewertungen.")
+    parser.add_argument("--judging", default=JUDGING_PATH)
+    parser.add_argument("--manual-db", default=MANUAL_DB_PATH)
+    parser.add_argument("--bootstrap", type=int, default=N_BOOTSTRAP)
+    args = parser.parse_args()
+
+    manual = load_manual(args.manual_db)
+    llm = load_llm(args.judging)
+    joined = join_scores(manual, llm)
+    print(f"📥 {len(manual)} manuelle Paare, {len(llm)} Judge-Paare → {len(joined)} gemeinsame "
+          f"({joined['image_id'].nunique()} Bilder)")
+    if joined.empty:
+        raise SystemExit("❌ Keine Überschneidung zwischen manuellen und LLM-Bewertungen.")
+
+    report, matrices = agreement_report(joined, args.bootstrap)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    joined.to_csv(f"{OUTPUT_DIR}/joined_scores.csv", index=False)
+    report.to_csv(f"{OUTPUT_DIR}/agreement.csv", index=False)
+    matrices.to_csv(f"{OUTPUT_DIR}/confusion_matrices.csv", index=False)
+
+    def with_ci(row, metric):
+        return f"{row[metric]:.2f} [{row[f'{metric}_lo']:.2f}, {row[f'{metric}_hi']:.2f}]"
+
+    overall = report[report["variant"] == "all"]
+    table = pd.DataFrame({
+        "criterion": overall["criterion"],
+        "n": overall["n"],
+        **{m: [with_ci(r, m) for _, r in overall.iterrows()] for m in ("spearman", "kendall", "bias", "exact")},
+    })
+    print(f"\n## Mensch vs. VLM-Judge (alle Varianten, {int(CI_LEVEL * 100)}%-Bootstrap-CI, n_boot={args.bootstrap})")
+    print(table.to_markdown(index=False))
+
+    by_variant = report[(report["variant"] != "all") & (report["criterion"] == "total")]
+    if not by_variant.empty:
+        print("\n## Gesamteindruck pro Variante")
+        print(by_variant[["variant", "n", "spearman", "kendall", "bias", "exact"]].to_markdown(index=False, floatfmt=".2f"))
+
+    for crit in ("total",):
+        m = matrices[(matrices["variant"] == "all") & (matrices["criterion"] == crit)]
+        if not m.empty:
+            print(f"\n## Konfusionsmatrix {crit} (Zeilen: Mensch, Spalten: Judge)")
+            print(m.pivot(index="human", columns="llm", values="count").to_markdown())
+
+    replaceable = overall[overall["spearman_lo"] >= REPLACEMENT_MIN_RHO]["criterion"].tolist()
+    print(f"\n✅ Judge ersetzt manuelle Runde (Spearman-CI ≥ {REPLACEMENT_MIN_RHO}): {', '.join(replaceable) or 'kein Kriterium'}")
+    print(f"💾 Ergebnisse gespeichert unter: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+
+# --------------------------------------------------------------------
+# Schema der Judge-Antwort (vlm_judge.py)
+# --------------------------------------------------------------------
+CRITERIA = [
+    "visibility_principle",
+    "context_relevance",
+    "entity_naming",
+    "informativeness",
+    "redundancy_avoidance",
+    "style_readability",
+    "total",
+]
+SCORE_MIN, SCORE_MAX = 1, 5
+
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{crit: {"type": "integer", "enum": list(range(SCORE_MIN, SCORE_MAX + 1))} for crit in CRITERIA},
+        "justification": {"type": "string"},
+    },
+    "required": [*CRITERIA, "justification"],
+    "additionalProperties": False,
+}
+
+# Structured Outputs (gpt-4o-mini unterstützt json_schema mit strict=True)
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "alt_text_judgement", "strict": True, "schema": JUDGE_SCHEMA},
+}
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def strip_fences(text):
+    """Entfernt Markdown-Codeblöcke (```json ... ```) und Text vor/nach dem Objekt."""
+    text = _FENCE_RE.sub("", text.strip())
+    start = text.find("{")
+    return text[start:] if start >= 0 else text
+
+
+def repair_truncated(text):
+    """
+    Schließt ein abgeschnittenes JSON-Objekt (max_tokens erreicht): offene
+    Strings und Klammern werden geschlossen, ein unvollständiges letztes
+    Schlüssel-Wert-Paar wird verworfen.
+    """
+    in_string, escaped, depth = False, False, 0
+    last_complete = 0          # Position nach dem letzten vollständigen Wert auf oberster Ebene
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[:i + 1]
+        elif ch == "," and depth == 1:
+            last_complete = i
+
+    # Abgeschnittene Begründung behalten, alles andere Unvollständige verwerfen
+    tail = text[last_complete + 1:] if last_complete else ""
+    if in_string and re.match(r'\s*"justification"\s*:\s*"', tail):
+        return text.rstrip("\\") + '"}'
+    if not in_string:
+        closed = text.rstrip().rstrip(",") + "}" * max(depth, 1)
+        try:
+            json.loads(closed)
+            return closed
+        except json.JSONDecodeError:
+            pass
+    if last_complete:
+        return text[:last_complete] + "}"
+    return text + ('"' if in_string else "") + "}" * max(depth, 1)
+
+
+def validate_judgement(obj):
+    """Prüft Vollständigkeit und Wertebereich; gibt (bereinigtes Dict oder None, Fehlerliste) zurück."""
+    if not isinstance(obj, dict):
+        return None, ["not_an_object"]
+    result, errors = {}, []
+    for crit in CRITERIA:
+        value = obj.get(crit)
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value.strip())
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool):
+            errors.append(f"missing:{crit}")
+        elif not SCORE_MIN <= value <= SCORE_MAX:
+            errors.append(f"out_of_range:{crit}")
+        else:
+            result[crit] = value
+    result["justification"] = str(obj.get("justification") or "")
+    return (None, errors) if errors else (result, [])
+
+
+def parse_judgement(text):
+    """
+    Tolerantes Parsen einer Judge-Antwort. Gibt (Dict oder None, Status) zurück,
+    Status ist 'ok', 'repaired' oder eine Fehlerbeschreibung.
+    """
+    if not text:
+        return None, "empty"
+    candidate = strip_fences(text)
+    repaired = candidate != text.strip()
+    try:
+        obj = json.loads(candidate)
+    except json.JSONDecodeError:
+        try:
+            obj = json.loads(repair_truncated(candidate))
+            repaired = True
+        except json.JSONDecodeError:
+            return None, "invalid_json"
+    result, errors = validate_judgement(obj)
+    if result is None:
+        return None, ",".join(errors)
+    return result, "repaired" if repaired else "ok"
+
+
+def main():
+    """Prüft eine bestehende Judging-Datei: wie viele Bewertungen fehlen oder sind ungültig?"""
+    parser = argparse.ArgumentParser(description="Validiert die Judgings einer Ergebnisdatei.")
+    parser.add_argument("path", nargs="?", default="data/processed/full_sampled_with_judging.json")
+    args = parser.parse_args()
+
+    counts = Counter()
+    for entry in iter_json(args.path):
+        for key in entry:
+            if not key.startswith("judging_"):
+                continue
+            variant = key[len("judging_"):]
+            if not entry.get(variant):
+                continue
+            _, errors = validate_judgement(entry[key]) if entry[key] is not None else (None, ["missing"])
+            counts[(variant, "valid" if not errors else "invalid")] += 1
+
+    print(f"{'Variante':<34} {'gültig':>7} {'ungültig':>9}")
+    for variant in sorted({v for v, _ in counts}):
+        print(f"{variant:<34} {counts[(variant, 'valid')]:>7} {counts[(variant, 'invalid')]:>9}")
+    print("\nUngültige/fehlende Bewertungen lassen sich gezielt nachholen: python scripts/vlm_judge.py --only-missing")
+
+
+if __name__ == "__main__":
+    main()
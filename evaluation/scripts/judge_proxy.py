@@ -0,0 +1,317 @@
+import os
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.model_selection import GroupKFold
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.alt_text_checks import (  # noqa: E402
+    MAX_ALT_TEXT_LENGTH,
+    clean_text,
+    count_speculative,
+    has_image_prefix,
+    ngram_overlap,
+    token_jaccard,
+    tokenize,
+)
+from common.json_stream import iter_json  # noqa: E402
+
+# --------------------------------------------------------------------
+# Konfiguration
+# --------------------------------------------------------------------
+INPUT_PATH = "data/processed/full_sampled_with_judging.json"
+MODEL_PATH = "models/judge_proxy.pkl"
+OUTPUT_DIR = "results/judge_proxy"
+SEED = 42
+N_FOLDS = 5
+
+# Schwelle pro Kriterium, aus Out-of-Fold-Vorhersagen (N_FOLDS-fache Kreuzvalidierung
+# nach image_id) bestimmt: die kleinste Konfidenz, ab der der Proxy auf mindestens
+# MIN_SUPPORT Items mit dem VLM-Judge zu TARGET_AGREEMENT exakt übereinstimmt. Das
+# gespeicherte Modell wird mit demselben Verfahren auf allen Daten trainiert, die
+# Schwellen gelten also für das Modell, das vlm_judge.py lädt. Erreicht ein Kriterium das nie, ist seine Schwelle inf. Ein
+# Kandidat wird nur lokal bewertet, wenn alle Kriterien ihre Schwelle erreichen,
+# sonst geht er an den bezahlten VLM-Judge.
+TARGET_AGREEMENT = 0.9
+MIN_SUPPORT = 30
+THRESHOLD_GRID = np.round(np.arange(0.3, 1.0, 0.05), 2)
+
+# Kostenschätzung für gpt-4o-mini (USD pro 1M Tokens, detail=low Bild = 85 Tokens)
+PRICE_INPUT_PER_M = 0.15
+PRICE_OUTPUT_PER_M = 0.60
+IMAGE_TOKENS_LOW_DETAIL = 85
+JUDGE_SYSTEM_TOKENS = 420
+JUDGE_OUTPUT_TOKENS = 120
+
+variant_keys = [
+    "generated_baseline",
+    "generated_baseline_no_context",
+    "generated_finetuned",
+    "generated_finetuned_no_context",
+]
+
+criteria = [
+    "visibility_principle",
+    "context_relevance",
+    "entity_naming",
+    "informativeness",
+    "redundancy_avoidance",
+    "style_readability",
+    "total",
+]
+
+# --------------------------------------------------------------------
+# Features
+# --------------------------------------------------------------------
+def build_features(entry, variant_key):
+    """Günstige lexikalische und Overlap-Features für einen Alt-Text-Kandidaten."""
+    alt_text = clean_text(entry.get(variant_key))
+    caption = entry.get("caption", "")
+    headline = entry.get("headline", "")
+    abstract = entry.get("abstract", "")
+    tokens = tokenize(alt_text)
+
+    caption_names = {t for t in str(caption).split() if t[:1].isupper()}
+    alt_names = {t for t in alt_text.split() if t[:1].isupper()}
+
+    return {
+        "length_chars": len(alt_text),
+        "word_count": len(tokens),
+        "is_empty": float(not alt_text),
+        "over_limit": float(len(alt_text) > MAX_ALT_TEXT_LENGTH),
+        "image_prefix": float(has_image_prefix(alt_text)),
+        "speculative_count": count_speculative(alt_text),
+        "caption_overlap_3gram": ngram_overlap(alt_text, caption),
+        "headline_overlap_3gram": ngram_overlap(alt_text, headline),
+        "abstract_overlap_3gram": ngram_overlap(alt_text, abstract),
+        "caption_jaccard": token_jaccard(alt_text, caption),
+        "abstract_jaccard": token_jaccard(alt_text, abstract),
+        "entity_count": len(alt_names),
+        "entity_recall": len(alt_names & caption_names) / len(caption_names) if caption_names else 0.0,
+        "ends_with_period": float(alt_text.endswith(".")),
+        "was_quoted": float(str(entry.get(variant_key) or "").strip().startswith('"')),
+        "is_finetuned": float("finetuned" in variant_key),
+        "with_context": float(not variant_key.endswith("no_context")),
+    }
+
+
+FEATURE_NAMES = list(build_features({"generated_baseline": ""}, "generated_baseline").keys())
+
+
+def build_table(data):
+    """
+    Eine Zeile pro (image_id, Variante) mit Features und – falls vorhanden – Judge-Scores.
+    Vom Proxy selbst vergebene Scores (judge_source == "proxy") zählen nicht als Label.
+    """
+    rows = []
+    for entry in data:
+        for key in variant_keys:
+            row = {"image_id": entry.get("image_id"), "variant": key, **build_features(entry, key)}
+            judge = entry.get(f"judging_{key}") or {}
+            row["judge_source"] = judge.get("judge_source", "vlm") if judge else None
+            if row["judge_source"] == "proxy":
+                judge = {}
+            for crit in criteria:
+                val = judge.get(crit)
+                row[crit] = int(round(val)) if isinstance(val, (int, float)) else np.nan
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+# --------------------------------------------------------------------
+# Training & Vorhersage
+# --------------------------------------------------------------------
+def train_proxy(df):
+    """Ein Gradient-Boosting-Klassifikator (Klassen 1–5) pro Kriterium."""
+    models = {}
+    for crit in criteria:
+        part = df.dropna(subset=[crit])
+        clf = GradientBoostingClassifier(n_estimators=150, max_depth=3, learning_rate=0.05, random_state=SEED)
+        clf.fit(part[FEATURE_NAMES].values, part[crit].astype(int).values)
+        models[crit] = clf
+    return {"models": models, "features": FEATURE_NAMES, "thresholds": dict.fromkeys(criteria, np.inf)}
+
+
+def predict_with_confidence(proxy, df):
+    """Gibt (Scores, Konfidenzen) als DataFrames mit einer Spalte pro Kriterium zurück."""
+    X = df[proxy["features"]].values
+    scores, confidence = {}, {}
+    for crit, clf in proxy["models"].items():
+        proba = clf.predict_proba(X)
+        scores[crit] = clf.classes_[proba.argmax(axis=1)]
+        confidence[crit] = proba.max(axis=1)
+    return pd.DataFrame(scores, index=df.index), pd.DataFrame(confidence, index=df.index)
+
+
+def out_of_fold_predictions(df):
+    """
+    Scores und Konfidenzen für jedes Item von einem Modell, das dessen Bild nicht
+    gesehen hat (GroupKFold nach image_id, keine Varianten desselben Bildes in
+    Training und Test).
+    """
+    scores, confidence = [], []
+    for train_idx, test_idx in GroupKFold(n_splits=N_FOLDS).split(df, groups=df["image_id"]):
+        fold_scores, fold_confidence = predict_with_confidence(train_proxy(df.iloc[train_idx]), df.iloc[test_idx])
+        scores.append(fold_scores)
+        confidence.append(fold_confidence)
+    return pd.concat(scores).loc[df.index], pd.concat(confidence).loc[df.index]
+
+
+def route_mask(confidence, thresholds):
+    """True = Proxy ist für jedes Kriterium sicher genug, kein bezahlter Judge-Call nötig."""
+    return (confidence >= pd.Series(thresholds)[confidence.columns]).all(axis=1)
+
+
+def calibrate_thresholds(y_true, scores, confidence):
+    """
+    Pro Kriterium die kleinste Schwelle aus THRESHOLD_GRID, ab der die exakte
+    Übereinstimmung out-of-fold ≥ TARGET_AGREEMENT bei ≥ MIN_SUPPORT Items liegt.
+    """
+    thresholds, rows = {}, []
+    for crit in criteria:
+        thresholds[crit] = np.inf
+        for th in THRESHOLD_GRID:
+            mask = confidence[crit] >= th
+            exact = (y_true.loc[mask, crit] == scores.loc[mask, crit]).mean() if mask.any() else np.nan
+            rows.append({"criterion": crit, "threshold": th, "support": int(mask.sum()), "exact_agreement": exact})
+            if np.isinf(thresholds[crit]) and mask.sum() >= MIN_SUPPORT and exact >= TARGET_AGREEMENT:
+                thresholds[crit] = float(th)
+    return thresholds, pd.DataFrame(rows)
+
+
+def save_proxy(proxy, path=MODEL_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(proxy, f)
+
+
+def load_proxy(path=MODEL_PATH):
+    with open(path, "rb") as f:
+        proxy = pickle.load(f)
+    if "thresholds" not in proxy:       # ältere Modelle mit einer gemeinsamen Schwelle
+        proxy["thresholds"] = dict.fromkeys(criteria, proxy.pop("threshold"))
+    return proxy
+
+
+def prescreen(proxy, entry, variant_key):
+    """
+    Vorab-Bewertung für vlm_judge.py. Liefert ein Judge-kompatibles Dict, wenn
+    der Proxy für alle Kriterien sicher ist, sonst None (→ bezahlter Judge).
+    """
+    row = pd.DataFrame([build_features(entry, variant_key)])
+    scores, confidence = predict_with_confidence(proxy, row)
+    if not route_mask(confidence, proxy["thresholds"]).iloc[0]:
+        return None
+    result = {crit: int(scores[crit].iloc[0]) for crit in criteria}
+    result["justification"] = "Scored locally by judge proxy."
+    result["judge_source"] = "proxy"
+    return result
+
+# --------------------------------------------------------------------
+# Auswertung
+# --------------------------------------------------------------------
+def agreement_report(y_true, y_pred):
+    rows = []
+    for crit in criteria:
+        t, p = y_true[crit].astype(float), y_pred[crit].astype(float)
+        rows.append({
+            "criterion": crit,
+            "n": len(t),
+            "exact_agreement": (t == p).mean(),
+            "within_1": ((t - p).abs() <= 1).mean(),
+            "mae": (t - p).abs().mean(),
+            "spearman": t.corr(p, method="spearman"),
+        })
+    return pd.DataFrame(rows).set_index("criterion")
+
+
+def cost_per_judge_call(entry_context_chars=600, alt_text_chars=130):
+    prompt_tokens = JUDGE_SYSTEM_TOKENS + IMAGE_TOKENS_LOW_DETAIL + (entry_context_chars + alt_text_chars) / 4
+    return (prompt_tokens * PRICE_INPUT_PER_M + JUDGE_OUTPUT_TOKENS * PRICE_OUTPUT_PER_M) / 1e6
+
+
+def threshold_sweep(y_true, scores, confidence, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9)):
+    """Gemeinsame Schwelle für alle Kriterien; Übereinstimmung pro Kriterium, nicht gepoolt."""
+    rows = []
+    for th in thresholds:
+        mask = route_mask(confidence, dict.fromkeys(criteria, th))
+        row = {"threshold": th, "auto_scored_share": mask.mean()}
+        for crit in criteria:
+            row[f"exact_{crit}"] = (y_true.loc[mask, crit] == scores.loc[mask, crit]).mean() if mask.any() else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    print(f"📥 Lade Judgings: {INPUT_PATH}")
+    data = list(iter_json(INPUT_PATH))
+    df = build_table(data)
+    n_proxy = int((df["judge_source"] == "proxy").sum())
+    df = df.dropna(subset=criteria, how="all")
+    print(f"✅ {len(df)} bewertete Alt-Texte aus {df['image_id'].nunique()} Artikeln "
+          f"({n_proxy} Proxy-Bewertungen ignoriert)")
+
+    print(f"🔁 {N_FOLDS}-fache Kreuzvalidierung nach image_id …")
+    scores, confidence = out_of_fold_predictions(df)
+    # Ausgewertet werden nur vollständig bewertete Items
+    y_true = df[criteria].dropna()
+    scores, confidence = scores.loc[y_true.index], confidence.loc[y_true.index]
+
+    report = agreement_report(y_true, scores)
+    thresholds, calibration = calibrate_thresholds(y_true, scores, confidence)
+    mask = route_mask(confidence, thresholds)
+    report_auto = agreement_report(y_true.loc[mask], scores.loc[mask]) if mask.any() else None
+    sweep = threshold_sweep(y_true, scores, confidence)
+
+    # Kostenschätzung pro Lauf (alle Einträge × 4 Varianten)
+    n_calls = len(data) * len(variant_keys)
+    call_cost = cost_per_judge_call()
+    saved_calls = int(round(mask.mean() * n_calls))
+    cost_summary = pd.DataFrame([{
+        "judge_calls_per_run": n_calls,
+        "auto_scored_share": mask.mean(),
+        "calls_saved": saved_calls,
+        "cost_per_call_usd": call_cost,
+        "cost_full_run_usd": n_calls * call_cost,
+        "cost_saved_usd": saved_calls * call_cost,
+    }])
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    report.to_csv(f"{OUTPUT_DIR}/agreement_holdout.csv")
+    sweep.to_csv(f"{OUTPUT_DIR}/threshold_sweep.csv", index=False)
+    calibration.to_csv(f"{OUTPUT_DIR}/threshold_calibration.csv", index=False)
+    cost_summary.to_csv(f"{OUTPUT_DIR}/cost_estimate.csv", index=False)
+    if report_auto is not None:
+        report_auto.to_csv(f"{OUTPUT_DIR}/agreement_holdout_auto_scored.csv")
+
+    print("\n## Agreement Proxy vs. VLM-Judge (out-of-fold, alle Items)")
+    print(report.to_markdown())
+    print(f"\n## Schwellen pro Kriterium (exakt ≥ {TARGET_AGREEMENT}, mind. {MIN_SUPPORT} Items)")
+    print(pd.Series(thresholds, name="threshold").to_markdown())
+    unreliable = [crit for crit, th in thresholds.items() if np.isinf(th)]
+    if unreliable:
+        print(f"⚠️ Keine verlässliche Schwelle für: {', '.join(unreliable)} – "
+              "Kandidaten gehen immer an den VLM-Judge.")
+    if report_auto is not None:
+        print("\n## Agreement auf automatisch übernommenen Items")
+        print(report_auto.to_markdown())
+    else:
+        print("\nℹ️ Mit diesen Schwellen wird kein Kandidat lokal bewertet – der Proxy spart nichts.")
+    print("\n## Threshold-Sweep")
+    print(sweep.to_markdown(index=False))
+    print("\n## Kostenschätzung pro Lauf")
+    print(cost_summary.to_markdown(index=False))
+
+    # Gleiches Verfahren wie in der Kreuzvalidierung, jetzt auf allen Daten
+    proxy = train_proxy(df)
+    proxy["thresholds"] = thresholds
+    save_proxy(proxy, MODEL_PATH)
+    print(f"\n💾 Proxy-Modell gespeichert unter: {MODEL_PATH}")
+    print(f"💾 Reports gespeichert unter: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,55 @@
+import argparse
 import json
+import os
+import sys
+from pathlib import Path
 
-# Lade beide Dateien erneut nach Kernel-Reset
-with open("data/processed/testset_with_predictions_20250602_220302.json", "r") as f1:
-    with_context = [json.loads(line) for line in f1]
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
 
-with open("data/processed/testset_with_predictions_no_context20250603_193545.json", "r") as f2:
-    no_context = [json.loads(line) for line in f2]
+WITH_CONTEXT_PATH = "data/processed/testset_with_predictions_20250602_220302.json"
+NO_CONTEXT_PATH = "data/processed/testset_with_predictions_no_context20250603_193545.json"
+OUTPUT_PATH = "data/processed/merged_predictions_with_no_context.json"
 
-# Erstelle ein Dictionary mit image_id als Schlüssel für die no_context-Datei
-no_context_dict = {entry["image_id"]: entry for entry in no_context}
 
-# Füge die _no_context-Felder hinzu
-for entry in with_context:
-    image_id = entry["image_id"]
-    if image_id in no_context_dict:
-        no_entry = no_context_dict[image_id]
-        entry["generated_baseline_no_context"] = no_entry.get("generated_baseline", "")
-        entry["generated_finetuned_no_context"] = no_entry.get("generated_finetuned", "")
+def merge(with_context_path, no_context_path):
+    """
+    Streamt die Einträge mit Kontext und ergänzt die _no_context-Felder. Von der
+    no_context-Datei werden nur die beiden Vorhersagen pro image_id gehalten.
+    """
+    no_context = {
+        entry["image_id"]: (entry.get("generated_baseline", ""), entry.get("generated_finetuned", ""))
+        for entry in iter_json(no_context_path)
+    }
+    for entry in iter_json(with_context_path):
+        if entry["image_id"] in no_context:
+            baseline, finetuned = no_context[entry["image_id"]]
+            entry["generated_baseline_no_context"] = baseline
+            entry["generated_finetuned_no_context"] = finetuned
+        yield entry
 
-# Speichere die zusammengeführte Datei
-output_path = "data/processed/merged_predictions_with_no_context.json"
-with open(output_path, "w") as f_out:
-    for entry in with_context:
-        f_out.write(json.dumps(entry) + "\n")
 
-output_path
+def main():
+    parser = argparse.ArgumentParser(description="Führt Vorhersagen mit und ohne Kontext zusammen.")
+    parser.add_argument("--tee", action="store_true",
+                        help="Jeden Eintrag zusätzlich auf stdout schreiben (Streaming an vlm_judge.py --input -)")
+    args = parser.parse_args()
+    log = sys.stderr if args.tee else sys.stdout
+
+    # Zeilenweise in eine temporäre Datei schreiben und erst am Ende ersetzen
+    tmp_path = OUTPUT_PATH + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f_out:
+        for entry in merge(WITH_CONTEXT_PATH, NO_CONTEXT_PATH):
+            line = json.dumps(entry) + "\n"
+            f_out.write(line)
+            if args.tee:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            count += 1
+    os.replace(tmp_path, OUTPUT_PATH)
+    print(f"✅ {count} Einträge zusammengeführt: {OUTPUT_PATH}", file=log)
+
+
+if __name__ == "__main__":
+    main()
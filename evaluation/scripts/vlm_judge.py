@@ -1,10 +1,19 @@
+import argparse
 import json
 import os
+import sys
 import logging
 from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
 from dotenv import load_dotenv
-from datasets import load_dataset
+from judge_parsing import RESPONSE_FORMAT, parse_judgement, validate_judgement
+from judge_proxy import MODEL_PATH as PROXY_MODEL_PATH, load_proxy, prescreen
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.json_stream import iter_json  # noqa: E402
+from common.openai_client import MAX_CONCURRENCY, RateLimitedClient, imap_bounded  # noqa: E402
+from common.prompt_prefix import item_messages  # noqa: E402
+from common.telemetry import Telemetry, format_summary  # noqa: E402
 
 # --------------------------------------------------------------------
 # Setup & Konfiguration
@@ -14,8 +23,21 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INPUT_PATH = "data/processed/merged_predictions_with_no_context.json"
 OUTPUT_PATH = "data/processed/full_sampled_with_judging.json"
 LOG_PATH = f'logs/judging_pipeline_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+DEAD_LETTER_PATH = f'logs/dead_letter_judging_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jsonl'
+# Lokaler Proxy (judge_proxy.py) bewertet eindeutige Fälle vorab; nur unsichere gehen an GPT-4o-mini.
+# Standardmäßig aus (USE_JUDGE_PROXY=1 schaltet ihn ein): out-of-fold erreicht der Proxy für
+# vier Kriterien keine verlässliche Übereinstimmung (siehe results/judge_proxy/threshold_calibration.csv),
+# die Ersparnis liegt bei Cent-Beträgen pro Lauf.
+USE_JUDGE_PROXY = os.getenv("USE_JUDGE_PROXY", "0") == "1"
+# JSON-Schema-Structured-Output; die Antwort wird trotzdem tolerant geparst und validiert
+USE_STRUCTURED_OUTPUT = True
+JUDGE_MAX_TOKENS = 200
+# Nur ungültige Antworten werden erneut angefragt, dann mit mehr Platz für die Begründung
+JUDGE_RETRY_MAX_TOKENS = 320
+JUDGE_PARSE_ATTEMPTS = 2
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+telemetry = Telemetry(script="vlm_judge")
+client = RateLimitedClient.with_api_key(OPENAI_API_KEY, DEAD_LETTER_PATH, telemetry=telemetry)
 
 # Modelle und ihre Feldnamen
 variants = {
@@ -35,118 +57,170 @@ def setup_logging():
         ]
     )
 
-def load_data(path):
-    dataset = load_dataset("json", data_files=path, split="train")
-    # Convert Dataset to list of dictionaries
-    return [dict(item) for item in dataset]
+# System-Prompt mit harten Regeln + JSON-Schema. Byte-identisch und vor jedem item-spezifischen
+# Inhalt, damit der Provider den Prefix cachen kann; die Schluss-Anweisung gehört deshalb ebenfalls hierher.
+JUDGE_SYSTEM_PROMPT = (
+    "You are an accessibility auditor for news-image alt texts.\n"
+    "Rate each criterion on a 1–5 Likert scale (1 = poor, 5 = excellent).\n"
+    "Anchors: 1 = fails, 3 = partly meets, 5 = fully meets.\n\n"
+    "Criteria:\n"
+    "1. visibility_principle – describe only what is directly visible OR "
+    "explicitly named in caption/headline. Penalise:\n"
+    "   • speculative emotions/intentions (e.g. 'angry', 'celebrates')\n"
+    "   • unseen events (future, past, off-screen)\n"
+    "   • context facts that are not visually verifiable (e.g. exact location if no sign)\n"
+    "2. context_relevance – context must clarify or disambiguate a visible element; "
+    "irrelevant context = 1.\n"
+    "3. entity_naming – reward correct, context-supported names; "
+    "wrong or omitted key entity = 1.\n"
+    "4. informativeness – concise, image-specific; generic = 1.\n"
+    "5. redundancy_avoidance – no >30 % verbatim copy of caption/headline\n"
+    "6. style_readability – clear grammar; awkward/unreadable = 1.\n\n"
+    "Return ONLY valid JSON (nothing else):\n"
+    "{"
+    "\"visibility_principle\":<1-5>,"
+    "\"context_relevance\":<1-5>,"
+    "\"entity_naming\":<1-5>,"
+    "\"informativeness\":<1-5>,"
+    "\"redundancy_avoidance\":<1-5>,"
+    "\"style_readability\":<1-5>,"
+    "\"total\":<1-5>,"
+    "\"justification\":\"<max 2 sentences>\""
+    "}\n\n"
+    "IMPORTANT: Deduct points for any interpretation, emotion, symbolism or "
+    "context fact that cannot be visually confirmed."
+)
 
-def save_data(data, path):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
 def judge_alt_text(entry, variant_key, variant_label):
     alt_text = entry.get(variant_key)
     if not alt_text:
         return None
 
-    # 1. System-Prompt  ─ mit harten Regeln + JSON-Schema
-    system_content = (
-        "You are an accessibility auditor for news-image alt texts.\n"
-        "Rate each criterion on a 1–5 Likert scale (1 = poor, 5 = excellent).\n"
-        "Anchors: 1 = fails, 3 = partly meets, 5 = fully meets.\n\n"
-        "Criteria:\n"
-        "1. visibility_principle – describe only what is directly visible OR "
-        "explicitly named in caption/headline. Penalise:\n"
-        "   • speculative emotions/intentions (e.g. 'angry', 'celebrates')\n"
-        "   • unseen events (future, past, off-screen)\n"
-        "   • context facts that are not visually verifiable (e.g. exact location if no sign)\n"
-        "2. context_relevance – context must clarify or disambiguate a visible element; "
-        "irrelevant context = 1.\n"
-        "3. entity_naming – reward correct, context-supported names; "
-        "wrong or omitted key entity = 1.\n"
-        "4. informativeness – concise, image-specific; generic = 1.\n"
-        "5. redundancy_avoidance – no >30 % verbatim copy of caption/headline\n"
-        "6. style_readability – clear grammar; awkward/unreadable = 1.\n\n"
-        "Return ONLY valid JSON (nothing else):\n"
-        "{"
-        "\"visibility_principle\":<1-5>,"
-        "\"context_relevance\":<1-5>,"
-        "\"entity_naming\":<1-5>,"
-        "\"informativeness\":<1-5>,"
-        "\"redundancy_avoidance\":<1-5>,"
-        "\"style_readability\":<1-5>,"
-        "\"total\":<1-5>,"
-        "\"justification\":\"<max 2 sentences>\""
-        "}"
+    # User-Nachricht: Kontext + Alt-Text, Bild zuletzt
+    messages = item_messages(
+        JUDGE_SYSTEM_PROMPT,
+        (
+            f"Headline: {entry['headline']}\n"
+            f"Abstract: {entry['abstract']}\n"
+            f"Caption: {entry['caption']}\n\n"
+            f"Alt-Text candidate:\n{alt_text}"
+        ),
+        entry["image_url_clean"],
     )
 
-    # 2. User-Nachricht (Bild + Kontext + Alt-Text)
-    user_content = [
-        {
-            "type": "image_url",
-            "image_url": {"url": entry["image_url_clean"], "detail": "low"}
-        },
-        {
-            "type": "text",
-            "text": (
-                f"Headline: {entry['headline']}\n"
-                f"Abstract: {entry['abstract']}\n"
-                f"Caption: {entry['caption']}\n\n"
-                f"Alt-Text candidate:\n{alt_text}\n\n"
-                "IMPORTANT: Deduct points for any interpretation, emotion, symbolism or "
-                "context fact that cannot be visually confirmed."
-            )
-        }
-    ]
+    request = {"model": "gpt-4o-mini", "messages": messages, "temperature": 0.0}
+    if USE_STRUCTURED_OUTPUT:
+        request["response_format"] = RESPONSE_FORMAT
 
+    # Rate-Limits, Retries und Dead-Letter übernimmt der Client; None = endgültig fehlgeschlagen
+    for attempt in range(JUDGE_PARSE_ATTEMPTS):
+        response = client.chat(
+            item_id=f"{entry.get('image_id')}:{variant_key}",
+            stage="judging" if attempt == 0 else "judging_retry",
+            max_tokens=JUDGE_MAX_TOKENS if attempt == 0 else JUDGE_RETRY_MAX_TOKENS,
+            **request
+        )
+        if response is None:
+            return None
+        result, status = parse_judgement(response.choices[0].message.content)
+        if result is not None:
+            if status == "repaired":
+                logging.info(f"Repaired judge response for {entry.get('image_id')} variant {variant_label}")
+            return result
+        logging.warning(f"Invalid judge response for {entry.get('image_id')} variant {variant_label} "
+                        f"({status}), attempt {attempt + 1}/{JUDGE_PARSE_ATTEMPTS}")
+    return None
 
-    messages = [
-        {"role": "system", "content": system_content},
-        {"role": "user", "content": user_content}
-    ]
+def judge_entry(entry, proxy, previous=None):
+    """
+    Bewertet alle Varianten eines Eintrags; gibt (Ergebnis, Zähler) zurück. Gültige
+    Bewertungen aus `previous` (--only-missing) werden übernommen statt neu bezahlt.
+    """
+    result_entry = entry.copy()
+    counts = {"proxy": 0, "judge": 0, "reused": 0, "failed": 0}
+    for key, label in variants.items():
+        kept = (previous or {}).get(f"judging_{key}")
+        if kept is not None and validate_judgement(kept)[0] is not None:
+            result_entry[f"judging_{key}"] = kept
+            counts["reused"] += 1
+            continue
+        result = prescreen(proxy, entry, key) if proxy and entry.get(key) else None
+        if result:
+            counts["proxy"] += 1
+        else:
+            result = judge_alt_text(entry, key, label)
+            counts["judge"] += 1
+            counts["failed"] += result is None and bool(entry.get(key))
+        result_entry[f"judging_{key}"] = result
+        logging.info(f"{entry.get('image_id')} → {label}: {result['entity_naming'] if result else 'Failed'}")
+    return result_entry, counts
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=200,
-            temperature=0.0
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        logging.error(f"Evaluation failed for {entry.get('image_id')} variant {variant_label}: {e}")
-        return None
+def judge_failed(entry, error):
+    """Unerwarteter Fehler in judge_entry: Eintrag ohne Bewertung weiterreichen (→ --only-missing)."""
+    client.dead_letter(entry.get("image_id"), "judge_entry", error, {"image_id": entry.get("image_id")})
+    return entry.copy(), {"failed": sum(bool(entry.get(key)) for key in variants)}
 
 def main():
+    parser = argparse.ArgumentParser(description="Bewertet Alt-Text-Varianten mit GPT-4o-mini.")
+    parser.add_argument("--input", default=INPUT_PATH, help='Eingabedatei oder "-" für stdin')
+    parser.add_argument("--only-missing", action="store_true",
+                        help="Gültige Bewertungen aus OUTPUT_PATH übernehmen, nur fehlende/ungültige neu anfragen")
+    args = parser.parse_args()
+
     setup_logging()
     try:
-        data = load_data(INPUT_PATH)
-        logging.info(f"Loaded {len(data)} entries for judging.")
-
-        results = []
-        for i, entry in enumerate(data, 1):
-            if not isinstance(entry, dict):
-                logging.warning(f"Skipping entry {i}: not a dictionary")
-                continue
-                
-            image_id = entry.get("image_id")
-            logging.info(f"[{i}/{len(data)}] Judging entry {image_id}")
-            
-            # Create a new dictionary for results
-            result_entry = entry.copy()
-            for key, label in variants.items():
-                result = judge_alt_text(entry, key, label)
-                result_entry[f"judging_{key}"] = result
-                logging.info(f" → {label}: {result['entity_naming'] if result else 'Failed'}")
-            
-            results.append(result_entry)
-            
-            # Periodisches Speichern
-            if i % 25 == 0:
-                save_data(results, OUTPUT_PATH)
-                logging.info(f"[{i}] Progress saved.")
-        
-        save_data(results, OUTPUT_PATH)
+        logging.info(f"Streaming entries for judging from {'stdin' if args.input == '-' else args.input}.")
+
+        proxy = None
+        if USE_JUDGE_PROXY and os.path.exists(PROXY_MODEL_PATH):
+            proxy = load_proxy(PROXY_MODEL_PATH)
+            logging.info(f"Judge proxy loaded from {PROXY_MODEL_PATH} (thresholds {proxy['thresholds']}).")
+        totals = {"proxy": 0, "judge": 0, "reused": 0, "failed": 0}
+
+        previous = {}
+        if args.only_missing and os.path.exists(OUTPUT_PATH):
+            previous = {e.get("image_id"): e for e in iter_json(OUTPUT_PATH)}
+            logging.info(f"Loaded {len(previous)} previously judged entries from {OUTPUT_PATH}.")
+
+        entries = (entry for entry in iter_json(args.input) if isinstance(entry, dict))
+
+        # Einträge parallel bewerten (Reihenfolge bleibt erhalten); Ergebnisse zeilenweise (JSONL)
+        # in eine temporäre Datei schreiben und OUTPUT_PATH erst am Ende ersetzen, damit ein
+        # Abbruch die bisherigen Bewertungen (Quelle für --only-missing) nicht verliert
+        os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+        tmp_path = OUTPUT_PATH + ".tmp"
+        written = 0
+        with open(tmp_path, "w", encoding="utf-8") as f_out:
+            results = imap_bounded(
+                lambda entry: judge_entry(entry, proxy, previous.get(entry.get("image_id"))),
+                entries, max_workers=MAX_CONCURRENCY, on_error=judge_failed,
+            )
+            for result_entry, counts in results:
+                for key, value in counts.items():
+                    totals[key] += value
+                f_out.write(json.dumps(result_entry, ensure_ascii=False) + "\n")
+                f_out.flush()
+                written += 1
+                if written % 25 == 0:
+                    logging.info(f"[{written}] entries judged")
+        os.replace(tmp_path, OUTPUT_PATH)
+
+        logging.info(f"{written} entries judged.")
+        if proxy:
+            total = totals["proxy"] + totals["judge"]
+            logging.info(f"Judge proxy scored {totals['proxy']}/{total} candidates locally; {totals['judge']} paid judge calls.")
+        if previous:
+            logging.info(f"Reused {totals['reused']} valid judgements; re-requested {totals['judge']}.")
+        if totals["failed"]:
+            logging.warning(f"{totals['failed']} candidates without a valid judgement; "
+                            "rerun with --only-missing to re-request only these.")
+        summary = client.summary()
+        logging.info(f"API calls: {summary['calls']}, retries: {summary['retries']}, "
+                     f"429: {summary['throttled']}, dead letters: {summary['dead_letters']}")
+        if summary["dead_letters"]:
+            logging.warning(f"{summary['dead_letters']} judge calls failed permanently, see {DEAD_LETTER_PATH}")
+        logging.info(f"Telemetry (run {telemetry.run_id}, {telemetry.db_path}):\n{format_summary(telemetry.close())}")
         logging.info(f"Judging completed. Results saved to {OUTPUT_PATH}")
     
     except Exception as e:
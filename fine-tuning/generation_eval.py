@@ -0,0 +1,222 @@
+"""
+Generierungs-Eval während des Trainings (ersetzt BLEUCallback im Notebook):
+
+- fester Validierungs-Ausschnitt, Prompts nur aus system + user
+  (`messages[:2]`, `add_generation_prompt=True`) – die Referenz landet nicht im Prompt
+- Bilder und Tokenisierung einmalig vorverarbeitet und als Batches (CPU) gecacht
+- Batch-Generierung mit linkem Padding über das Modell des Trainers
+- BLEU (wie nltk sentence_bleu + SmoothingFunction().method1), ROUGE-L und
+  Längenkennzahlen, über NumPy für alle Samples auf einmal
+
+    eval_cb = GenerationEvalCallback(processor, val_ds, load_image=load_image_from_example,
+                                     loggers=[local_metrics.log_metrics])
+    trainer = SFTTrainer(..., callbacks=[local_metrics, eval_cb])
+
+Die Metrikfunktionen brauchen kein torch:
+
+    python fine-tuning/generation_eval.py predictions.jsonl   # {"prediction": ..., "reference": ...} pro Zeile
+"""
+import argparse
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from transformers import TrainerCallback
+except ImportError:      # Metriken/CLI laufen auch ohne transformers
+    TrainerCallback = object
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.alt_text_checks import MAX_ALT_TEXT_LENGTH  # noqa: E402
+from common.json_stream import iter_json  # noqa: E402
+
+BLEU_MAX_N = 4
+BLEU_EPSILON = 0.1          # method1: Präzision ohne Treffer → epsilon / Anzahl n-Gramme
+
+
+# --------------------------------------------------------------------
+# Metriken
+# --------------------------------------------------------------------
+def ngram_counts(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def bleu_scores(preds, refs, max_n=BLEU_MAX_N):
+    """Satz-BLEU pro Paar (Whitespace-Tokens, eine Referenz), Formel vektorisiert über alle Paare."""
+    hyps = [p.split() for p in preds]
+    ref_tokens = [r.split() for r in refs]
+    matches = np.zeros((len(hyps), max_n))
+    totals = np.zeros((len(hyps), max_n))
+    for i, (h, r) in enumerate(zip(hyps, ref_tokens)):
+        for n in range(1, max_n + 1):
+            hc, rc = ngram_counts(h, n), ngram_counts(r, n)
+            matches[i, n - 1] = sum(min(c, rc[g]) for g, c in hc.items())
+            totals[i, n - 1] = max(1, len(h) - n + 1)
+    hyp_len = np.array([len(h) for h in hyps], dtype=float)
+    ref_len = np.array([len(r) for r in ref_tokens], dtype=float)
+
+    precision = np.where(matches > 0, matches, BLEU_EPSILON) / totals
+    with np.errstate(divide="ignore"):
+        log_bp = np.where(hyp_len > ref_len, 0.0, 1 - ref_len / np.maximum(hyp_len, 1))
+    scores = np.exp(log_bp + np.log(precision).mean(axis=1))
+    # wie nltk: ohne Unigramm-Treffer (oder leere Vorhersage) ist BLEU 0
+    return np.where((matches[:, 0] > 0) & (hyp_len > 0), scores, 0.0)
+
+
+def lcs_length(a, b):
+    """LCS-Länge; eine DP-Zeile pro Token aus a, die Zeile selbst per NumPy (kumulatives Maximum)."""
+    if not a or not b:
+        return 0
+    b = np.array(b, dtype=object)
+    prev = np.zeros(len(b) + 1, dtype=int)
+    for token in a:
+        match = np.concatenate([[False], b == token])
+        diagonal = np.concatenate([[0], prev[:-1] + 1])
+        prev = np.maximum.accumulate(np.maximum(prev, np.where(match, diagonal, 0)))
+    return int(prev[-1])
+
+
+def rouge_tokens(text):
+    """Tokenisierung wie rouge_score: klein, alles außer a-z/0-9 trennt."""
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+
+
+def rouge_l_scores(preds, refs):
+    """ROUGE-L F1 pro Paar."""
+    hyps = [rouge_tokens(p) for p in preds]
+    ref_tokens = [rouge_tokens(r) for r in refs]
+    lcs = np.array([lcs_length(h, r) for h, r in zip(hyps, ref_tokens)], dtype=float)
+    hyp_len = np.array([len(h) for h in hyps], dtype=float)
+    ref_len = np.array([len(r) for r in ref_tokens], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(hyp_len > 0, lcs / hyp_len, 0.0)
+        recall = np.where(ref_len > 0, lcs / ref_len, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return f1
+
+
+def generation_metrics(preds, refs, prefix="eval/gen_"):
+    preds = [p or "" for p in preds]
+    refs = [r or "" for r in refs]
+    pred_len = np.array([len(p.strip()) for p in preds], dtype=float)
+    ref_len = np.array([len(r.strip()) for r in refs], dtype=float)
+    return {
+        f"{prefix}bleu": float(bleu_scores(preds, refs).mean()),
+        f"{prefix}rouge_l": float(rouge_l_scores(preds, refs).mean()),
+        f"{prefix}mean_length": float(pred_len.mean()),
+        f"{prefix}median_length": float(np.median(pred_len)),
+        f"{prefix}length_ratio": float((pred_len / np.maximum(ref_len, 1)).mean()),
+        f"{prefix}too_long_share": float((pred_len > MAX_ALT_TEXT_LENGTH).mean()),
+        f"{prefix}empty_share": float((pred_len == 0).mean()),
+    }
+
+
+# --------------------------------------------------------------------
+# Callback
+# --------------------------------------------------------------------
+class GenerationEvalCallback(TrainerCallback):
+    """Batch-Generierung auf einem festen, vorverarbeiteten Val-Ausschnitt bei jedem Evaluate."""
+
+    def __init__(self, processor, val_ds, num_samples=32, batch_size=8, max_new_tokens=64,
+                 load_image=None, loggers=()):
+        self.processor = processor
+        self.examples = list(val_ds[:num_samples])
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.load_image = load_image
+        self.loggers = list(loggers)
+        self.batches = None
+        self.references = [ex["messages"][2]["content"][0]["text"] for ex in self.examples]
+        self.last_predictions = []
+
+    def _images(self, ex):
+        if self.load_image is not None:
+            return [self.load_image(ex)]
+        from qwen_vl_utils import process_vision_info
+        images, _ = process_vision_info(ex["messages"][:2])
+        return images
+
+    def prepare(self):
+        """Einmalig: Prompts ohne Antwort, Bilder laden, mit linkem Padding tokenisieren."""
+        tokenizer = self.processor.tokenizer
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"      # generierte Tokens schließen direkt an den Prompt an
+        try:
+            loaded = [(ex, self._images(ex)) for ex in self.examples]
+            loaded = [(ex, imgs) for ex, imgs in loaded if imgs and all(img is not None for img in imgs)]
+            if len(loaded) < len(self.examples):
+                print(f"[GenerationEval] {len(self.examples) - len(loaded)} Samples ohne ladbares Bild übersprungen")
+            self.examples = [ex for ex, _ in loaded]
+            self.references = [ex["messages"][2]["content"][0]["text"] for ex in self.examples]
+            self.batches = []
+            for start in range(0, len(loaded), self.batch_size):
+                chunk = loaded[start:start + self.batch_size]
+                prompts = [
+                    self.processor.apply_chat_template(ex["messages"][:2], tokenize=False, add_generation_prompt=True)
+                    for ex, _ in chunk
+                ]
+                images = [img for _, imgs in chunk for img in imgs]
+                # keine Trunkierung: sie würde Bild-Tokens oder den Generation-Prompt abschneiden
+                self.batches.append(self.processor(text=prompts, images=images, padding=True, return_tensors="pt"))
+        finally:
+            tokenizer.padding_side = padding_side
+
+    def generate(self, model):
+        import torch
+
+        if self.batches is None:
+            self.prepare()
+        tokenizer = self.processor.tokenizer
+        was_training = model.training
+        model.eval()
+        preds = []
+        try:
+            with torch.inference_mode():
+                for batch in self.batches:
+                    inputs = batch.to(model.device)
+                    output = model.generate(
+                        **inputs,
+                        max_new_tokens=self.max_new_tokens,
+                        do_sample=False,
+                        use_cache=True,      # im Training ist use_cache wegen Gradient Checkpointing aus
+                        pad_token_id=tokenizer.pad_token_id,
+                    )
+                    preds += tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        finally:
+            if was_training:
+                model.train()
+        return [p.strip() for p in preds]
+
+    def on_evaluate(self, args, state, control, model=None, **kwargs):
+        t0 = time.perf_counter()
+        self.last_predictions = self.generate(model)
+        metrics = generation_metrics(self.last_predictions, self.references)
+        metrics["eval/gen_seconds"] = time.perf_counter() - t0
+        for log in self.loggers:
+            log(state.global_step, metrics)
+        print(f"\n[GenerationEval] Step {state.global_step}, {len(self.references)} Samples in "
+              f"{metrics['eval/gen_seconds']:.1f}s: BLEU {metrics['eval/gen_bleu']:.4f}, "
+              f"ROUGE-L {metrics['eval/gen_rouge_l']:.4f}, Ø Länge {metrics['eval/gen_mean_length']:.0f} Zeichen\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BLEU, ROUGE-L und Längenkennzahlen für gespeicherte Vorhersagen.")
+    parser.add_argument("path", help="JSONL oder JSON-Array mit den Feldern prediction und reference")
+    parser.add_argument("--pred-key", default="prediction")
+    parser.add_argument("--ref-key", default="reference")
+    args = parser.parse_args()
+
+    rows = list(iter_json(args.path))
+    t0 = time.perf_counter()
+    metrics = generation_metrics([r.get(args.pred_key) for r in rows], [r.get(args.ref_key) for r in rows], prefix="")
+    print(f"📊 {len(rows)} Paare in {time.perf_counter() - t0:.2f}s")
+    for key, value in metrics.items():
+        print(f"  {key:<16} {value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
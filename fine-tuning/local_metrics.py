@@ -0,0 +1,298 @@
+"""
+Lokale Trainingsmetriken ohne W&B: ein TrainerCallback schreibt pro
+Optimizer-Step Step-Zeit, Samples/s, Tokens/s, Padding-Anteil, Wartezeit auf
+den Collator (Bilder laden + Tokenisierung) und Speicher in eine SQLite-DB,
+dazu alle Trainer-Logs (Loss, LR, Eval-Metriken). Der Report liest die DB und
+zeigt, ob das Training an der Input-Pipeline hängt.
+
+Im Notebook:
+
+    collator = CollatorStats(collate_fn)
+    trainer = SFTTrainer(..., data_collator=collator,
+                         callbacks=[LocalMetricsCallback(collator, run_name=RUN_NAME, db_path=...)])
+
+Auswertung (auch ohne torch/transformers):
+
+    python fine-tuning/local_metrics.py logs/train_metrics.db              # letzter Lauf
+    python fine-tuning/local_metrics.py logs/train_metrics.db --watch 30   # live mitlesen
+
+Die Collator-Zeiten werden nur im Hauptprozess erfasst, d.h. mit
+dataloader_num_workers=0 (Default im Notebook); dann ist die Collator-Zeit
+genau die Zeit, in der die GPU auf Daten wartet.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    from transformers import TrainerCallback
+except ImportError:      # Report-CLI läuft auch ohne transformers
+    TrainerCallback = object
+
+METRICS_DB = os.getenv("TRAIN_METRICS_DB", "logs/train_metrics.db")
+DATA_BOUND_SHARE = 0.3      # ab diesem Anteil Wartezeit an der Step-Zeit gilt die Input-Pipeline als Engpass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_name TEXT,
+    started_at TEXT,
+    config TEXT                 -- JSON der TrainingArguments (Auszug)
+);
+CREATE TABLE IF NOT EXISTS train_steps (
+    run_id TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    epoch REAL,
+    step_time_s REAL,           -- Ende Step n-1 bis Ende Step n (inkl. Datenwartezeit)
+    data_wait_s REAL,           -- Zeit im Collator für die Batches dieses Steps
+    samples INTEGER,
+    tokens INTEGER,             -- echte Tokens (attention_mask)
+    label_tokens INTEGER,       -- Tokens mit Loss (labels != -100)
+    padded_tokens INTEGER,      -- Tokens inkl. Padding
+    samples_per_s REAL,
+    tokens_per_s REAL,
+    padding_ratio REAL,
+    memory_gb REAL,             -- GPU: max. belegt seit letztem Step, sonst max. RSS des Prozesses
+    logged_at TEXT,
+    PRIMARY KEY (run_id, step)
+);
+CREATE TABLE IF NOT EXISTS train_logs (
+    run_id TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    key TEXT NOT NULL,          -- loss, learning_rate, grad_norm, eval_loss, eval/bleu_score, …
+    value REAL,
+    logged_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_train_logs_run ON train_logs(run_id, key, step);
+"""
+
+CONFIG_KEYS = [
+    "per_device_train_batch_size", "gradient_accumulation_steps", "learning_rate", "num_train_epochs",
+    "max_seq_length", "gradient_checkpointing", "optim", "dataloader_num_workers", "bf16", "fp16",
+]
+
+
+def memory_gb():
+    """Peak-GPU-Speicher seit dem letzten Aufruf, ohne CUDA der maximale RSS des Prozesses."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            peak = torch.cuda.max_memory_allocated() / 1024 ** 3
+            torch.cuda.reset_peak_memory_stats()
+            return peak
+    except ImportError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # KB unter Linux, Bytes unter macOS
+    return rss / 1024 ** (3 if sys.platform == "darwin" else 2)
+
+
+class CollatorStats:
+    """
+    Wrapper um einen data_collator: misst die Zeit pro Batch und zählt Samples,
+    echte, gelabelte und gepaddete Tokens. Der Callback holt die Summen pro Step ab.
+    """
+
+    def __init__(self, collate_fn):
+        self.collate_fn = collate_fn
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.totals = {"batches": 0, "samples": 0, "tokens": 0, "label_tokens": 0, "padded_tokens": 0, "wait_s": 0.0}
+
+    def __call__(self, examples):
+        t0 = time.perf_counter()
+        batch = self.collate_fn(examples)
+        elapsed = time.perf_counter() - t0
+        mask = batch.get("attention_mask")
+        labels = batch.get("labels")
+        with self.lock:
+            self.totals["batches"] += 1
+            self.totals["samples"] += len(examples)
+            self.totals["wait_s"] += elapsed
+            if mask is not None:
+                self.totals["tokens"] += int(mask.sum())
+                self.totals["padded_tokens"] += int(mask.shape[0] * mask.shape[1])
+            if labels is not None:
+                self.totals["label_tokens"] += int((labels != -100).sum())
+        return batch
+
+    def drain(self):
+        with self.lock:
+            totals = self.totals
+            self.reset()
+        return totals
+
+
+class LocalMetricsCallback(TrainerCallback):
+    """Schreibt Durchsatz-, Speicher- und Log-Metriken pro Optimizer-Step in SQLite."""
+
+    def __init__(self, collator_stats=None, run_name=None, db_path=METRICS_DB, commit_every=10):
+        self.collator_stats = collator_stats
+        self.run_name = run_name
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.commit_every = commit_every
+        self.pending = 0
+        self.last_step_end = None
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")     # Report kann während des Trainings mitlesen
+        self.conn.executescript(SCHEMA)
+
+    def _commit(self, force=False):
+        self.pending += 1
+        if force or self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        config = {k: getattr(args, k, None) for k in CONFIG_KEYS}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, run_name, started_at, config) VALUES (?, ?, ?, ?)",
+            (self.run_id, self.run_name or getattr(args, "run_name", None),
+             datetime.now().isoformat(timespec="seconds"), json.dumps(config, default=str)),
+        )
+        self.conn.commit()
+        if self.collator_stats is not None:
+            self.collator_stats.drain()      # Batches aus der Eval vor dem Training nicht mitzählen
+        memory_gb()
+        self.last_step_end = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        step_time = now - self.last_step_end if self.last_step_end is not None else None
+        self.last_step_end = now
+        data = self.collator_stats.drain() if self.collator_stats is not None else {}
+        samples, tokens = data.get("samples"), data.get("tokens")
+        padded = data.get("padded_tokens")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO train_steps (run_id, step, epoch, step_time_s, data_wait_s, samples, tokens, "
+            "label_tokens, padded_tokens, samples_per_s, tokens_per_s, padding_ratio, memory_gb, logged_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.run_id, state.global_step, state.epoch, step_time, data.get("wait_s"), samples, tokens,
+                data.get("label_tokens"), padded,
+                samples / step_time if samples and step_time else None,
+                tokens / step_time if tokens and step_time else None,
+                1 - tokens / padded if padded else None,
+                memory_gb(), datetime.now().isoformat(timespec="seconds"),
+            ),
+        )
+        self._commit()
+
+    def log_metrics(self, step, metrics):
+        """Auch für eigene Callbacks (z.B. BLEU), die nicht über trainer.log gehen."""
+        stamp = datetime.now().isoformat(timespec="seconds")
+        rows = [(self.run_id, step, k, float(v), stamp) for k, v in metrics.items()
+                if isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)]
+        self.conn.executemany("INSERT INTO train_logs (run_id, step, key, value, logged_at) VALUES (?, ?, ?, ?, ?)", rows)
+        self._commit(force=True)
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs:
+            self.log_metrics(state.global_step, logs)
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Eval-Batches laufen ebenfalls durch den Collator und zählen nicht zum nächsten Trainingsschritt
+        if self.collator_stats is not None:
+            self.collator_stats.drain()
+        self.last_step_end = time.perf_counter()
+
+    def on_save(self, args, state, control, **kwargs):
+        self.last_step_end = time.perf_counter()     # Checkpoint-Zeit nicht dem nächsten Step anrechnen
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.conn.commit()
+
+# --------------------------------------------------------------------
+# Auswertung
+# --------------------------------------------------------------------
+def median(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def run_report(conn, run_id, last=10):
+    """Textreport eines Laufs: Durchsatz, Engpass-Hinweis, letzte Steps, letzte Logwerte."""
+    def fmt(value, spec):
+        return "–" if value is None else format(value, spec)
+
+    name, started_at, config = conn.execute(
+        "SELECT run_name, started_at, config FROM runs WHERE run_id = ?", (run_id,)
+    ).fetchone() or (None, None, "{}")
+    steps = conn.execute(
+        "SELECT step, epoch, step_time_s, data_wait_s, samples_per_s, tokens_per_s, padding_ratio, memory_gb "
+        "FROM train_steps WHERE run_id = ? ORDER BY step",
+        (run_id,),
+    ).fetchall()
+    lines = [f"## {run_id} ({name}, Start {started_at})", f"Config: {config}"]
+    if not steps:
+        return "\n".join(lines + ["Noch keine Steps geloggt."])
+
+    cols = list(zip(*steps))
+    step_time, wait = median(cols[2]), median(cols[3])
+    wait_share = wait / step_time if wait is not None and step_time else None
+    lines += [
+        f"Steps: {len(steps)} (zuletzt {steps[-1][0]}, Epoche {fmt(steps[-1][1], '.2f')})",
+        f"Step-Zeit Median: {fmt(step_time, '.2f')} s · Samples/s: {fmt(median(cols[4]), '.2f')} · "
+        f"Tokens/s: {fmt(median(cols[5]), ',.0f')}",
+        f"Padding-Anteil Median: {fmt(median(cols[6]), '.1%')} · Datenwartezeit Median: {fmt(wait, '.2f')} s "
+        f"({fmt(wait_share, '.0%')} der Step-Zeit) · Peak-Speicher: {fmt(max(v for v in cols[7] if v is not None), '.2f')} GB",
+    ]
+    if wait_share is not None and wait_share >= DATA_BOUND_SHARE:
+        lines.append("⚠️ Input-Pipeline ist der Engpass (Bilder laden/Collator) – lokale Bilder, "
+                     "Prefetch oder dataloader_num_workers prüfen")
+
+    lines.append(f"\n{'Step':>6} {'Epoche':>7} {'Step s':>7} {'Warte s':>8} {'Samples/s':>9} {'Tokens/s':>9} "
+                 f"{'Padding':>8} {'Speicher GB':>11}")
+    for step, epoch, st, dw, sps, tps, pad, mem in steps[-last:]:
+        lines.append(f"{step:>6} {fmt(epoch, '.2f'):>7} {fmt(st, '.2f'):>7} {fmt(dw, '.2f'):>8} {fmt(sps, '.2f'):>9} "
+                     f"{fmt(tps, ',.0f'):>9} {fmt(pad, '.1%'):>8} {fmt(mem, '.2f'):>11}")
+
+    latest = conn.execute(
+        "SELECT key, step, value FROM train_logs WHERE run_id = ? AND rowid IN ("
+        "  SELECT MAX(rowid) FROM train_logs WHERE run_id = ? GROUP BY key"
+        ") ORDER BY key",
+        (run_id, run_id),
+    ).fetchall()
+    if latest:
+        lines.append("\nLetzte Logwerte:")
+        lines += [f"  {key:<28} {value:>12.5g}  (Step {step})" for key, step, value in latest]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report der lokalen Trainingsmetriken.")
+    parser.add_argument("db", nargs="?", default=METRICS_DB)
+    parser.add_argument("--run", default=None, help="run_id (Default: letzter Lauf)")
+    parser.add_argument("--last", type=int, default=10, help="Anzahl der angezeigten Steps")
+    parser.add_argument("--watch", type=float, default=None, help="Report alle N Sekunden neu ausgeben")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    while True:
+        run_id = args.run or (conn.execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1").fetchone() or [None])[0]
+        if run_id is None:
+            print("Keine Läufe in der DB.")
+        else:
+            if args.watch:
+                print("\033[2J\033[H", end="")      # Terminal leeren
+            print(run_report(conn, run_id, args.last))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Sweep über Bild-Pixelbudgets (MIN_PIXELS / MAX_PIXELS) auf dem Inferenzpfad der
+Notebooks: fester Test-Ausschnitt, pro Budget Bild-Tokens, Sequenzlänge,
+Prefill- und Generierungs-Latenz, Peak-Speicher und die lokalen
+Qualitätsmetriken (BLEU, ROUGE-L, Längen, Lint), am Ende eine Pareto-Tabelle
+(Kosten = Prefill-Latenz, Qualität = ROUGE-L).
+
+Das Training nutzt MAX_PIXELS = 1024*28*28, die Vorhersage-Notebooks die
+Processor-Defaults (Budget "default"). Die Bilder gehen hier direkt als PIL-Bild
+an den Processor, ohne das zusätzliche Vorskalieren durch qwen_vl_utils.
+
+    # nur Bild-Tokens pro Budget (ohne torch/Modell, Sekunden)
+    python fine-tuning/pixel_budget_sweep.py --tokens-only --n 64
+
+    # CPU-Probelauf mit winzigem, zufällig initialisiertem Modell (Qualität bedeutungslos)
+    python fine-tuning/pixel_budget_sweep.py --tiny --n 4 --max-new-tokens 8
+
+    # echter Lauf auf der GPU, unverändert; optional mit LoRA-Adapter
+    python fine-tuning/pixel_budget_sweep.py --n 64 --adapter Alex23o4/Qwen2.5-VL-7B_news_alttext
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image
+
+from generation_eval import generation_metrics
+from local_metrics import memory_gb
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.alt_text_checks import lint_alt_text  # noqa: E402
+from common.json_stream import iter_json  # noqa: E402
+
+MODEL_ID = "Qwen/Qwen2.5-VL-7B-Instruct"
+INPUT_PATH = "evaluation/data/processed/testset_with_predictions_20250602_220302.json"
+IMAGE_CACHE_DIR = ".cache/sweep_images"
+OUTPUT_DIR = "results/pixel_budget_sweep"
+SEED = 42
+
+# Qwen2.5-VL: 14er-Patches, 2×2 zu einem Token zusammengefasst → ein Bild-Token je 28×28 Pixel
+PATCH_SIZE = 14
+MERGE_SIZE = 2
+FACTOR = PATCH_SIZE * MERGE_SIZE
+TRAIN_MIN_PIXELS = 256 * 28 * 28
+
+# (Name, min_pixels, max_pixels); "default" = Werte aus preprocessor_config.json des Modells
+BUDGETS = [
+    ("128", 128 * 28 * 28, 128 * 28 * 28),
+    ("256", TRAIN_MIN_PIXELS, 256 * 28 * 28),
+    ("512", TRAIN_MIN_PIXELS, 512 * 28 * 28),
+    ("768", TRAIN_MIN_PIXELS, 768 * 28 * 28),
+    ("1024 (Training)", TRAIN_MIN_PIXELS, 1024 * 28 * 28),
+    ("1280", TRAIN_MIN_PIXELS, 1280 * 28 * 28),
+    ("default", 56 * 56, 16384 * 28 * 28),
+]
+
+# wie in colab_training_qwen2.5.ipynb / generate_predictions_testset.ipynb
+SYSTEM_MESSAGE = (
+    "You are a helpful assistant specialized in generating concise and context-sensitive alternative text descriptions for images. "
+    "Your goal is to create meaningful and accessible alt texts using the provided article context, including the headline, abstract, and image caption. "
+    "Keep descriptions under 150 characters, avoid subjective language, and focus strictly on the visible content and relevant contextual entities."
+)
+PROMPT_TEMPLATE = (
+    'Given the article headline: "{headline}", the abstract: "{abstract}", and the caption: "{caption}", '
+    'generate a short and descriptive alt text for the provided image. '
+    'Ensure the description includes key visual elements and relevant entities from the context. '
+    'Do not exceed 150 characters and avoid unnecessary details or subjective opinions.'
+)
+
+# Winziges Modell für CPU-Läufe: gleiche Architektur, zufällige Gewichte
+TINY_TEXT = {"hidden_size": 64, "intermediate_size": 128, "num_hidden_layers": 2,
+             "num_attention_heads": 4, "num_key_value_heads": 2}
+TINY_VISION = {"depth": 2, "hidden_size": 64, "intermediate_size": 128, "num_heads": 4,
+               "out_hidden_size": 64, "fullatt_block_indexes": [1]}
+TINY_MROPE_SECTION = [2, 3, 3]      # Summe = head_dim / 2 = 64 / 4 / 2
+
+
+def smart_resize(height, width, min_pixels, max_pixels, factor=FACTOR):
+    """Zielgröße wie im Qwen2.5-VL-Image-Processor (Vielfache von 28, Pixelzahl im Budget)."""
+    h_bar = max(factor, round(height / factor) * factor)
+    w_bar = max(factor, round(width / factor) * factor)
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = max(factor, math.floor(height / beta / factor) * factor)
+        w_bar = max(factor, math.floor(width / beta / factor) * factor)
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = math.ceil(height * beta / factor) * factor
+        w_bar = math.ceil(width * beta / factor) * factor
+    return h_bar, w_bar
+
+
+def visual_tokens(size, min_pixels, max_pixels):
+    width, height = size
+    h_bar, w_bar = smart_resize(height, width, min_pixels, max_pixels)
+    return (h_bar // FACTOR) * (w_bar // FACTOR)
+
+
+# --------------------------------------------------------------------
+# Daten
+# --------------------------------------------------------------------
+def load_image(item, image_dir=None):
+    """Lokales Bild ({image_id}.jpg) oder Original-Download, als Datei gecacht (unverkleinert)."""
+    if image_dir:
+        path = os.path.join(image_dir, f"{item['image_id']}.jpg")
+        if os.path.exists(path):
+            return Image.open(path).convert("RGB")
+    url = item.get("image_url_clean")
+    if not url:
+        return None
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(IMAGE_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".img")
+    if not os.path.exists(path):
+        try:
+            resp = requests.get(url, timeout=10)
+            resp.raise_for_status()
+            Image.open(BytesIO(resp.content)).verify()
+        except Exception as e:
+            print(f"⚠️ Bild nicht ladbar ({item['image_id']}): {e}")
+            return None
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(resp.content)
+        os.replace(f"{path}.tmp", path)
+    return Image.open(path).convert("RGB")
+
+
+def load_subset(path, n, seed=SEED, image_dir=None):
+    data = sorted((d for d in iter_json(path) if d.get("image_url_clean")), key=lambda d: d["image_id"])
+    rng = random.Random(seed)
+    rng.shuffle(data)
+    subset = []
+    for item in data:
+        img = load_image(item, image_dir)
+        if img is not None:
+            subset.append((item, img))
+        if len(subset) >= n:
+            break
+    return subset
+
+
+def build_messages(item):
+    prompt = PROMPT_TEMPLATE.format(headline=item.get("headline", ""), abstract=item.get("abstract", ""),
+                                    caption=item.get("caption", ""))
+    return [
+        {"role": "system", "content": [{"type": "text", "text": SYSTEM_MESSAGE}]},
+        {"role": "user", "content": [{"type": "image"}, {"type": "text", "text": prompt}]},
+    ]
+
+
+# --------------------------------------------------------------------
+# Modell
+# --------------------------------------------------------------------
+def shrink_to_tiny(config):
+    """Verkleinert eine Qwen2.5-VL-Config in-place auf TINY_TEXT/TINY_VISION."""
+    text = getattr(config, "text_config", None) or config
+    for cfg in {id(config): config, id(text): text}.values():
+        for key, value in TINY_TEXT.items():
+            setattr(cfg, key, value)
+        # transformers ≥ 5: rope_parameters, davor rope_scaling
+        for attr in ("rope_parameters", "rope_scaling"):
+            if getattr(cfg, attr, None):
+                setattr(cfg, attr, {**getattr(cfg, attr), "mrope_section": TINY_MROPE_SECTION})
+    for key, value in TINY_VISION.items():
+        setattr(config.vision_config, key, value)
+    return config
+
+
+def load_model(args):
+    import torch
+    from transformers import AutoConfig, Qwen2_5_VLForConditionalGeneration
+
+    if args.tiny:
+        config = shrink_to_tiny(AutoConfig.from_pretrained(MODEL_ID))
+        torch.manual_seed(SEED)
+        model = Qwen2_5_VLForConditionalGeneration(config).to(torch.float32)
+        return model.eval(), torch.device("cpu")
+
+    kwargs = {"device_map": "auto", "trust_remote_code": True, "use_cache": True}
+    if args.load_in_4bit:
+        from transformers import BitsAndBytesConfig
+        kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True, bnb_4bit_use_double_quant=True, bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.bfloat16,
+        )
+    else:
+        kwargs["torch_dtype"] = torch.bfloat16 if torch.cuda.is_available() else torch.float32
+    model = Qwen2_5_VLForConditionalGeneration.from_pretrained(args.model, **kwargs)
+    if args.adapter:
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, args.adapter)
+    return model.eval(), model.device
+
+
+def run_budget(model, device, processor, subset, max_new_tokens):
+    """Alle Samples eines Budgets; ein Aufwärmlauf vorab zählt nicht mit."""
+    import torch
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    rows = []
+    for i, (item, img) in enumerate([subset[0], *subset]):
+        prompt = processor.apply_chat_template(build_messages(item), tokenize=False, add_generation_prompt=True)
+        inputs = processor(text=[prompt], images=[img], return_tensors="pt").to(device)
+        memory_gb()                                   # Peak zurücksetzen
+        with torch.inference_mode():
+            sync()
+            t0 = time.perf_counter()
+            model(**inputs, use_cache=True)
+            sync()
+            prefill = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+            sync()
+            generate = time.perf_counter() - t0
+        peak = memory_gb()
+        if i == 0:
+            continue
+        new_tokens = output[0, inputs["input_ids"].shape[1]:]
+        prediction = processor.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+        rows.append({
+            "image_id": item["image_id"],
+            "image_size": f"{img.width}x{img.height}",
+            "visual_tokens": int(inputs["image_grid_thw"].prod(-1).sum()) // MERGE_SIZE ** 2,
+            "seq_len": int(inputs["input_ids"].shape[1]),
+            "prefill_s": prefill,
+            "generate_s": generate,
+            # generate() rechnet den Prefill erneut und erzeugt dabei das erste Token
+            "decode_s": max(generate - prefill, 0.0),
+            "new_tokens": int(new_tokens.shape[0]),
+            "peak_memory_gb": peak,
+            "prediction": prediction,
+            "reference": item.get("openai_alt_text_refined", ""),
+            "lint_hits": len(lint_alt_text(prediction, item.get("caption", ""), item.get("headline", ""),
+                                           item.get("abstract", ""))),
+        })
+    return rows
+
+
+# --------------------------------------------------------------------
+# Auswertung
+# --------------------------------------------------------------------
+def pareto_front(df, cost, quality):
+    """True für Budgets, die kein anderes bei Kosten (≤) und Qualität (≥) schlägt."""
+    front = []
+    for _, row in df.iterrows():
+        dominated = (
+            (df[cost] <= row[cost]) & (df[quality] >= row[quality])
+            & ((df[cost] < row[cost]) | (df[quality] > row[quality]))
+        ).any()
+        front.append(not dominated)
+    return front
+
+
+def summarize(per_sample):
+    rows = []
+    for (budget, min_px, max_px), g in per_sample.groupby(["budget", "min_pixels", "max_pixels"], sort=False):
+        row = {
+            "budget": budget, "min_pixels": min_px, "max_pixels": max_px,
+            "visual_tokens_mean": g["visual_tokens"].mean(),
+            "visual_tokens_p90": g["visual_tokens"].quantile(0.9),
+        }
+        if "prefill_s" in g:
+            row.update({
+                "seq_len_mean": g["seq_len"].mean(),
+                "prefill_p50_s": g["prefill_s"].median(),
+                "prefill_p90_s": g["prefill_s"].quantile(0.9),
+                "generate_p50_s": g["generate_s"].median(),
+                "decode_tokens_per_s": (g["new_tokens"] - 1).clip(lower=0).sum() / g["decode_s"].sum(),
+                "peak_memory_gb": g["peak_memory_gb"].max(),
+                **generation_metrics(g["prediction"].tolist(), g["reference"].tolist(), prefix=""),
+                "lint_clean_share": (g["lint_hits"] == 0).mean(),
+            })
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+    if "rouge_l" in summary:
+        summary["pareto"] = pareto_front(summary, "prefill_p50_s", "rouge_l")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geschwindigkeit/Qualität über MIN_PIXELS/MAX_PIXELS-Budgets.")
+    parser.add_argument("--input", default=INPUT_PATH, help="Testset (JSON oder NDJSON) mit image_url_clean")
+    parser.add_argument("--image-dir", default=None, help="lokale Bilder {image_id}.jpg, z.B. Drive-Ordner")
+    parser.add_argument("--n", type=int, default=32, help="Größe des festen Test-Ausschnitts")
+    parser.add_argument("--budgets", nargs="*", default=None, help="Teilmenge der Budget-Namen")
+    parser.add_argument("--model", default=MODEL_ID)
+    parser.add_argument("--adapter", default=None, help="LoRA-Adapter (Pfad oder Hub-ID)")
+    parser.add_argument("--load-in-4bit", action="store_true", help="wie in den Notebooks (bitsandbytes, nur GPU)")
+    parser.add_argument("--tiny", action="store_true", help="winziges Zufallsmodell auf CPU (Probelauf)")
+    parser.add_argument("--tokens-only", action="store_true", help="nur Bild-Tokens berechnen, ohne Modell")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    budgets = [b for b in BUDGETS if not args.budgets or b[0] in args.budgets]
+    subset = load_subset(args.input, args.n, image_dir=args.image_dir)
+    print(f"📥 {len(subset)} Testbilder, {len(budgets)} Budgets")
+
+    rows = []
+    if args.tokens_only:
+        for name, min_px, max_px in budgets:
+            rows += [{"budget": name, "min_pixels": min_px, "max_pixels": max_px, "image_id": item["image_id"],
+                      "image_size": f"{img.width}x{img.height}", "visual_tokens": visual_tokens(img.size, min_px, max_px)}
+                     for item, img in subset]
+    else:
+        from transformers import AutoProcessor
+
+        model, device = load_model(args)
+        if args.tiny:
+            print("⚠️ --tiny: zufällige Gewichte – Latenzen/Tokens aussagekräftig im Verhältnis, Qualität nicht")
+        for name, min_px, max_px in budgets:
+            processor = AutoProcessor.from_pretrained(MODEL_ID, min_pixels=min_px, max_pixels=max_px)
+            t0 = time.perf_counter()
+            budget_rows = run_budget(model, device, processor, subset, args.max_new_tokens)
+            rows += [{"budget": name, "min_pixels": min_px, "max_pixels": max_px, **r} for r in budget_rows]
+            print(f"⏱️ Budget {name}: {len(budget_rows)} Samples in {time.perf_counter() - t0:.1f}s, "
+                  f"Ø {np.mean([r['visual_tokens'] for r in budget_rows]):.0f} Bild-Tokens")
+
+    per_sample = pd.DataFrame(rows)
+    summary = summarize(per_sample)
+    os.makedirs(args.output_dir, exist_ok=True)
+    per_sample.to_csv(f"{args.output_dir}/per_sample.csv", index=False)
+    summary.to_csv(f"{args.output_dir}/summary.csv", index=False)
+    table = summary.to_markdown(index=False, floatfmt=".3f")
+    with open(f"{args.output_dir}/summary.md", "w", encoding="utf-8") as f:
+        f.write("# Pixelbudget-Sweep (Pareto: Prefill-Latenz vs. ROUGE-L)\n\n")
+        f.write(f"Modell: {'tiny (zufällig)' if args.tiny else args.model}"
+                f"{f' + {args.adapter}' if args.adapter else ''}, {len(subset)} Testbilder\n\n")
+        f.write(table)
+    print(table)
+    print(f"💾 Ergebnisse gespeichert unter: {args.output_dir}/summary.csv, summary.md und per_sample.csv")
+
+
+if __name__ == "__main__":
+    main()
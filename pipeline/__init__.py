@@ -0,0 +1 @@
+"""Lokaler Pipeline-Runner für die Skripte in data-preperation/ und evaluation/."""
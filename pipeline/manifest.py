@@ -0,0 +1,222 @@
+import ast
+import hashlib
+import json
+import os
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+MANIFEST_PATH = REPO_ROOT / "pipeline" / "manifest.json"
+
+
+@dataclass
+class Stage:
+    """
+    Eine Pipeline-Stufe. Alle Pfade sind relativ zu `cwd` (Verzeichnis, aus dem
+    das Skript gestartet wird); `code` sind Skript- und Hilfsmodule relativ zum
+    Repo-Root. Die lokalen Imports des Skripts (z.B. common/*, judge_parsing.py)
+    werden automatisch ergänzt, siehe `code_files`. Stufen ohne `command` (z.B.
+    Colab-Notebooks) werden nicht ausgeführt, ihre Outputs gelten als extern erzeugt.
+
+    `feedback_inputs` sind Dateien, die die Stufe liest, die aber aus einem früheren
+    Lauf einer nachgelagerten Stufe stammen (z.B. ein auf alten Outputs trainiertes
+    Modell). Sie zählen zum Fingerprint, sind aber keine Kante im DAG.
+
+    `pipe_to` nennt eine Folgestufe, die die Einträge dieser Stufe direkt über
+    stdin erhält, wenn beide im selben Lauf ausgeführt werden; `pipe_args` sind
+    die Zusatzargumente, mit denen eine Stufe in diesem Modus gestartet wird.
+    """
+    name: str
+    cwd: str
+    command: list = None
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    code: list = field(default_factory=list)
+    prompts: list = field(default_factory=list)
+    feedback_inputs: list = field(default_factory=list)
+    env: dict = field(default_factory=dict)
+    pipe_to: str = None
+    pipe_args: list = field(default_factory=list)
+
+    def path(self, rel):
+        return REPO_ROOT / self.repo_path(rel)
+
+    def repo_path(self, rel):
+        """Pfad relativ zum Repo-Root (auflösen von '../' zwischen data-preperation/ und evaluation/)."""
+        return os.path.normpath(os.path.join(self.cwd, rel))
+
+    @property
+    def external(self):
+        return self.command is None
+
+    @property
+    def code_files(self):
+        """Deklarierter Code plus alle lokal importierten Module des Skripts (transitiv)."""
+        files = set(self.code)
+        scripts = [part for part in self.command or [] if part.endswith(".py")]
+        for script in scripts:
+            files |= local_imports(self.path(script))
+        return sorted(files)
+
+
+def _resolve_module(name, search_dirs):
+    parts = name.split(".")
+    for base in search_dirs:
+        for candidate in (base.joinpath(*parts).with_suffix(".py"), base.joinpath(*parts, "__init__.py")):
+            if candidate.is_file():
+                # Paket-__init__ der übergeordneten Pakete gehören mit dazu
+                inits = [base.joinpath(*parts[:i], "__init__.py") for i in range(1, len(parts))]
+                return [candidate, *(p for p in inits if p.is_file())]
+    return []
+
+
+def local_imports(script):
+    """
+    Repo-relative Pfade des Skripts und aller Module, die es (transitiv) aus dem Repo
+    importiert: Nachbarmodule im Skript-Ordner und Pakete am Repo-Root (common/, …).
+    """
+    todo, seen = [Path(script).resolve()], set()
+    while todo:
+        path = todo.pop()
+        if path in seen or not path.is_file():
+            continue
+        seen.add(path)
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                todo.extend(_resolve_module(name, [Path(script).resolve().parent, path.parent, REPO_ROOT]))
+    return {str(p.relative_to(REPO_ROOT)) for p in seen if p.is_relative_to(REPO_ROOT)}
+
+
+class Manifest:
+    """
+    Persistiert pro Stufe Fingerprint, Input-/Output-Hashes, Code-Version und
+    Prompt-Hashes (Lineage). Datei-Hashes werden über (Größe, mtime) gecacht,
+    damit unveränderte große Dateien nicht erneut gelesen werden.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            data = {}
+        self.stages = data.get("stages", {})
+        self.hash_cache = data.get("hash_cache", {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages, "hash_cache": self.hash_cache}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    # ---------------- Hashing ----------------
+    def file_hash(self, path):
+        path = Path(path)
+        if path.is_dir():
+            h = hashlib.sha256()
+            for child in sorted(p for p in path.rglob("*") if p.is_file()):
+                h.update(str(child.relative_to(path)).encode("utf-8"))
+                h.update(self.file_hash(child).encode("ascii"))
+            return h.hexdigest()
+        if not path.exists():
+            return None
+        stat = path.stat()
+        key = str(path.relative_to(REPO_ROOT)) if path.is_relative_to(REPO_ROOT) else str(path)
+        cached = self.hash_cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.hash_cache[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def describe(self, stage):
+        """Aktueller Zustand aller deklarierten Abhängigkeiten einer Stufe."""
+        return {
+            "command": stage.command,
+            "env": stage.env,
+            "inputs": {p: self.file_hash(stage.path(p)) for p in stage.inputs},
+            "code": {p: self.file_hash(REPO_ROOT / p) for p in stage.code_files},
+            "prompts": {p: self.file_hash(stage.path(p)) for p in stage.prompts},
+            "feedback_inputs": {p: self.file_hash(stage.path(p)) for p in stage.feedback_inputs},
+        }
+
+    @staticmethod
+    def fingerprint(description):
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # ---------------- Status ----------------
+    def status(self, stage):
+        """
+        'fresh'   – Inputs, Code und Prompts unverändert, Outputs unverändert vorhanden
+        'stale'   – etwas hat sich geändert oder die Stufe lief noch nie
+        'missing' – externe Stufe ohne vorhandene Outputs
+        """
+        outputs = {p: self.file_hash(stage.path(p)) for p in stage.outputs}
+        if stage.external:
+            return "missing" if any(h is None for h in outputs.values()) else "fresh"
+        record = self.stages.get(stage.name)
+        if not record or any(h is None for h in outputs.values()):
+            return "stale"
+        if record["fingerprint"] != self.fingerprint(self.describe(stage)):
+            return "stale"
+        if record["outputs"] != outputs:
+            return "stale"
+        return "fresh"
+
+    def changed_dependencies(self, stage):
+        """Liste der Pfade, die sich seit dem letzten Lauf geändert haben (für Logs)."""
+        record = self.stages.get(stage.name)
+        if not record:
+            return ["<noch nie gelaufen>"]
+        current = self.describe(stage)
+        changed = [
+            p for kind in ("inputs", "code", "prompts", "feedback_inputs")
+            for p, h in current[kind].items()
+            if record.get(kind, {}).get(p) != h
+        ]
+        if record.get("command") != current["command"] or record.get("env") != current["env"]:
+            changed.append("<command/env>")
+        return changed
+
+    def record(self, stage, started_at, duration):
+        description = self.describe(stage)
+        self.stages[stage.name] = {
+            **description,
+            "fingerprint": self.fingerprint(description),
+            "outputs": {p: self.file_hash(stage.path(p)) for p in stage.outputs},
+            "git_commit": git_commit(),
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "duration_s": round(duration, 3),
+        }
+
+    def producer_of(self, path, stages):
+        """Lineage: welche Stufe hat diese Datei (Pfad relativ zum Repo-Root) erzeugt?"""
+        path = os.path.normpath(path)
+        for stage in stages:
+            if any(stage.repo_path(out) == path for out in stage.outputs):
+                return stage.name, self.stages.get(stage.name)
+        return None, None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,288 @@
+"""
+DAG-Runner für die Skripte in data-preperation/ und evaluation/.
+
+Führt nur Stufen aus, deren Inputs, Code, Prompts oder Outputs sich seit dem
+letzten erfolgreichen Lauf geändert haben. Unabhängige Zweige (z.B.
+judge_proxy und analyze_llm_judging) laufen parallel; merge_data streamt seine
+Einträge direkt an vlm_judge, wenn beide ausgeführt werden.
+
+    python -m pipeline.run                      # alles, was veraltet ist
+    python -m pipeline.run vlm_judge            # Stufe inkl. veralteter Vorgänger
+    python -m pipeline.run --jobs 1             # streng sequentiell
+    python -m pipeline.run --status             # nur Status anzeigen
+    python -m pipeline.run --dry-run --force split_dataset
+    python -m pipeline.run --lineage evaluation/data/processed/full_sampled_with_judging.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from pipeline.manifest import REPO_ROOT, Manifest
+from pipeline.stages import STAGES, STAGES_BY_NAME, upstream
+
+STATUS_ICONS = {"fresh": "✅", "stale": "🔄", "missing": "⚠️"}
+DEFAULT_JOBS = 4
+
+print_lock = threading.Lock()
+
+
+def log(message, stage_name=None):
+    with print_lock:
+        print(f"[{stage_name}] {message}" if stage_name else message, flush=True)
+
+
+def positive_int(value):
+    jobs = int(value)
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f"muss ≥ 1 sein, nicht {value}")
+    return jobs
+
+
+def select_stages(targets):
+    """Zielstufen plus alle (transitiven) Vorgänger, in Pipeline-Reihenfolge."""
+    if not targets:
+        return list(STAGES)
+    unknown = [t for t in targets if t not in STAGES_BY_NAME]
+    if unknown:
+        raise SystemExit(f"❌ Unbekannte Stufe(n): {', '.join(unknown)}. Verfügbar: {', '.join(STAGES_BY_NAME)}")
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(upstream(STAGES_BY_NAME[name]))
+    return [stage for stage in STAGES if stage.name in selected]
+
+# --------------------------------------------------------------------
+# Ausführung
+# --------------------------------------------------------------------
+def run_job(chain):
+    """
+    Führt eine Stufe oder eine per Pipe verbundene Kette (stdout → stdin) aus.
+    Die Ausgabe jeder Stufe wird zeilenweise mit ihrem Namen präfixiert.
+    Gibt pro Stufe (Startzeit, Dauer in s, Exit-Code) zurück.
+    """
+    piped = len(chain) > 1
+    procs, stdin = [], None
+    for i, stage in enumerate(chain):
+        last = i == len(chain) - 1
+        command = [sys.executable if part == "python" else part for part in stage.command]
+        if piped:
+            command += stage.pipe_args
+        started_at, t0 = datetime.now(), time.perf_counter()
+        proc = subprocess.Popen(
+            command,
+            cwd=REPO_ROOT / stage.cwd,
+            env={**os.environ, **stage.env, "PYTHONUNBUFFERED": "1"},
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT if last else subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace",
+        )
+        if stdin is not None:
+            stdin.close()  # gehört jetzt dem Folgeprozess
+        stdin = None if last else proc.stdout
+        procs.append((stage, proc, proc.stdout if last else proc.stderr, started_at, t0))
+
+    results = {}
+
+    def watch(stage, proc, stream, started_at, t0):
+        for line in stream:
+            log(line.rstrip("\n"), stage.name)
+        results[stage.name] = (started_at, time.perf_counter() - t0, proc.wait())
+
+    threads = [threading.Thread(target=watch, args=p) for p in procs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def decide(manifest, stage, deps, outcome, args, forced):
+    """Liefert (Entscheidung, Grund): 'run', 'skip', 'external' oder 'blocked'."""
+    if any(outcome[d] in ("blocked", "failed") for d in deps):
+        return "blocked", "Vorgänger nicht verfügbar"
+    status = manifest.status(stage)
+    if stage.external:
+        if status == "missing":
+            return "blocked", "externe Stufe (Notebook), Outputs fehlen – bitte manuell erzeugen"
+        if any(outcome[d] in ("ran", "planned") for d in deps):
+            log(f"⚠️ {stage.name}: externe Stufe, Vorgänger wurden neu berechnet – Outputs ggf. veraltet.")
+        return "external", ""
+    # Im Dry-Run existieren die neuen Outputs der Vorgänger noch nicht
+    if any(outcome[d] == "planned" for d in deps):
+        return "run", "Vorgänger neu berechnet"
+    if status == "stale":
+        return "run", ", ".join(manifest.changed_dependencies(stage)) or "Outputs fehlen/geändert"
+    if args.force and stage.name in forced:
+        return "run", "erzwungen"
+    return "skip", "aktuell"
+
+
+def execute(manifest, stages, args):
+    """
+    Startet jede Stufe, sobald alle ausgewählten Vorgänger erledigt sind. Der
+    Status wird erst dann geprüft, d.h. erzeugt ein Vorgänger identische Outputs,
+    wird die Stufe übersprungen.
+    """
+    selected = {stage.name for stage in stages}
+    forced = set(args.stages) if args.stages else selected
+    pending = list(stages)
+    outcome, timings, running = {}, {}, {}
+
+    def deps_of(stage):
+        return [d for d in upstream(stage) if d in selected]
+
+    def pipe_partner(stage):
+        """Folgestufe, die direkt per Pipe mitlaufen kann (alle anderen Vorgänger erledigt)."""
+        consumer = STAGES_BY_NAME.get(stage.pipe_to) if stage.pipe_to else None
+        if consumer is None or consumer not in pending or consumer.external:
+            return None
+        others = [d for d in deps_of(consumer) if d != stage.name]
+        if all(outcome.get(d) in ("ran", "skip", "external") for d in others):
+            return consumer
+        return None
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            for stage in list(pending):
+                if stage not in pending:
+                    continue  # bereits als Pipe-Partner gestartet
+                deps = deps_of(stage)
+                if any(d not in outcome for d in deps) or len(running) >= args.jobs:
+                    continue
+                pending.remove(stage)
+                decision, reason = decide(manifest, stage, deps, outcome, args, forced)
+                if decision == "skip":
+                    log(f"⏭️  {stage.name}: aktuell, übersprungen")
+                elif decision == "blocked":
+                    log(f"⛔ {stage.name}: {reason}")
+                if decision != "run":
+                    outcome[stage.name] = decision
+                    continue
+
+                chain = [stage]
+                partner = pipe_partner(stage)
+                if partner:
+                    pending.remove(partner)
+                    chain.append(partner)
+                label = " → ".join(s.name for s in chain)
+                if args.dry_run:
+                    log(f"🔄 {label}: würde ausgeführt ({reason})")
+                    outcome.update({s.name: "planned" for s in chain})
+                    continue
+                log(f"🚀 {label} ({reason})")
+                running[pool.submit(run_job, chain)] = chain
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                chain = running.pop(future)
+                results = future.result()
+                upstream_failed = None
+                for stage in chain:
+                    started_at, duration, returncode = results[stage.name]
+                    timings[stage.name] = duration
+                    if returncode != 0:
+                        outcome[stage.name] = "failed"
+                        log(f"❌ {stage.name} fehlgeschlagen (Exit-Code {returncode}) nach {duration:.1f}s")
+                        upstream_failed = upstream_failed or stage.name
+                    elif upstream_failed:
+                        # Per Pipe gelesene Eingabe war unvollständig → Outputs nicht verbuchen
+                        outcome[stage.name] = "failed"
+                        log(f"❌ {stage.name}: Eingabe von {upstream_failed} unvollständig (Pipe-Vorgänger fehlgeschlagen)")
+                    else:
+                        manifest.record(stage, started_at, duration)
+                        outcome[stage.name] = "ran"
+                        log(f"✅ {stage.name} fertig in {duration:.1f}s")
+                manifest.save()
+
+    return outcome, timings
+
+# --------------------------------------------------------------------
+# Berichte
+# --------------------------------------------------------------------
+def print_status(manifest, stages):
+    for stage in stages:
+        status = manifest.status(stage)
+        line = f"{STATUS_ICONS[status]} {stage.name:<32} {status}"
+        record = manifest.stages.get(stage.name)
+        if record and not stage.external:
+            line += f"  (zuletzt {record['started_at']}, {record['duration_s']:.1f}s, commit {record['git_commit']})"
+        if status == "stale" and not stage.external:
+            line += f"\n     geändert: {', '.join(manifest.changed_dependencies(stage))}"
+        print(line)
+
+
+def print_timings(stages, outcome, timings, wall_time):
+    print("\n⏱️  Laufzeiten pro Stufe")
+    print(f"{'Stufe':<32} {'Ergebnis':<10} {'Dauer':>9}")
+    for stage in stages:
+        duration = f"{timings[stage.name]:.1f}s" if stage.name in timings else "–"
+        print(f"{stage.name:<32} {outcome.get(stage.name, '–'):<10} {duration:>9}")
+    total = sum(timings.values())
+    print(f"\nSumme der Stufen: {total:.1f}s, Wandzeit: {wall_time:.1f}s", end="")
+    print(f" (Parallelität/Streaming spart {total - wall_time:.1f}s)" if total > wall_time else "")
+
+
+def print_lineage(manifest, path):
+    """Verfolgt eine Datei rückwärts bis zu den Rohdaten."""
+    todo, seen = [path], set()
+    while todo:
+        current = todo.pop(0)
+        name, record = manifest.producer_of(current, STAGES)
+        if name is None or name in seen:
+            continue
+        seen.add(name)
+        stage = STAGES_BY_NAME[name]
+        print(f"📄 {current}\n   ← {name}" + (" (extern)" if stage.external else ""))
+        if record:
+            print(f"     commit {record['git_commit']}, gelaufen {record['started_at']}")
+            for kind in ("inputs", "prompts"):
+                for p, h in record.get(kind, {}).items():
+                    print(f"     {kind[:-1]}: {p} sha256={str(h)[:12]}")
+        todo.extend(stage.repo_path(p) for p in stage.inputs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Führt veraltete Pipeline-Stufen aus.")
+    parser.add_argument("stages", nargs="*", help="Zielstufen (Standard: alle)")
+    parser.add_argument("--jobs", "-j", type=positive_int, default=DEFAULT_JOBS, help="Maximal parallel laufende Stufen")
+    parser.add_argument("--force", action="store_true", help="Zielstufen auch ausführen, wenn sie aktuell sind")
+    parser.add_argument("--dry-run", action="store_true", help="Nur anzeigen, was ausgeführt würde")
+    parser.add_argument("--status", action="store_true", help="Status aller Stufen anzeigen")
+    parser.add_argument("--lineage", metavar="PATH", help="Herkunft einer Datei (Pfad relativ zum Repo-Root)")
+    args = parser.parse_args(argv)
+
+    manifest = Manifest()
+    stages = select_stages(args.stages)
+
+    if args.status:
+        print_status(manifest, stages)
+        return
+    if args.lineage:
+        print_lineage(manifest, args.lineage)
+        return
+
+    t_start = time.perf_counter()
+    outcome, timings = execute(manifest, stages, args)
+
+    if args.dry_run:                     # ohne Seiteneffekte: manifest.json bleibt unverändert
+        planned = sum(1 for o in outcome.values() if o == "planned")
+        print(f"\n🏁 {planned} Stufe(n) würden ausgeführt.")
+        return
+    manifest.save()
+    print_timings(stages, outcome, timings, time.perf_counter() - t_start)
+    if any(o == "failed" for o in outcome.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
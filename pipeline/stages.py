@@ -0,0 +1,163 @@
+import os
+
+from pipeline.manifest import Stage
+
+# --------------------------------------------------------------------
+# Stufen der Pipeline in Ausführungsreihenfolge. Pfade entsprechen den
+# Konstanten in den jeweiligen Skripten (relativ zu `cwd`). `code` nennt nur das
+# Skript bzw. Notebook; lokale Imports (common/, Nachbarmodule) ergänzt
+# Stage.code_files automatisch.
+# --------------------------------------------------------------------
+DATA_PREP = "data-preperation"
+EVALUATION = "evaluation"
+USE_JUDGE_PROXY = os.getenv("USE_JUDGE_PROXY", "0")
+# Die Notebooks laden den reduzierten Datensatz vom Hub; dessen lokales Manifest steht stellvertretend dafür
+REDUCED_MANIFEST = "../data-preperation/processed/n24news_reduced/shards_manifest.json"
+
+STAGES = [
+    # ---------------- Datenaufbereitung ----------------
+    Stage(
+        name="sample_by_category",
+        cwd=DATA_PREP,
+        command=["python", "scripts/sample_by_category.py"],
+        inputs=["data/raw/nytimes.json"],
+        outputs=["data/processed/full_sampled_with_image_url_clean.json"],
+        code=["data-preperation/scripts/sample_by_category.py"],
+    ),
+    Stage(
+        name="download_images",
+        cwd=DATA_PREP,
+        command=["python", "scripts/download_images.py"],
+        inputs=["data/processed/full_sampled_with_image_url_clean.json"],
+        outputs=["data/images"],
+        code=["data-preperation/scripts/download_images.py"],
+    ),
+    Stage(
+        name="dedup_near_duplicates",
+        cwd=DATA_PREP,
+        command=["python", "scripts/dedup_near_duplicates.py"],
+        inputs=["data/processed/full_sampled_with_image_url_clean.json", "data/images"],
+        outputs=["data/processed/full_sampled_deduplicated.json", "results/dedup_report.json"],
+        code=["data-preperation/scripts/dedup_near_duplicates.py"],
+    ),
+    Stage(
+        name="enrich_alttext_openai",
+        cwd=DATA_PREP,
+        command=["python", "scripts/enrich_alttext_openai.py"],
+        inputs=["data/processed/full_sampled_deduplicated.json"],
+        outputs=["data/processed/full_sampled_with_alttext_augmented.json"],
+        code=["data-preperation/scripts/enrich_alttext_openai.py"],
+        prompts=["src/alt_text_generation_prompt.txt", "src/alt_text_refinement_prompt.txt"],
+        # Modus ist Teil des Fingerprints: ein Wechsel macht die Stufe stale
+        env={"ENRICH_MODE": os.getenv("ENRICH_MODE", "two_call")},
+    ),
+    Stage(
+        name="split_dataset",
+        cwd=DATA_PREP,
+        command=["python", "scripts/split_dataset.py"],
+        inputs=["data/processed/full_sampled_with_alttext_augmented.json"],
+        outputs=["data/processed/splits/split_assignments.json", "data/processed/splits/data"],
+        code=["data-preperation/scripts/split_dataset.py"],
+    ),
+    Stage(
+        name="build_and_upload_final_dataset",
+        cwd=DATA_PREP,
+        command=["python", "scripts/build_and_upload_final_dataset.py"],
+        inputs=["data/processed/splits/data"],
+        outputs=["processed/n24news_reduced/shards_manifest.json"],
+        code=["data-preperation/scripts/build_and_upload_final_dataset.py"],
+        env={"LOCAL_DATASET_DIR": "data/processed/splits/data"},
+    ),
+
+    # ---------------- Vorhersagen (Colab-Notebooks, extern) ----------------
+    Stage(
+        name="predict_with_context",
+        cwd=EVALUATION,
+        inputs=[REDUCED_MANIFEST],
+        outputs=["data/processed/testset_with_predictions_20250602_220302.json"],
+        code=["evaluation/scripts/generate_predictions_testset.ipynb"],
+    ),
+    Stage(
+        name="predict_no_context",
+        cwd=EVALUATION,
+        inputs=[REDUCED_MANIFEST],
+        outputs=["data/processed/testset_with_predictions_no_context20250603_193545.json"],
+        code=["evaluation/scripts/generate_predictions_testset_no_context.ipynb"],
+    ),
+
+    # ---------------- Evaluation ----------------
+    Stage(
+        name="merge_data",
+        cwd=EVALUATION,
+        command=["python", "scripts/merge_data.py"],
+        inputs=[
+            "data/processed/testset_with_predictions_20250602_220302.json",
+            "data/processed/testset_with_predictions_no_context20250603_193545.json",
+        ],
+        outputs=["data/processed/merged_predictions_with_no_context.json"],
+        code=["evaluation/scripts/merge_data.py"],
+        pipe_to="vlm_judge",
+        pipe_args=["--tee"],
+    ),
+    Stage(
+        name="vlm_judge",
+        cwd=EVALUATION,
+        command=["python", "scripts/vlm_judge.py"],
+        inputs=["data/processed/merged_predictions_with_no_context.json"],
+        outputs=["data/processed/full_sampled_with_judging.json"],
+        code=["evaluation/scripts/vlm_judge.py"],
+        # Der Proxy wird auf einem früheren Judging-Lauf trainiert (Stufe judge_proxy) → Rückkopplung,
+        # keine DAG-Kante; nur wenn er eingeschaltet ist, gehört er zum Fingerprint
+        feedback_inputs=["models/judge_proxy.pkl"] if USE_JUDGE_PROXY == "1" else [],
+        env={"USE_JUDGE_PROXY": USE_JUDGE_PROXY},
+        pipe_args=["--input", "-"],
+    ),
+    Stage(
+        name="judge_proxy",
+        cwd=EVALUATION,
+        command=["python", "scripts/judge_proxy.py"],
+        inputs=["data/processed/full_sampled_with_judging.json"],
+        outputs=["models/judge_proxy.pkl", "results/judge_proxy/agreement_holdout.csv"],
+        code=["evaluation/scripts/judge_proxy.py"],
+    ),
+    Stage(
+        name="analyze_llm_judging",
+        cwd=EVALUATION,
+        command=["python", "scripts/analyze_llm_judging.py"],
+        inputs=["data/processed/full_sampled_with_judging.json"],
+        outputs=["results/metrics/overall_scores.csv", "results/metrics/section_scores.csv"],
+        code=["evaluation/scripts/analyze_llm_judging.py"],
+    ),
+    # Die finale Merge-Datei entsteht in Colab (calculate_standard_metrics.ipynb)
+    Stage(
+        name="standard_metrics",
+        cwd=EVALUATION,
+        inputs=["data/processed/merged_predictions_with_no_context.json"],
+        outputs=[
+            "data/processed/merged_predictions_with_no_context_final.json",
+            "results/alttext_metrics_comparison.csv",
+        ],
+        code=["evaluation/scripts/calculate_standard_metrics.ipynb"],
+    ),
+    Stage(
+        name="final_dataset_analyzis",
+        cwd=EVALUATION,
+        command=["python", "scripts/final_dataset_analyzis.py"],
+        inputs=["data/processed/merged_predictions_with_no_context_final.json"],
+        outputs=["results/alttext_metrics_overview.csv"],
+        code=["evaluation/scripts/final_dataset_analyzis.py"],
+    ),
+]
+
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def producers():
+    """Output-Pfad (relativ zum Repo-Root) → erzeugende Stufe."""
+    return {stage.repo_path(out): stage.name for stage in STAGES for out in stage.outputs}
+
+
+def upstream(stage):
+    """Direkte Vorgänger einer Stufe, abgeleitet aus Inputs und Outputs."""
+    by_output = producers()
+    return sorted({by_output[stage.repo_path(p)] for p in stage.inputs if stage.repo_path(p) in by_output})
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from transformers.convert_slow_tokenizer import bytes_to_unicode  # noqa: E402
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "fine-tuning"))
+import pixel_budget_sweep  # noqa: E402
+
+SPECIAL_TOKENS = ["<|endoftext|>", "<|im_start|>", "<|im_end|>", "<|vision_start|>", "<|vision_end|>",
+                  "<|image_pad|>", "<|video_pad|>"]
+CHAT_TEMPLATE = (
+    "{% for m in messages %}<|im_start|>{{ m['role'] }}\n{% for c in m['content'] %}"
+    "{% if c['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>{% else %}{{ c['text'] }}{% endif %}"
+    "{% endfor %}<|im_end|>\n{% endfor %}{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+
+def tiny_processor_and_model():
+    """Byte-Tokenizer + Zufallsmodell in Qwen2.5-VL-Architektur, ohne Hub-Zugriff."""
+    tokenizer = transformers.Qwen2Tokenizer(vocab={ch: i for i, ch in enumerate(bytes_to_unicode().values())},
+                                            merges=[])
+    tokenizer.add_special_tokens({"additional_special_tokens": SPECIAL_TOKENS})
+    ids = dict(zip(SPECIAL_TOKENS, tokenizer.convert_tokens_to_ids(SPECIAL_TOKENS)))
+    processor = transformers.Qwen2_5_VLProcessor(
+        image_processor=transformers.Qwen2VLImageProcessor(min_pixels=64 * 28 * 28, max_pixels=128 * 28 * 28),
+        tokenizer=tokenizer, video_processor=transformers.Qwen2VLVideoProcessor(), chat_template=CHAT_TEMPLATE,
+    )
+    config = transformers.Qwen2_5_VLConfig(
+        vocab_size=len(tokenizer), image_token_id=ids["<|image_pad|>"], video_token_id=ids["<|video_pad|>"],
+        vision_start_token_id=ids["<|vision_start|>"], vision_end_token_id=ids["<|vision_end|>"],
+        bos_token_id=None, eos_token_id=ids["<|im_end|>"], pad_token_id=ids["<|endoftext|>"],
+    )
+    torch.manual_seed(0)
+    model = transformers.Qwen2_5_VLForConditionalGeneration(pixel_budget_sweep.shrink_to_tiny(config))
+    return processor, model.eval()
+
+
+def test_tiny_model_runs_budget_on_cpu():
+    processor, model = tiny_processor_and_model()
+    item = {"headline": "h", "abstract": "a", "caption": "c", "openai_alt_text_refined": "A man at a desk."}
+    subset = [({**item, "image_id": f"img{i}"}, Image.new("RGB", (640, 480), (40 * i, 80, 120))) for i in range(2)]
+
+    rows = pixel_budget_sweep.run_budget(model, torch.device("cpu"), processor, subset, max_new_tokens=4)
+    assert [r["image_id"] for r in rows] == ["img0", "img1"]        # Aufwärmlauf zählt nicht mit
+    assert rows[0]["visual_tokens"] == pixel_budget_sweep.visual_tokens((640, 480), 64 * 28 * 28, 128 * 28 * 28)
+    assert all(r["decode_s"] <= r["generate_s"] for r in rows)
+
+    per_sample = pd.DataFrame([{"budget": "128", "min_pixels": 0, "max_pixels": 0, **r} for r in rows])
+    summary = pixel_budget_sweep.summarize(per_sample).iloc[0]
+    assert summary["decode_tokens_per_s"] > 0
+    assert 0 <= summary["rouge_l"] <= 1
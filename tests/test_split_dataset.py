@@ -0,0 +1,89 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from datasets import Dataset, DatasetDict
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "data-preperation" / "scripts"))
+import split_dataset  # noqa: E402
+
+
+def empty_state():
+    return {"sections": [], "assignments": {}, "groups": {}, "pending_upload": []}
+
+
+def test_group_spanning_sections_stays_in_one_split():
+    # Regression: Gruppen wurden pro Section zugeordnet → x1=validation, x2=train
+    state = empty_state()
+    existing = [(f"b{i}", "Business", f"b{i}") for i in range(8)]
+    state["assignments"] = {image_id: "train" for image_id, _, _ in existing}
+    split_dataset.assign_new_rows(existing + [("x1", "Business", "g"), ("x2", "Economy", "g")], state)
+    assert state["assignments"]["x1"] == state["assignments"]["x2"] == state["groups"]["g"]
+
+
+def test_no_group_spans_splits_and_ratios_hold():
+    rows = [(f"id{i}", f"s{i % 5}", f"g{i // 3}") for i in range(3000)]
+    state = empty_state()
+    split_dataset.assign_new_rows(rows, state)
+
+    by_group = {}
+    for image_id, _, group in rows:
+        by_group.setdefault(group, set()).add(state["assignments"][image_id])
+    assert all(len(splits) == 1 for splits in by_group.values())
+
+    shares = {s: list(state["assignments"].values()).count(s) / len(rows) for s in split_dataset.SPLIT_RATIOS}
+    for split, ratio in split_dataset.SPLIT_RATIOS.items():
+        assert shares[split] == pytest.approx(ratio, abs=0.01)
+
+
+def test_assignment_is_order_independent_and_append_only():
+    rows = [(f"id{i}", f"s{i % 3}", f"g{i // 2}") for i in range(200)]
+    a, b = empty_state(), empty_state()
+    split_dataset.assign_new_rows(rows, a)
+    split_dataset.assign_new_rows(list(reversed(rows)), b)
+    assert a["assignments"] == b["assignments"]
+
+    before = dict(a["assignments"])
+    split_dataset.assign_new_rows(rows + [("new", "s0", "g0")], a)
+    assert {k: a["assignments"][k] for k in before} == before
+    assert a["assignments"]["new"] == before["id0"]
+
+
+def test_new_member_follows_published_split():
+    # Zustand aus den veröffentlichten Splits kennt nur image_id → split, keine Gruppen
+    state = empty_state()
+    state["assignments"] = {"x1": "test"}
+    split_dataset.assign_new_rows([("x1", "Business", "g"), ("x2", "Economy", "g")], state)
+    assert state["assignments"] == {"x1": "test", "x2": "test"}
+
+
+def test_first_run_seeds_from_published_splits(tmp_path, monkeypatch):
+    published = DatasetDict({
+        name: Dataset.from_dict({"image_id": ids, "section": ["Business"] * len(ids)})
+        for name, ids in {"train": ["a", "b"], "validation": ["c"], "test": ["d"]}.items()
+    })
+    monkeypatch.setattr(split_dataset, "load_dataset", lambda repo: published)
+    monkeypatch.setattr(split_dataset, "SHARD_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(split_dataset, "STATE_PATH", str(tmp_path / "state.json"))
+
+    state = split_dataset.load_state()
+    assert state["assignments"] == {"a": "train", "b": "train", "c": "validation", "d": "test"}
+    assert sorted(p.name for p in (tmp_path / "data").iterdir()) == [
+        "test-published.parquet", "train-published.parquet", "validation-published.parquet",
+    ]
+
+
+def test_failed_upload_stays_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(split_dataset, "STATE_PATH", str(tmp_path / "state.json"))
+    monkeypatch.setattr(split_dataset, "log_splits_to_wandb", lambda files: None)
+    monkeypatch.delenv("HF_TOKEN", raising=False)
+
+    state = empty_state()
+    state["pending_upload"] = ["data/train-1.parquet"]
+    split_dataset.save_state(state)
+    with pytest.raises(ValueError):
+        split_dataset.upload_pending(state)
+
+    with open(tmp_path / "state.json", encoding="utf-8") as f:
+        assert json.load(f)["pending_upload"] == ["data/train-1.parquet"]